@@ -1,14 +1,159 @@
 """Entry point for the packaged cocktail app
 
-Run with: python -m cocktail_app
+Run with: python -m cocktail_app            (GUI)
+          python -m cocktail_app serve
+          python -m cocktail_app batch profiles.jsonl -o results.jsonl
+          python -m cocktail_app build-table
+          python -m cocktail_app compile-kb
+          python -m cocktail_app bench --sizes 1000,10000,100000
+          python -m cocktail_app check-startup
 """
-import tkinter as tk
-from .gui import ModernCocktailExpertSystem
+import argparse
+import os
+
+from .kb import KB_PATH
+from .metrics import configure_from_env
+from .startup import FIRST_PAINT_TARGET_MS, IMPORT_TARGET_MS
+
+
+def run_gui(args):
+    import tkinter as tk
+    from .gui import ModernCocktailExpertSystem
+    from .startup import PROBE_ENV, report_first_paint
 
-def main():
     root = tk.Tk()
+    if os.environ.get(PROBE_ENV):
+        report_first_paint(root)
     app = ModernCocktailExpertSystem(root)
     root.mainloop()
 
+
+def run_build_table(args):
+    from .precompute import build_table
+
+    path, table = build_table(args.kb, top_n=args.top)
+    print(f"Wrote {len(table.counts)} preference combinations (top {table.top_n}) to {path}")
+
+
+def run_compile_kb(args):
+    from .compiled import compile_catalog
+    from .prolog_pool import PrologError, compile_state
+
+    print(f"Wrote catalog to {compile_catalog(args.kb)}")
+    if args.no_prolog:
+        return
+    try:
+        print(f"Wrote Prolog state to {compile_state(args.kb)}")
+    except (OSError, PrologError) as e:
+        raise SystemExit(f"Could not build the Prolog state: {e}")
+
+
+def run_serve(args):
+    from .server import serve
+
+    if args.shards:
+        os.environ['MIXMASTER_SHARDS'] = str(args.shards)
+    serve(args.host, args.port, engine=args.engine, kb_path=args.kb,
+          max_concurrency=args.max_concurrency)
+
+
+def run_batch(args):
+    from .batch import main as batch_main
+
+    batch_main(args)
+
+
+def run_bench(args):
+    from .bench import main as bench_main
+
+    bench_main(args)
+
+
+def run_check_startup(args):
+    from .startup import main as startup_main
+
+    startup_main(args)
+
+
+def run_generate_kb(args):
+    from .synth import generate_kb
+
+    path = generate_kb(args.output, args.size, args.seed)
+    print(f"Wrote {args.size} cocktails to {path}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m cocktail_app',
+                                     description="MixMaster Pro cocktail expert system")
+    parser.set_defaults(func=run_gui)
+    commands = parser.add_subparsers(title='commands')
+
+    gui = commands.add_parser('gui', help="open the desktop app (default)")
+    gui.set_defaults(func=run_gui)
+
+    server = commands.add_parser('serve', help="run the headless HTTP recommendation service")
+    server.add_argument('--host', default='127.0.0.1', help="interface to bind (default: 127.0.0.1)")
+    server.add_argument('--port', type=int, default=8080, help="port to listen on (default: 8080)")
+    server.add_argument('--engine', choices=('python', 'sharded', 'prolog'), default='python',
+                        help="recommendation backend (default: python)")
+    server.add_argument('--shards', type=int,
+                        help="worker processes for the sharded engine (default: one per core)")
+    server.add_argument('--kb', default=KB_PATH, help="knowledge base file (default: packaged KB)")
+    server.add_argument('--max-concurrency', type=int, default=4,
+                        help="backend queries allowed in flight at once (default: 4)")
+    server.set_defaults(func=run_serve)
+
+    batch = commands.add_parser('batch', help="score preference profiles from JSONL/CSV on a process pool")
+    batch.add_argument('input', help="profiles file (.jsonl or .csv), or - for stdin")
+    batch.add_argument('-o', '--output', default='-', help="JSONL results file (default: stdout)")
+    batch.add_argument('--format', choices=('jsonl', 'csv'), help="input format (default: from extension)")
+    batch.add_argument('--kb', default=KB_PATH, help="knowledge base file (default: packaged KB)")
+    batch.add_argument('-j', '--jobs', type=int, help="worker processes (default: one per core)")
+    batch.add_argument('--chunk-size', type=int, default=64, help="profiles per task (default: 64)")
+    batch.add_argument('--limit', type=int, default=10, help="matches kept per profile (default: 10)")
+    batch.set_defaults(func=run_batch)
+
+    table = commands.add_parser('build-table', help="precompute recommendations for every preference combination")
+    table.add_argument('--kb', default=KB_PATH, help="knowledge base file (default: packaged KB)")
+    table.add_argument('--top', type=int, default=100, help="matches stored per combination (default: 100)")
+    table.set_defaults(func=run_build_table)
+
+    compiled = commands.add_parser('compile-kb', help="compile the KB into fast-loading artifacts")
+    compiled.add_argument('--kb', default=KB_PATH, help="knowledge base file (default: packaged KB)")
+    compiled.add_argument('--no-prolog', action='store_true', help="skip the swipl saved state")
+    compiled.set_defaults(func=run_compile_kb)
+
+    bench = commands.add_parser('bench', help="time loading, queries, formatting and rendering on synthetic KBs")
+    bench.add_argument('--sizes', default='1000,10000,100000',
+                       help="comma-separated catalog sizes (default: 1000,10000,100000)")
+    bench.add_argument('--repeat', type=int, default=5, help="timed runs per query step (default: 5)")
+    bench.add_argument('--seed', type=int, default=0, help="generator seed (default: 0)")
+    bench.add_argument('--prolog', action='store_true', help="also time the swipl backend")
+    bench.add_argument('--shards', help="comma-separated shard counts to time the sharded engine at, e.g. 1,2,4")
+    bench.add_argument('--workdir', help="keep generated KBs here and reuse them (default: temporary)")
+    bench.add_argument('-o', '--out', help="JSON report path (default: bench-<timestamp>.json)")
+    bench.set_defaults(func=run_bench)
+
+    startup = commands.add_parser('check-startup', help="measure GUI import time and time to first paint against targets")
+    startup.add_argument('--import-target', type=float, default=IMPORT_TARGET_MS,
+                         help=f"budget for importing the GUI module, in ms (default: {IMPORT_TARGET_MS})")
+    startup.add_argument('--paint-target', type=float, default=FIRST_PAINT_TARGET_MS,
+                         help=f"budget from launch to first paint, in ms (default: {FIRST_PAINT_TARGET_MS})")
+    startup.add_argument('--runs', type=int, default=3, help="import timings, fastest is kept (default: 3)")
+    startup.set_defaults(func=run_check_startup)
+
+    generate = commands.add_parser('generate-kb', help="write a synthetic knowledge base")
+    generate.add_argument('size', type=int, help="number of cocktail/11 facts")
+    generate.add_argument('-o', '--output', required=True, help="knowledge base file to write")
+    generate.add_argument('--seed', type=int, default=0, help="generator seed (default: 0)")
+    generate.set_defaults(func=run_generate_kb)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    configure_from_env()
+    args.func(args)
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,343 @@
+"""Recommendation backends selectable from the GUI
+
+Every backend answers with kb.Page slices of kb.Match records ranked by
+score, then name, so the GUI renders their results identically. The
+stream_* variants yield the same records as a series of smaller Pages,
+best first, so callers can show the top matches before the rest arrive.
+"""
+import threading
+import weakref
+
+from .compiled import catalog_path, load_catalog, save_catalog
+from .engine import makeable, recommend
+from .kb import KB_PATH, Match, Page, decode_page, decode_stream
+from .metrics import span
+from .prolog_pool import PrologError, SwiplPool, prolog_atom
+from .shared import CatalogPublisher, SharedCatalog
+from .shards import ShardPool
+
+STREAM_BATCH = 50
+
+
+def check_cancelled(cancel):
+    if cancel is not None:
+        cancel.check()
+
+
+def prolog_limit(limit):
+    return 'inf' if limit is None else int(limit)
+
+
+class PrologBackend:
+    """Runs the KB predicates on the persistent swipl worker pool"""
+
+    name = 'prolog'
+
+    def __init__(self, kb_path=KB_PATH, pool_size=None):
+        self.kb_path = kb_path
+        self.pool_size = pool_size
+        self.pool = SwiplPool(kb_path, size=pool_size)
+
+    @staticmethod
+    def preference_goals(prefs):
+        # Preferences may come from HTTP clients, so every atom is quoted
+        return f"""
+        assertz(known(spirit_preference, {prolog_atom(prefs.spirit)}, _)),
+        assertz(known(flavor_notes, {prolog_atom(prefs.flavor)}, _)),
+        assertz(known(skill_level, {prolog_atom(prefs.skill)}, _)),
+        assertz(known(strength, {int(prefs.strength)}, _)),
+        assertz(known(occasion_type, {prolog_atom(prefs.occasion)}, _)),
+        assertz(known(current_season, {prolog_atom(prefs.season)}, _)),
+        """
+
+    def recommend(self, prefs, offset=0, limit=None, timeout=30):
+        query = (self.preference_goals(prefs)
+                 + f"find_recommendations_json({int(offset)}, {prolog_limit(limit)}).")
+        return decode_page(self.pool.query(query, timeout=timeout), offset)
+
+    def stream_recommend(self, prefs, offset=0, limit=None, batch_size=STREAM_BATCH, timeout=30, cancel=None):
+        query = (self.preference_goals(prefs)
+                 + f"stream_recommendations_json({int(offset)}, {prolog_limit(limit)}).")
+        return decode_stream(self.pool.stream(query, timeout, cancel), offset, batch_size)
+
+    def browse(self, offset=0, limit=None, timeout=30):
+        goal = f"browse_all_cocktails_json({int(offset)}, {prolog_limit(limit)})."
+        return decode_page(self.pool.query(goal, timeout=timeout), offset)
+
+    def stream_browse(self, offset=0, limit=None, batch_size=STREAM_BATCH, timeout=30, cancel=None):
+        goal = f"stream_all_cocktails_json({int(offset)}, {prolog_limit(limit)})."
+        return decode_stream(self.pool.stream(goal, timeout, cancel), offset, batch_size)
+
+    def warm_up(self):
+        """Start the worker pool ahead of the first query"""
+        with span('backend.warm_up', engine=self.name):
+            self.pool.start()
+
+    @staticmethod
+    def inventory_term(inventory):
+        return '[' + ', '.join(prolog_atom(item) for item in inventory) + ']'
+
+    def makeable(self, prefs, inventory, max_missing=0, offset=0, limit=None, timeout=30):
+        query = (self.preference_goals(prefs)
+                 + f"find_makeable_json({self.inventory_term(inventory)}, {int(max_missing)}, "
+                 + f"{int(offset)}, {prolog_limit(limit)}).")
+        return decode_page(self.pool.query(query, timeout=timeout), offset)
+
+    def stream_makeable(self, prefs, inventory, max_missing=0, offset=0, limit=None, batch_size=STREAM_BATCH,
+                        timeout=30, cancel=None):
+        query = (self.preference_goals(prefs)
+                 + f"stream_makeable_json({self.inventory_term(inventory)}, {int(max_missing)}, "
+                 + f"{int(offset)}, {prolog_limit(limit)}).")
+        return decode_stream(self.pool.stream(query, timeout, cancel), offset, batch_size)
+
+    def reload(self):
+        """Swap in a fresh pool so new queries see the edited knowledge base"""
+        stale, self.pool = self.pool, SwiplPool(self.kb_path, size=self.pool_size)
+        stale.retire()
+
+    def apply_changes(self, cocktails, diff, kb_hash=None):
+        """Bring up workers on the edited knowledge base, then retire the old ones
+
+        Consulted facts are static, so the workers are replaced rather than
+        patched. The old pool keeps answering until the new one is ready and
+        finishes the queries it already has.
+        """
+        pool = SwiplPool(self.kb_path, size=self.pool_size)
+        if self.pool.started:
+            try:
+                pool.start()
+            except (OSError, PrologError):
+                # Started again on the next query, which reports the error
+                pass
+        stale, self.pool = self.pool, pool
+        stale.retire()
+
+    def close(self):
+        self.pool.close()
+
+
+class PythonBackend:
+    """Scores the catalog in-process with the vectorized engine"""
+
+    name = 'python'
+
+    def __init__(self, kb_path=KB_PATH):
+        self.kb_path = kb_path
+        self._catalog = None
+        self._lock = threading.Lock()
+
+    @property
+    def catalog(self):
+        with self._lock:
+            if self._catalog is None:
+                self._catalog = load_catalog(self.kb_path)
+            return self._catalog
+
+    @property
+    def loaded_catalog(self):
+        """The catalog if it has been loaded, without loading it"""
+        with self._lock:
+            return self._catalog
+
+    def recommend(self, prefs, offset=0, limit=None, timeout=None):
+        catalog = self.catalog
+        with span('engine.recommend'):
+            indices, scores, total = self._recommend(catalog, prefs, offset, limit, timeout)
+        return self._page(catalog, indices, scores, total, offset)
+
+    def stream_recommend(self, prefs, offset=0, limit=None, batch_size=STREAM_BATCH, timeout=None, cancel=None):
+        catalog = self.catalog
+        # The first batch is a cheap partial selection; the rest is ranked
+        # in one pass only once the top matches are on their way
+        first = batch_size if limit is None else min(batch_size, limit)
+        with span('engine.recommend'):
+            indices, scores, total = self._recommend(catalog, prefs, offset, first, timeout)
+        check_cancelled(cancel)
+        yield self._page(catalog, indices, scores, total, offset)
+        remaining = None if limit is None else limit - len(indices)
+        if len(indices) < first or remaining == 0:
+            return
+        start = offset + len(indices)
+        with span('engine.rank_rest'):
+            indices, scores, _ = self._recommend(catalog, prefs, start, remaining, timeout)
+        for i in range(0, len(indices), batch_size):
+            check_cancelled(cancel)
+            yield self._page(catalog, indices[i:i + batch_size], scores[i:i + batch_size], total, start + i)
+
+    def browse(self, offset=0, limit=None, timeout=None):
+        catalog = self.catalog
+        total = len(catalog)
+        end = total if limit is None else min(total, offset + limit)
+        matches = tuple(Match(catalog.cocktail(i), None) for i in range(offset, end))
+        return Page(matches, total, offset)
+
+    def stream_browse(self, offset=0, limit=None, batch_size=STREAM_BATCH, timeout=None, cancel=None):
+        total = len(self.catalog)
+        end = total if limit is None else min(total, offset + limit)
+        if offset >= end:
+            yield Page((), total, offset)
+            return
+        for start in range(offset, end, batch_size):
+            check_cancelled(cancel)
+            yield self.browse(start, min(batch_size, end - start), timeout)
+
+    def makeable(self, prefs, inventory, max_missing=0, offset=0, limit=None, timeout=None):
+        catalog = self.catalog
+        with span('engine.makeable'):
+            indices, scores, total = makeable(catalog, prefs, inventory, max_missing, offset, limit)
+        return self._page(catalog, indices, scores, total, offset)
+
+    def stream_makeable(self, prefs, inventory, max_missing=0, offset=0, limit=None, batch_size=STREAM_BATCH,
+                        timeout=None, cancel=None):
+        # Ranking the feasible subset is cheap; only materializing is batched
+        catalog = self.catalog
+        with span('engine.makeable'):
+            indices, scores, total = makeable(catalog, prefs, inventory, max_missing, offset, limit)
+        if not len(indices):
+            yield Page((), total, offset)
+            return
+        for i in range(0, len(indices), batch_size):
+            check_cancelled(cancel)
+            yield self._page(catalog, indices[i:i + batch_size], scores[i:i + batch_size], total, offset + i)
+
+    def warm_up(self):
+        """Load the catalog and build its index ahead of the first query"""
+        with span('backend.warm_up', engine=self.name):
+            self.catalog.index
+
+    def _recommend(self, catalog, prefs, offset, limit, timeout):
+        return recommend(catalog, prefs, offset, limit)
+
+    @staticmethod
+    def _page(catalog, indices, scores, total, offset):
+        with span('engine.materialize'):
+            matches = tuple(Match(catalog.cocktail(i), int(score)) for i, score in zip(indices, scores))
+        return Page(matches, total, offset)
+
+    def reload(self):
+        with self._lock:
+            self._catalog = None
+
+    def apply_changes(self, cocktails, diff, kb_hash=None):
+        """Patch the loaded catalog and index with an edit to the knowledge base
+
+        Rows of unchanged cocktails are copied; only added and changed ones
+        are encoded. Queries keep the catalog they started with, and given
+        the edited file's kb_hash the compiled artifact is rewritten for the
+        next start.
+        """
+        with self._lock:
+            catalog = self._catalog
+        if catalog is None:
+            # Nothing loaded yet; the first query reads the new file
+            return
+        if diff is None:
+            reuse = [-1] * len(cocktails)
+        else:
+            touched = {cocktail.name for cocktail in diff.added}
+            touched.update(new.name for _, new in diff.changed)
+            symbols = list(catalog.symbols)
+            rows = {symbols[symbol]: row for row, symbol in enumerate(catalog.columns['name'].tolist())}
+            reuse = [-1 if cocktail.name in touched else rows.get(cocktail.name, -1) for cocktail in cocktails]
+        with span('catalog.update', rows=len(cocktails)):
+            updated = catalog.updated(cocktails, reuse)
+            updated.kb_hash = kb_hash
+            updated.index
+        with self._lock:
+            if self._catalog is catalog:
+                self._catalog = updated
+        if kb_hash is None:
+            return
+        try:
+            save_catalog(updated, catalog_path(self.kb_path), kb_hash)
+        except OSError:
+            pass
+
+    def close(self):
+        pass
+
+
+class ShardedBackend(PythonBackend):
+    """The Python engine with scoring fanned out to shard worker processes
+
+    Each catalog the backend loads or patches is published once as a new
+    shared generation, and queries name the generation of the catalog
+    they materialize from, so shards and results always agree. Workers
+    stay up across KB reloads.
+    """
+
+    name = 'sharded'
+
+    def __init__(self, kb_path=KB_PATH, shards=None):
+        super().__init__(kb_path)
+        self.shards = shards
+        self.publisher = None
+        self.generations = weakref.WeakKeyDictionary()
+        self._pool = None
+        self._publish_lock = threading.Lock()
+
+    def publish(self, catalog):
+        """Generation of catalog, publishing it on first use; returns (pool, generation)"""
+        with self._publish_lock:
+            if self.publisher is None:
+                self.publisher = CatalogPublisher()
+                self._pool = ShardPool(self.publisher.directory, self.shards)
+            generation = self.generations.get(catalog)
+            if generation is None:
+                generation = self.generations[catalog] = self.publisher.publish(catalog)
+            return self._pool, generation
+
+    def _recommend(self, catalog, prefs, offset, limit, timeout):
+        pool, generation = self.publish(catalog)
+        return pool.recommend(generation, prefs, offset, limit, timeout)
+
+    def warm_up(self):
+        """Load and publish the catalog and start the shard workers ahead of the first query"""
+        with span('backend.warm_up', engine=self.name):
+            pool, _ = self.publish(self.catalog)
+            pool.start()
+
+    def close(self):
+        with self._publish_lock:
+            pool, publisher, self._pool, self.publisher = self._pool, self.publisher, None, None
+        if pool is not None:
+            pool.close()
+        if publisher is not None:
+            publisher.close()
+
+
+class SharedBackend(PythonBackend):
+    """The Python engine over the latest catalog published to a shared directory
+
+    Meant for worker processes: nothing is parsed or indexed, and KB
+    reloads arrive as new generations from the publishing process.
+    """
+
+    def __init__(self, directory, kb_path=KB_PATH):
+        super().__init__(kb_path)
+        self.shared = SharedCatalog(directory)
+
+    @property
+    def catalog(self):
+        with self._lock:
+            return self.shared.attach()
+
+    def reload(self):
+        pass
+
+    def apply_changes(self, cocktails, diff, kb_hash=None):
+        pass
+
+
+BACKENDS = {
+    PythonBackend.name: PythonBackend,
+    ShardedBackend.name: ShardedBackend,
+    PrologBackend.name: PrologBackend,
+}
+
+
+def create_backend(name, kb_path=KB_PATH):
+    try:
+        return BACKENDS[name](kb_path)
+    except KeyError:
+        raise ValueError(f"Unknown engine '{name}', expected one of {', '.join(BACKENDS)}") from None
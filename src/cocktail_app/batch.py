@@ -0,0 +1,138 @@
+"""Batch scoring of preference profiles across a process pool
+
+Profiles are streamed from JSONL or CSV, scored in chunks by worker
+processes running the Python engine, and written back as JSONL in input
+order. Only a bounded window of chunks is in flight, so memory use does
+not grow with the size of the input. The catalog is loaded and indexed
+once and shared with the workers, so it does not grow with -j either, and
+workers take its KB hash from the parent instead of reading the file.
+
+A profile the backend cannot answer gets an error line of its own, like
+the HTTP service's 4xx/503 replies, and the batch carries on.
+
+Run with: python -m cocktail_app batch profiles.jsonl -o results.jsonl
+"""
+import csv
+import itertools
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .compiled import load_catalog
+from .kb import DEFAULT_PREFERENCES, KB_PATH, KnowledgeBaseError, Preferences, normalize_preferences
+from .prolog_pool import PrologError
+from .shards import ShardError
+from .shared import CatalogPublisher
+
+DEFAULT_CHUNK_SIZE = 64
+DEFAULT_LIMIT = 10
+
+_recommender = None
+
+
+def _init_worker(kb_path, directory, kb_hash):
+    global _recommender
+    from .backends import SharedBackend
+    from .recommender import Recommender
+    _recommender = Recommender('python', kb_path, backend=SharedBackend(directory, kb_path), kb_hash=kb_hash)
+
+
+def _score_chunk(chunk, limit):
+    return [_score_profile(number, profile, limit) for number, profile in chunk]
+
+
+def _score_profile(number, profile, limit):
+    result = {'id': profile.get('id', number)}
+    if '__error__' in profile:
+        result['error'] = profile['__error__']
+        return result
+    try:
+        values = DEFAULT_PREFERENCES._asdict()
+        values.update({field: profile[field] for field in Preferences._fields
+                       if profile.get(field) not in (None, '')})
+        prefs = normalize_preferences(Preferences(**values))
+        page = _recommender.recommend(prefs, 0, limit)
+    except (ValueError, TypeError, KnowledgeBaseError, PrologError, ShardError) as e:
+        result['error'] = str(e)
+        return result
+    result['preferences'] = prefs._asdict()
+    result['total'] = page.total
+    result['results'] = [{'name': m.cocktail.name, 'score': m.score} for m in page.matches]
+    return result
+
+
+def detect_format(path):
+    return 'csv' if str(path).lower().endswith('.csv') else 'jsonl'
+
+
+def iter_profiles(stream, fmt):
+    """Yield (line number, profile dict) from a JSONL or CSV stream"""
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(stream), start=1):
+            yield number, row
+        return
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            profile = json.loads(line)
+        except ValueError as e:
+            profile = {'id': number, '__error__': f"Invalid JSON: {e}"}
+        if not isinstance(profile, dict):
+            profile = {'id': number, '__error__': "Each line must be a JSON object"}
+        yield number, profile
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_batch(profiles, out, kb_path=KB_PATH, jobs=None, chunk_size=DEFAULT_CHUNK_SIZE, limit=DEFAULT_LIMIT):
+    """Score profiles on a process pool, writing JSONL to out in input order"""
+    jobs = jobs or os.cpu_count() or 1
+    window = deque()
+    written = 0
+
+    def write(results):
+        nonlocal written
+        for result in results:
+            out.write(json.dumps(result) + '\n')
+            written += 1
+
+    publisher = CatalogPublisher()
+    try:
+        catalog = load_catalog(kb_path)
+        publisher.publish(catalog)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(str(kb_path), str(publisher.directory), catalog.kb_hash)) as pool:
+            for chunk in _chunks(profiles, chunk_size):
+                window.append(pool.submit(_score_chunk, chunk, limit))
+                # Two chunks per worker keeps every core busy without reading ahead
+                while len(window) >= jobs * 2:
+                    write(window.popleft().result())
+            while window:
+                write(window.popleft().result())
+    finally:
+        publisher.close()
+    return written
+
+
+def main(args):
+    fmt = args.format or detect_format(args.input)
+    source = sys.stdin if args.input == '-' else open(args.input, newline='', encoding='utf-8')
+    target = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        count = run_batch(iter_profiles(source, fmt), target, args.kb, args.jobs, args.chunk_size, args.limit)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+    print(f"Scored {count} profiles", file=sys.stderr)
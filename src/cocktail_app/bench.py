@@ -0,0 +1,269 @@
+"""Benchmark suite over synthetic knowledge bases
+
+For each catalog size a knowledge base is generated with synth.py, then
+the load, recommendation, browse, formatting and rendering steps are timed
+and the catalog's memory per recipe is measured. With --shards the
+sharded engine is timed at each shard count, to check that scoring scales
+with the cores given to it while memory stays flat. Results are written as JSON so runs can be
+compared over time.
+
+Run with: python -m cocktail_app bench --sizes 1000,10000,100000
+          python -m cocktail_app bench --sizes 1000000 --shards 1,2,4,8
+"""
+import json
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .compiled import load_catalog, open_catalog, save_catalog
+from .engine import Catalog, recommend
+from .formatting import format_browse_entries, format_recommendations
+from .index import CatalogIndex
+from .kb import Match
+from .precompute import iter_domain
+from .shards import ShardPool
+from .shared import CatalogPublisher, generation_path
+from .synth import generate_kb
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_REPEAT = 5
+SAMPLE_QUERIES = 20
+
+
+def measure(func, repeat):
+    """Run func repeat times; timings in milliseconds"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        'runs': repeat,
+        'min_ms': round(min(times), 3),
+        'median_ms': round(statistics.median(times), 3),
+        'max_ms': round(max(times), 3),
+    }, result
+
+
+def sample_preferences(count=SAMPLE_QUERIES):
+    """An evenly spread, repeatable sample of the GUI preference domain"""
+    domain = list(iter_domain())
+    step = max(1, len(domain) // count)
+    return domain[::step][:count]
+
+
+def _per_query(stats, queries):
+    return {key: round(value / queries, 3) if key.endswith('_ms') else value
+            for key, value in stats.items()}
+
+
+def bench_python(kb_path, repeat):
+    timings = {}
+    timings['kb_load'], catalog = measure(lambda: Catalog.load(kb_path), 1)
+    compiled = Path(kb_path).with_suffix('.catalog.bin')
+    timings['catalog_compile'], _ = measure(lambda: save_catalog(catalog, compiled), 1)
+    timings['catalog_open'], catalog = measure(lambda: open_catalog(compiled), repeat)
+    timings['index_build'], index = measure(lambda: CatalogIndex(catalog), 1)
+    catalog._index = index
+    queries = sample_preferences()
+
+    def run_queries(limit):
+        return [recommend(catalog, prefs, limit=limit) for prefs in queries]
+
+    stats, pages = measure(lambda: run_queries(None), repeat)
+    timings['recommend_all'] = _per_query(stats, len(queries))
+    stats, _ = measure(lambda: run_queries(20), repeat)
+    timings['recommend_top20'] = _per_query(stats, len(queries))
+    timings['memory'] = bench_memory(catalog, queries)
+
+    matches = [Match(catalog.cocktail(i), int(s)) for i, s in zip(pages[0][0], pages[0][1])]
+    timings['matches'] = len(matches)
+    timings['format_recommendations'], text = measure(lambda: format_recommendations(matches), repeat)
+
+    timings['browse_all'], browse = measure(
+        lambda: [Match(catalog.cocktail(i), None) for i in range(len(catalog))], 1)
+    timings['format_browse'], browse_text = measure(lambda: format_browse_entries(browse), 1)
+    timings['render_recommendations'] = bench_render(text)
+    timings['render_browse'] = bench_render(browse_text)
+    return timings
+
+
+def bench_memory(catalog, queries):
+    """Bytes per recipe held by the catalog, and the most a query allocates
+
+    Scoring works on whole columns and creates no object per cocktail, so
+    a query's peak is its array temporaries: a few ids per candidate.
+    """
+    usage = catalog.memory_usage()
+    size = max(len(catalog), 1)
+    peak = 0
+    tracemalloc.start()
+    try:
+        for prefs in queries:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            recommend(catalog, prefs, limit=20)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+    return {
+        'catalog_bytes': sum(usage.values()),
+        'bytes_per_recipe': round(sum(usage.values()) / size, 1),
+        'parts': usage,
+        'recommend_peak_bytes': peak,
+        'recommend_peak_bytes_per_recipe': round(peak / size, 2),
+    }
+
+
+def private_bytes(pid):
+    """Resident bytes a process does not share with others, where /proc reports it"""
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', encoding='ascii') as rollup:
+            lines = rollup.read().splitlines()
+    except OSError:
+        return None
+    fields = dict(line.split(':', 1) for line in lines if ':' in line)
+    return sum(int(fields[key].split()[0]) * 1024 for key in ('Private_Clean', 'Private_Dirty') if key in fields)
+
+
+def bench_shards(kb_path, counts, repeat):
+    """Sharded scoring per shard count, with the speedup over the first count
+
+    Latency is one query at a time, so it measures how well a single query
+    is split; throughput keeps one query in flight per shard. The catalog
+    is published once for every count, and the workers' private memory
+    shows what each adds on top of it.
+    """
+    queries = sample_preferences()
+    publisher = CatalogPublisher()
+    results = {}
+    try:
+        generation = publisher.publish(load_catalog(kb_path))
+        shared_bytes = generation_path(publisher.directory, generation).stat().st_size
+
+        def run(pool, prefs, limit=None):
+            return pool.recommend(generation, prefs, limit=limit)
+
+        for shards in counts:
+            pool = ShardPool(publisher.directory, shards)
+            timings = {}
+            try:
+                timings['start'], _ = measure(pool.start, 1)
+                run(pool, queries[0])
+                stats, _ = measure(lambda: [run(pool, prefs) for prefs in queries], repeat)
+                timings['recommend_all'] = _per_query(stats, len(queries))
+                stats, _ = measure(lambda: [run(pool, prefs, 20) for prefs in queries], repeat)
+                timings['recommend_top20'] = _per_query(stats, len(queries))
+                with ThreadPoolExecutor(max_workers=shards) as clients:
+                    stats, _ = measure(lambda: list(clients.map(lambda prefs: run(pool, prefs), queries * shards)),
+                                       repeat)
+                timings['throughput_qps'] = round(len(queries) * shards * 1000 / stats['median_ms'], 1)
+                private = [private_bytes(pid) for pid in pool.pids]
+                timings['worker_private_bytes'] = None if None in private else sum(private)
+                timings['shared_catalog_bytes'] = shared_bytes
+            finally:
+                pool.close()
+            results[str(shards)] = timings
+    finally:
+        publisher.close()
+    first = results[str(counts[0])]
+    for timings in results.values():
+        timings['speedup'] = round(first['recommend_all']['median_ms'] / timings['recommend_all']['median_ms'], 2)
+        timings['throughput_speedup'] = round(timings['throughput_qps'] / first['throughput_qps'], 2)
+    return results
+
+
+def bench_render(text):
+    """Time inserting text into a Tk Text widget, when a display is available"""
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:
+        return {'skipped': f"no Tk display ({e.__class__.__name__})"}
+    try:
+        widget = tk.Text(root)
+
+        def render():
+            widget.delete('1.0', 'end')
+            widget.insert('1.0', text)
+            root.update_idletasks()
+
+        stats, _ = measure(render, 1)
+        return stats
+    finally:
+        root.destroy()
+
+
+def bench_prolog(kb_path, repeat):
+    if shutil.which('swipl') is None:
+        return {'skipped': "swipl not found on PATH"}
+    from .backends import PrologBackend
+
+    backend = PrologBackend(kb_path, pool_size=1)
+    timings = {}
+    try:
+        timings['pool_start'], _ = measure(backend.pool.start, 1)
+        queries = sample_preferences(5)
+        stats, _ = measure(lambda: [backend.recommend(p, timeout=600) for p in queries], repeat)
+        timings['recommend_all'] = _per_query(stats, len(queries))
+        timings['browse_all'], _ = measure(lambda: backend.browse(timeout=600), 1)
+    finally:
+        backend.close()
+    return timings
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeat=DEFAULT_REPEAT, prolog=False, seed=0, workdir=None, log=print,
+                   shards=()):
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'seed': seed,
+        'results': [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(workdir or tmp)
+        for size in sizes:
+            kb_path = directory / f'synthetic_{size}.pl'
+            if not kb_path.exists():
+                log(f"Generating {size} cocktails...")
+                generate_kb(kb_path, size, seed)
+            log(f"Benchmarking {size} cocktails...")
+            entry = {'size': size, 'kb_bytes': kb_path.stat().st_size,
+                     'python': bench_python(kb_path, repeat)}
+            if prolog:
+                entry['prolog'] = bench_prolog(kb_path, repeat)
+            if shards:
+                entry['shards'] = bench_shards(kb_path, shards, repeat)
+            report['results'].append(entry)
+    return report
+
+
+def main(args):
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    shards = [int(count) for count in (args.shards or '').split(',') if count.strip()]
+    report = run_benchmarks(sizes, args.repeat, args.prolog, args.seed, args.workdir,
+                            log=lambda message: print(message, file=sys.stderr), shards=shards)
+    out = Path(args.out or time.strftime('bench-%Y%m%d-%H%M%S.json'))
+    out.write_text(json.dumps(report, indent=2), encoding='utf-8')
+    for entry in report['results']:
+        python = entry['python']
+        print(f"{entry['size']:>9} cocktails  load {python['kb_load']['median_ms']:>10.1f} ms  "
+              f"recommend {python['recommend_all']['median_ms']:>8.2f} ms  "
+              f"top20 {python['recommend_top20']['median_ms']:>8.2f} ms  "
+              f"{python['memory']['bytes_per_recipe']:>6.1f} B/recipe")
+        for count, timings in entry.get('shards', {}).items():
+            print(f"{'':>9} {count:>3} shards  recommend {timings['recommend_all']['median_ms']:>8.2f} ms  "
+                  f"x{timings['speedup']:<5.2f}  {timings['throughput_qps']:>8.1f} q/s  "
+                  f"x{timings['throughput_speedup']:.2f}"
+                  + (f"  {timings['worker_private_bytes'] / 2**20:>7.1f} MiB private"
+                     if timings['worker_private_bytes'] is not None else ''))
+    print(f"Wrote {out}")
@@ -0,0 +1,89 @@
+"""LRU cache of ranked results
+
+Entries are dropped selectively when the knowledge base changes: the
+Recommender discards only the results an edit can affect.
+
+The cache is bounded both by entry count and by the number of matches the
+entries hold together, since one unpaginated result can hold the whole
+catalog. A result bigger than the whole match budget is not cached.
+"""
+import threading
+from collections import OrderedDict
+
+from .metrics import count
+
+DEFAULT_CACHE_SIZE = 256
+# Matches held across all entries; a cached Match costs a few hundred bytes
+DEFAULT_MAX_MATCHES = 20000
+
+
+def weight(value):
+    """Matches held by a cached value; values without matches count as one"""
+    return len(getattr(value, 'matches', ())) or 1
+
+
+class ResultCache:
+    """Bounded LRU mapping of query keys to ranked results"""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, max_matches=DEFAULT_MAX_MATCHES):
+        self.maxsize = maxsize
+        self.max_matches = max_matches
+        self.matches = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Cached value for key, or None on a miss"""
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                count('cache.miss')
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            count('cache.hit')
+            return value
+
+    def put(self, key, value):
+        """Store value under key; returns False if it is too big to cache"""
+        size = weight(value)
+        with self._lock:
+            if key in self._entries:
+                self.matches -= weight(self._entries.pop(key))
+            if size > self.max_matches:
+                return False
+            self._entries[key] = value
+            self.matches += size
+            while len(self._entries) > self.maxsize or self.matches > self.max_matches:
+                _, evicted = self._entries.popitem(last=False)
+                self.matches -= weight(evicted)
+            return True
+
+    def clear(self):
+        self.discard(lambda key: True)
+
+    def discard(self, stale):
+        """Drop every entry whose key stale(key) accepts; returns how many"""
+        with self._lock:
+            keys = [key for key in self._entries if stale(key)]
+            for key in keys:
+                self.matches -= weight(self._entries.pop(key))
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'matches': self.matches,
+                'max_matches': self.max_matches,
+                'invalidations': self.invalidations,
+            }
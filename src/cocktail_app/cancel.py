@@ -0,0 +1,55 @@
+"""Cooperative cancellation of backend work
+
+A CancelToken travels with a query. The Python engine polls it between
+batches; Prolog workers register a callback that kills the swipl process
+answering the query, and the pool restarts it.
+"""
+import threading
+
+
+class Cancelled(Exception):
+    """Raised when a query is abandoned because its token was cancelled."""
+
+
+class CancelToken:
+    """Set once by the caller when a query's result is no longer wanted"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._cancelled = False
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback):
+        """Run callback on cancellation (now, if already cancelled)
+
+        Returns a function that unregisters the callback.
+        """
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return lambda: self._discard(callback)
+        callback()
+        return lambda: None
+
+    def check(self):
+        """Raise Cancelled if the token has been cancelled"""
+        if self._cancelled:
+            raise Cancelled("Query was superseded")
+
+    def _discard(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
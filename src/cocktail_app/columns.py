@@ -0,0 +1,205 @@
+"""Compact storage for the catalog's strings and fields
+
+Strings are kept as one UTF-8 blob with an offsets array instead of a
+Python object per value, and symbol ids use the narrowest integer type
+that holds them. The views here decode a value only when it is read, so a
+catalog costs a handful of arrays however many recipes it holds, and the
+arrays can be memory-mapped straight from a compiled artifact.
+"""
+import numpy as np
+
+# Lookups remembered per SymbolTable; queries draw on a small set of values
+FIND_CACHE_SIZE = 4096
+
+
+def narrow_ids(ids):
+    """ids as uint16 when they all fit, else int32"""
+    ids = np.asarray(ids, dtype=np.int64)
+    dtype = np.uint16 if not len(ids) or (ids.min() >= 0 and ids.max() < 1 << 16) else np.int32
+    return ids.astype(dtype)
+
+
+def _offsets(lengths):
+    lengths = np.asarray(lengths, dtype=np.int64)
+    total = int(lengths.sum())
+    offsets = np.zeros(len(lengths) + 1, dtype=np.uint32 if total < 1 << 32 else np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+class StringTable:
+    """Sequence of strings stored as a UTF-8 blob plus offsets"""
+
+    __slots__ = ('offsets', 'blob', 'view')
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+        # Slicing a memoryview is much cheaper than slicing the array
+        self.view = memoryview(blob)
+
+    def __reduce__(self):
+        return type(self), (self.offsets, self.blob)
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [str(value).encode('utf-8') for value in strings]
+        return cls(_offsets([len(value) for value in encoded]),
+                   np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def raw(self, index):
+        """UTF-8 bytes of one string"""
+        return self.view[self.offsets[index]:self.offsets[index + 1]].tobytes()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('string index out of range')
+        return str(self.view[self.offsets[index]:self.offsets[index + 1]], 'utf-8')
+
+    def __iter__(self):
+        data = self.blob.tobytes()
+        bounds = self.offsets.tolist()
+        for start, end in zip(bounds, bounds[1:]):
+            yield data[start:end].decode('utf-8')
+
+    def extended(self, strings):
+        """Table with strings appended"""
+        added = StringTable.from_strings(strings)
+        lengths = np.concatenate([np.diff(self.offsets), np.diff(added.offsets)])
+        return StringTable(_offsets(lengths), np.concatenate([self.blob, added.blob]))
+
+    def updated(self, reuse, strings):
+        """Table whose i-th string is self[reuse[i]], or the next of strings where reuse[i] < 0"""
+        reuse = np.asarray(reuse, dtype=np.int64)
+        kept = reuse >= 0
+        fresh = np.flatnonzero(~kept)
+        added = StringTable.from_strings(strings)
+        lengths = np.zeros(len(reuse), dtype=np.int64)
+        lengths[kept] = np.diff(self.offsets)[reuse[kept]]
+        lengths[fresh] = np.diff(added.offsets)
+        offsets = _offsets(lengths)
+        blob = np.empty(int(offsets[-1]), dtype=np.uint8)
+        for rows, source, starts in ((np.flatnonzero(kept), self, reuse[kept]),
+                                     (fresh, added, np.arange(len(fresh)))):
+            runs = lengths[rows]
+            steps = np.arange(runs.sum()) - np.repeat(np.cumsum(runs) - runs, runs)
+            blob[np.repeat(offsets[rows].astype(np.int64), runs) + steps] = \
+                source.blob[np.repeat(source.offsets[starts].astype(np.int64), runs) + steps]
+        return StringTable(offsets, blob)
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.blob.nbytes
+
+
+class SymbolTable(StringTable):
+    """StringTable of distinct symbols, looked up by binary search
+
+    order lists the symbol ids in sorted order. UTF-8 byte order is code
+    point order, so the comparisons run on the raw bytes.
+    """
+
+    __slots__ = ('order', 'found')
+
+    def __init__(self, offsets, blob, order):
+        super().__init__(offsets, blob)
+        self.order = order
+        self.found = {}
+
+    def __reduce__(self):
+        return type(self), (self.offsets, self.blob, self.order)
+
+    @classmethod
+    def from_strings(cls, strings):
+        table = StringTable.from_strings(strings)
+        strings = list(table)
+        order = np.array(sorted(range(len(strings)), key=strings.__getitem__), dtype=np.int32)
+        return cls(table.offsets, table.blob, order)
+
+    def _search(self, raw):
+        """Position in order of the first symbol not below raw"""
+        low, high = 0, len(self.order)
+        while low < high:
+            middle = (low + high) // 2
+            if self.raw(self.order[middle]) < raw:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find(self, value):
+        """Id of value, or -1 when it is not a symbol"""
+        value = str(value)
+        symbol = self.found.get(value)
+        if symbol is None:
+            raw = value.encode('utf-8')
+            position = self._search(raw)
+            symbol = -1
+            if position < len(self.order) and self.raw(self.order[position]) == raw:
+                symbol = int(self.order[position])
+            if len(self.found) >= FIND_CACHE_SIZE:
+                self.found.clear()
+            self.found[value] = symbol
+        return symbol
+
+    def extended(self, strings):
+        """Table with new symbols appended, keeping the sort order"""
+        strings = list(strings)
+        table = super().extended(strings)
+        positions = [self._search(value.encode('utf-8')) for value in strings]
+        # Symbols inserted at the same position are ordered among themselves
+        added = sorted(range(len(strings)), key=lambda i: (positions[i], strings[i]))
+        ids = np.array([len(self) + i for i in added], dtype=np.int32)
+        order = np.insert(self.order, [positions[i] for i in added], ids)
+        return SymbolTable(table.offsets, table.blob, order)
+
+    def ranks(self):
+        """Position of each symbol in sorted order"""
+        ranks = np.empty(len(self.order), dtype=np.int32)
+        ranks[self.order] = np.arange(len(self.order), dtype=np.int32)
+        return ranks
+
+    @property
+    def nbytes(self):
+        return super().nbytes + self.order.nbytes
+
+
+class AtomColumn:
+    """One atom field of a catalog, read as strings"""
+
+    __slots__ = ('ids', 'symbols')
+
+    def __init__(self, ids, symbols):
+        self.ids = ids
+        self.symbols = symbols
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, row):
+        return self.symbols[self.ids[row]]
+
+
+class ListColumn:
+    """One list field of a catalog (offsets + symbol ids), read as lists of strings"""
+
+    __slots__ = ('offsets', 'values', 'symbols')
+
+    def __init__(self, offsets, values, symbols):
+        self.offsets = offsets
+        self.values = values
+        self.symbols = symbols
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        return [self.symbols[value] for value in self.values[self.offsets[row]:self.offsets[row + 1]].tolist()]
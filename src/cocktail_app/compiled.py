@@ -0,0 +1,155 @@
+"""Compiled knowledge-base artifacts
+
+The Python engine keeps a binary copy of its columnar catalog next to the
+KB. Columns, the symbol table, the history strings and, once built, the
+index posting lists are stored as raw, aligned arrays after a small JSON
+header, so opening the artifact memory-maps them instead of parsing the
+source or indexing it again.
+The header records the SHA-256 of the KB it was built from; the artifact
+is used while that matches the .pl file and rebuilt automatically once it
+does not, however the file's timestamps were changed.
+
+Build everything ahead of time with: python -m cocktail_app compile-kb
+"""
+import json
+import os
+import struct
+from pathlib import Path
+
+import numpy as np
+
+from .columns import StringTable, SymbolTable
+from .engine import Catalog
+from .index import CatalogIndex
+from .kb import KB_PATH, KnowledgeBaseError, artifact_path, parse_cocktails, read_kb
+from .metrics import span
+
+CATALOG_SUFFIX = '.catalog.bin'
+CATALOG_MAGIC = b'MXCATLG2'
+ALIGNMENT = 64
+
+
+def catalog_path(kb_path):
+    return artifact_path(kb_path, CATALOG_SUFFIX)
+
+
+def _aligned(position):
+    return -(-position // ALIGNMENT) * ALIGNMENT
+
+
+def _arrays(catalog):
+    """Every array of catalog by name
+
+    Strings are stored under 'symbols.*' and 'history.*', and a built
+    index under 'index.*'.
+    """
+    arrays = dict(catalog.columns)
+    arrays['symbols.offsets'] = catalog.symbols.offsets
+    arrays['symbols.blob'] = catalog.symbols.blob
+    arrays['symbols.order'] = catalog.symbols.order
+    arrays['history.offsets'] = catalog.history.offsets
+    arrays['history.blob'] = catalog.history.blob
+    if catalog._index is not None:
+        arrays.update(catalog._index.arrays())
+    return arrays
+
+
+def save_catalog(catalog, path, kb_hash=None):
+    """Write catalog to path atomically, recording the hash of the KB it was built from"""
+    path = Path(path)
+    arrays = _arrays(catalog)
+    layout = {}
+    position = 0
+    for name, column in arrays.items():
+        column = np.ascontiguousarray(column)
+        layout[name] = {'dtype': column.dtype.str, 'length': len(column), 'offset': position}
+        position = _aligned(position + column.nbytes)
+    header = json.dumps({'kb_hash': kb_hash, 'columns': layout}).encode('utf-8')
+    start = _aligned(len(CATALOG_MAGIC) + 8 + len(header))
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(partial, 'wb') as out:
+        out.write(CATALOG_MAGIC + struct.pack('<Q', len(header)) + header)
+        for name, column in arrays.items():
+            out.seek(start + layout[name]['offset'])
+            out.write(np.ascontiguousarray(column).tobytes())
+        out.truncate(start + position)
+    os.replace(partial, path)
+    return path
+
+
+def open_catalog(path, kb_hash=None):
+    """Memory-map a catalog written by save_catalog; every array is a read-only view
+
+    With kb_hash, a catalog built from any other KB contents is refused.
+    """
+    with open(path, 'rb') as source:
+        if source.read(len(CATALOG_MAGIC)) != CATALOG_MAGIC:
+            raise KnowledgeBaseError(f"{path} is not a compiled catalog")
+        length = source.read(8)
+        if len(length) != 8:
+            raise KnowledgeBaseError(f"{path} is truncated")
+        (size,) = struct.unpack('<Q', length)
+        # A corrupt length must not turn into a huge read
+        if size > os.fstat(source.fileno()).st_size:
+            raise KnowledgeBaseError(f"{path} is truncated")
+        header = json.loads(source.read(size).decode('utf-8'))
+    if kb_hash is not None and header.get('kb_hash') != kb_hash:
+        raise KnowledgeBaseError(f"{path} was built from a different knowledge base")
+    start = _aligned(len(CATALOG_MAGIC) + 8 + size)
+    # A plain ndarray view: indexing np.memmap itself goes through Python code
+    data = np.memmap(path, dtype=np.uint8, mode='r').view(np.ndarray)
+    columns = {}
+    for name, spec in header['columns'].items():
+        dtype = np.dtype(spec['dtype'])
+        offset = start + spec['offset']
+        end = offset + spec['length'] * dtype.itemsize
+        if end > len(data):
+            raise KnowledgeBaseError(f"{path} is truncated")
+        columns[name] = data[offset:end].view(dtype)
+    symbols = SymbolTable(columns.pop('symbols.offsets'), columns.pop('symbols.blob'), columns.pop('symbols.order'))
+    history = StringTable(columns.pop('history.offsets'), columns.pop('history.blob'))
+    index = {name: columns.pop(name) for name in [name for name in columns if name.startswith('index.')]}
+    catalog = Catalog(symbols, columns, history)
+    catalog.kb_hash = header.get('kb_hash')
+    if index:
+        catalog._index = CatalogIndex.from_arrays(catalog, index)
+    return catalog
+
+
+def load_catalog(kb_path=KB_PATH):
+    """Catalog for kb_path, from the compiled artifact when it was built from the same contents
+
+    A stale or unreadable artifact is rebuilt from the source. Failing to
+    write it is not an error; the parsed catalog is returned either way.
+    """
+    path = catalog_path(kb_path)
+    source, kb_hash = read_kb(kb_path)
+    try:
+        with span('catalog.open'):
+            return open_catalog(path, kb_hash)
+    except (OSError, ValueError, KeyError, KnowledgeBaseError):
+        pass
+    with span('catalog.parse'):
+        catalog = Catalog.from_cocktails(parse_cocktails(source))
+    catalog.kb_hash = kb_hash
+    try:
+        with span('catalog.compile'):
+            save_catalog(catalog, path, kb_hash)
+    except OSError:
+        pass
+    return catalog
+
+
+def compile_catalog(kb_path=KB_PATH):
+    """Parse kb_path and write its compiled catalog; returns the artifact path
+
+    The compiled catalog also carries the index and the similarity search
+    signatures.
+    """
+    source, kb_hash = read_kb(kb_path)
+    catalog = Catalog.from_cocktails(parse_cocktails(source))
+    catalog.index
+    catalog.similarity
+    return save_catalog(catalog, catalog_path(kb_path), kb_hash)
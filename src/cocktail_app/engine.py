@@ -0,0 +1,365 @@
+"""In-process recommendation engine
+
+A columnar copy of the cocktail/11 facts that scores the whole catalog in
+one vectorized pass with the same rules as calculate_match_score/2.
+"""
+import threading
+
+import numpy as np
+
+from .columns import AtomColumn, ListColumn, StringTable, SymbolTable, narrow_ids
+from .kb import Cocktail, load_cocktails, KB_PATH, UnknownCocktailError
+from .ranking import rank
+
+# Mirrors strength_value/2, complexity_value/2 and skill_sufficient/2
+STRENGTH_VALUES = {'light': 3, 'medium': 6, 'strong': 9}
+COMPLEXITY_VALUES = {'beginner': 1, 'intermediate': 2, 'expert': 3}
+SKILL_LIMITS = {'beginner': 1, 'intermediate': 2, 'expert': 3}
+
+SPIRIT_WEIGHT = 3
+NO_PREFERENCE_WEIGHT = 1
+STRENGTH_WEIGHT = 2
+SKILL_WEIGHT = 3
+SEASON_WEIGHT = 2
+OCCASION_WEIGHT = 2
+FLAVOR_WEIGHT = 1
+MAX_SCORE = 13
+SCORE_THRESHOLD = 3
+
+ATOM_FIELDS = ('name', 'base_spirit', 'strength', 'complexity', 'season', 'glass')
+LIST_FIELDS = ('ingredients', 'techniques', 'flavors', 'occasions')
+
+
+def _name_rank(symbols, names):
+    """Position of each cocktail in name order, the ranking tie-breaker"""
+    by_name = np.argsort(symbols.ranks()[names], kind='stable')
+    name_rank = np.empty(len(names), dtype=np.int32)
+    name_rank[by_name] = np.arange(len(names), dtype=np.int32)
+    return name_rank
+
+
+class Catalog:
+    """Columnar cocktail catalog
+
+    Atoms are interned into a single SymbolTable; atom fields are columns
+    of symbol ids and list fields are stored as offsets + values, with ids
+    in the narrowest integer type that holds them. Names are interned last
+    so the other fields' ids stay small. History strings live in one
+    StringTable, so no Python object is kept per cocktail.
+
+    Indexes are built on first use, once, however many threads ask for
+    them at the same time.
+    """
+
+    def __init__(self, symbols, columns, history):
+        self.symbols = symbols if isinstance(symbols, SymbolTable) else SymbolTable.from_strings(symbols)
+        self.columns = columns
+        self.history = history if isinstance(history, StringTable) else StringTable.from_strings(history)
+        # SHA-256 of the KB source it was loaded from, when known (see compiled.load_catalog)
+        self.kb_hash = None
+        self._index = None
+        self._ingredient_bits = None
+        self._similarity = None
+        self._search = None
+        # Reentrant: building one index may use another
+        self._build_lock = threading.RLock()
+
+    @classmethod
+    def from_cocktails(cls, cocktails):
+        symbols = []
+        symbol_ids = {}
+
+        def intern(value):
+            value = str(value)
+            if value not in symbol_ids:
+                symbol_ids[value] = len(symbols)
+                symbols.append(value)
+            return symbol_ids[value]
+
+        columns = {}
+        for field in ATOM_FIELDS[1:]:
+            columns[field] = narrow_ids([intern(getattr(c, field)) for c in cocktails])
+        for field in LIST_FIELDS:
+            lengths = [len(getattr(c, field)) for c in cocktails]
+            offsets = np.zeros(len(cocktails) + 1, dtype=np.int32)
+            np.cumsum(lengths, out=offsets[1:])
+            columns[field + '_offsets'] = offsets
+            columns[field + '_values'] = narrow_ids(
+                [intern(item) for c in cocktails for item in getattr(c, field)])
+        columns['name'] = narrow_ids([intern(c.name) for c in cocktails])
+        columns['strength_value'] = np.array(
+            [STRENGTH_VALUES.get(c.strength, 0) for c in cocktails], dtype=np.int8)
+        columns['complexity_value'] = np.array(
+            [COMPLEXITY_VALUES.get(c.complexity, 0) for c in cocktails], dtype=np.int8)
+        symbols = SymbolTable.from_strings(symbols)
+        columns['name_rank'] = _name_rank(symbols, columns['name'])
+        return cls(symbols, columns, [str(c.history) for c in cocktails])
+
+    @classmethod
+    def load(cls, path=KB_PATH):
+        return cls.from_cocktails(load_cocktails(path))
+
+    def updated(self, cocktails, reuse):
+        """Catalog of cocktails that copies rows of this one where it can
+
+        reuse holds, for each position in cocktails, the row of this catalog
+        with the same fact, or -1 for a row that has to be encoded. Symbol
+        ids are kept, so the posting lists of a built index are carried over
+        and only patched.
+        """
+        added = {}
+
+        def intern(value):
+            value = str(value)
+            symbol = self.symbols.find(value)
+            if symbol < 0:
+                symbol = added.setdefault(value, len(self.symbols) + len(added))
+            return symbol
+
+        reuse = np.asarray(reuse, dtype=np.int64)
+        kept = reuse >= 0
+        fresh = np.flatnonzero(~kept)
+        columns = {}
+        for field in ATOM_FIELDS:
+            column = np.empty(len(cocktails), dtype=np.int32)
+            column[kept] = self.columns[field][reuse[kept]]
+            column[fresh] = [intern(getattr(cocktails[i], field)) for i in fresh]
+            columns[field] = narrow_ids(column)
+        for name, field, values in (('strength_value', 'strength', STRENGTH_VALUES),
+                                    ('complexity_value', 'complexity', COMPLEXITY_VALUES)):
+            column = np.empty(len(cocktails), dtype=np.int8)
+            column[kept] = self.columns[name][reuse[kept]]
+            column[fresh] = [values.get(getattr(cocktails[i], field), 0) for i in fresh]
+            columns[name] = column
+        for field in LIST_FIELDS:
+            old_offsets = self.columns[field + '_offsets']
+            lengths = np.zeros(len(cocktails), dtype=np.int64)
+            lengths[kept] = np.diff(old_offsets)[reuse[kept]]
+            lengths[fresh] = [len(getattr(cocktails[i], field)) for i in fresh]
+            offsets = np.zeros(len(cocktails) + 1, dtype=np.int32)
+            np.cumsum(lengths, out=offsets[1:])
+            values = np.empty(offsets[-1], dtype=np.int32)
+            # Copy the kept rows' value runs in one gather
+            runs = lengths[kept]
+            steps = np.arange(runs.sum()) - np.repeat(np.cumsum(runs) - runs, runs)
+            source = np.repeat(old_offsets[reuse[kept]], runs) + steps
+            target = np.repeat(offsets[:-1][kept], runs) + steps
+            values[target] = self.columns[field + '_values'][source]
+            for i in fresh:
+                values[offsets[i]:offsets[i + 1]] = [intern(item) for item in getattr(cocktails[i], field)]
+            columns[field + '_offsets'] = offsets
+            columns[field + '_values'] = narrow_ids(values)
+        symbols = self.symbols.extended(added) if added else self.symbols
+        columns['name_rank'] = _name_rank(symbols, columns['name'])
+        history = self.history.updated(reuse, [cocktails[i].history for i in fresh])
+
+        catalog = type(self)(symbols, columns, history)
+        if self._index is not None:
+            catalog._index = self._index.updated(catalog, reuse)
+        if 'minhash' in self.columns:
+            from .similarity import NUM_HASHES, minhash
+            signatures = np.empty((len(cocktails), NUM_HASHES), dtype=np.uint32)
+            signatures[kept] = self.columns['minhash'].reshape(len(self), NUM_HASHES)[reuse[kept]]
+            signatures[fresh] = minhash(catalog, fresh)
+            columns['minhash'] = signatures.reshape(-1)
+        if self._similarity is not None:
+            catalog._similarity = self._similarity.updated(catalog, reuse)
+        if self._search is not None:
+            catalog._search = self._search.updated(catalog, reuse)
+        return catalog
+
+    def rows(self, start, end):
+        """Catalog of rows [start, end) sharing this one's symbols
+
+        Columns are views where they can be; list offsets are rebased.
+        """
+        columns = {}
+        for field in ATOM_FIELDS + ('strength_value', 'complexity_value'):
+            columns[field] = self.columns[field][start:end]
+        for field in LIST_FIELDS:
+            offsets = self.columns[field + '_offsets'][start:end + 1]
+            columns[field + '_values'] = self.columns[field + '_values'][offsets[0]:offsets[-1]]
+            columns[field + '_offsets'] = offsets - offsets[0]
+        columns['name_rank'] = _name_rank(self.symbols, columns['name'])
+        offsets = self.history.offsets[start:end + 1]
+        history = StringTable(offsets - offsets[0], self.history.blob[offsets[0]:offsets[-1]])
+        return type(self)(self.symbols, columns, history)
+
+    def __len__(self):
+        return len(self.columns['name'])
+
+    @property
+    def index(self):
+        """Inverted attribute indexes, built on first use"""
+        if self._index is None:
+            with self._build_lock:
+                if self._index is None:
+                    from .index import CatalogIndex
+                    self._index = CatalogIndex(self)
+        return self._index
+
+    @property
+    def ingredient_bits(self):
+        """Recipe ingredient bitsets, built on first use"""
+        if self._ingredient_bits is None:
+            with self._build_lock:
+                if self._ingredient_bits is None:
+                    from .inventory import IngredientBitsets
+                    self._ingredient_bits = IngredientBitsets(self)
+        return self._ingredient_bits
+
+    @property
+    def similarity(self):
+        """MinHash/LSH similarity index, built on first use"""
+        if self._similarity is None:
+            with self._build_lock:
+                if self._similarity is None:
+                    from .similarity import SimilarityIndex
+                    self._similarity = SimilarityIndex(self)
+        return self._similarity
+
+    @property
+    def search(self):
+        """Word index over names, ingredients and history, built on first use"""
+        if self._search is None:
+            with self._build_lock:
+                if self._search is None:
+                    from .search import SearchIndex
+                    self._search = SearchIndex(self)
+        return self._search
+
+    def symbol_id(self, value):
+        """Symbol id of value, or -1 when it never occurs in the catalog"""
+        return self.symbols.find(value)
+
+    def field(self, name):
+        """Read-only view of one Cocktail field, indexed by row"""
+        if name in ATOM_FIELDS:
+            return AtomColumn(self.columns[name], self.symbols)
+        if name in LIST_FIELDS:
+            return ListColumn(self.columns[name + '_offsets'], self.columns[name + '_values'], self.symbols)
+        if name == 'history':
+            return self.history
+        raise KeyError(name)
+
+    def memory_usage(self):
+        """Bytes held by each column, the symbols and the history; indexes are not counted"""
+        usage = {name: column.nbytes for name, column in self.columns.items()}
+        usage['symbols'] = self.symbols.nbytes
+        usage['history'] = self.history.nbytes
+        return usage
+
+    def rows_containing(self, field, value):
+        """Boolean mask of cocktails whose list field contains value"""
+        mask = np.zeros(len(self), dtype=bool)
+        symbol = self.symbol_id(value)
+        if symbol < 0:
+            return mask
+        hits = np.flatnonzero(self.columns[field + '_values'] == symbol)
+        rows = np.searchsorted(self.columns[field + '_offsets'], hits, side='right') - 1
+        mask[rows] = True
+        return mask
+
+    def cocktail(self, index):
+        """Materialize one row as a Cocktail"""
+        return Cocktail(*(self.field(field)[index] for field in Cocktail._fields))
+
+    def cocktails(self):
+        """Every row as a Cocktail, decoding each column in one pass"""
+        symbols = list(self.symbols)
+        fields = []
+        for field in Cocktail._fields:
+            if field in ATOM_FIELDS:
+                fields.append([symbols[i] for i in self.columns[field].tolist()])
+            elif field in LIST_FIELDS:
+                values = [symbols[i] for i in self.columns[field + '_values'].tolist()]
+                bounds = self.columns[field + '_offsets'].tolist()
+                fields.append([values[start:end] for start, end in zip(bounds, bounds[1:])])
+            else:
+                fields.append(list(self.history))
+        return [Cocktail(*row) for row in zip(*fields)]
+
+
+def score_cocktail(cocktail, prefs):
+    """Score one Cocktail against prefs with the same rules as score_catalog"""
+    if cocktail.base_spirit == prefs.spirit:
+        score = SPIRIT_WEIGHT
+    else:
+        score = NO_PREFERENCE_WEIGHT if prefs.spirit == 'no_preference' else 0
+    strength = STRENGTH_VALUES.get(cocktail.strength, 0)
+    if strength and abs(int(prefs.strength) - strength) <= 2:
+        score += STRENGTH_WEIGHT
+    complexity = COMPLEXITY_VALUES.get(cocktail.complexity, 0)
+    if complexity and complexity <= SKILL_LIMITS.get(prefs.skill, 0):
+        score += SKILL_WEIGHT
+    if cocktail.season in ('all_seasons', prefs.season):
+        score += SEASON_WEIGHT
+    if prefs.occasion in cocktail.occasions:
+        score += OCCASION_WEIGHT
+    if prefs.flavor in cocktail.flavors:
+        score += FLAVOR_WEIGHT
+    return score
+
+
+def score_catalog(catalog, prefs):
+    """Score every cocktail against prefs; mirrors calculate_match_score/2"""
+    columns = catalog.columns
+
+    spirit = catalog.symbol_id(prefs.spirit)
+    fallback = NO_PREFERENCE_WEIGHT if prefs.spirit == 'no_preference' else 0
+    scores = np.where(columns['base_spirit'] == spirit, SPIRIT_WEIGHT, fallback).astype(np.int32)
+
+    strength = columns['strength_value'].astype(np.int32)
+    strength_ok = (strength > 0) & (np.abs(int(prefs.strength) - strength) <= 2)
+    scores += STRENGTH_WEIGHT * strength_ok
+
+    complexity = columns['complexity_value']
+    skill_ok = (complexity > 0) & (complexity <= SKILL_LIMITS.get(prefs.skill, 0))
+    scores += SKILL_WEIGHT * skill_ok
+
+    season = columns['season']
+    season_ok = (season == catalog.symbol_id('all_seasons')) | (season == catalog.symbol_id(prefs.season))
+    scores += SEASON_WEIGHT * season_ok
+
+    scores += OCCASION_WEIGHT * catalog.rows_containing('occasions', prefs.occasion)
+    scores += FLAVOR_WEIGHT * catalog.rows_containing('flavors', prefs.flavor)
+    return scores
+
+
+def recommend(catalog, prefs, offset=0, limit=None):
+    """One page of the matches with Score >= 3 as (indices, scores, total)
+
+    Candidates come from the catalog's posting lists, so only cocktails
+    that can reach the threshold are scored. Pages are ranked by score,
+    then name.
+    """
+    matches, scores = catalog.index.matches(prefs)
+    return rank(catalog.columns['name_rank'], matches, scores, offset, limit)
+
+
+def makeable(catalog, prefs, inventory, max_missing=0, offset=0, limit=None):
+    """One page of the cocktails missing at most max_missing ingredients
+
+    Ranked by match score, then name, as (indices, scores, total). There is
+    no score cutoff: everything the inventory can make is listed.
+    """
+    missing = catalog.ingredient_bits.missing_counts(inventory)
+    ids = np.flatnonzero(missing <= max_missing).astype(np.int32)
+    scores = score_catalog(catalog, prefs)[ids]
+    return rank(catalog.columns['name_rank'], ids, scores, offset, limit)
+
+
+def similar(catalog, name, k=10):
+    """(indices, similarities) of the k cocktails most like the one called name"""
+    rows = np.flatnonzero(catalog.columns['name'] == catalog.symbol_id(name))
+    if not len(rows):
+        raise UnknownCocktailError(f"Unknown cocktail '{name}'")
+    return catalog.similarity.similar(int(rows[0]), k)
+
+
+def search(catalog, query, offset=0, limit=None):
+    """One page of the cocktails matching the words of query as (indices, scores, total)
+
+    Scores are relevance: the weight of the best field each word was found in, summed.
+    """
+    return catalog.search.search(query, offset, limit)
@@ -0,0 +1,79 @@
+"""Result cards shown in the results tab
+
+Cards are built as (text, tag) segments. The results view inserts them
+with Text tags for styling; the format_* helpers join them into plain text.
+"""
+
+RULE_WIDTH = 60
+
+
+def _field(label, value):
+    return [(f"   {label:<13}", 'label'), (f"{value}\n", 'value')]
+
+
+def recommendation_card(match):
+    """Segments of one scored result card"""
+    cocktail, score = match
+    return [
+        (f"{cocktail.name.upper()}\n", 'title'),
+        (f"   Match score {score}/13\n", 'score'),
+        *_field("Base spirit", cocktail.base_spirit),
+        *_field("Strength", f"{cocktail.strength} | Complexity: {cocktail.complexity}"),
+        *_field("Ingredients", ', '.join(cocktail.ingredients)),
+        *_field("Techniques", ', '.join(cocktail.techniques)),
+        *_field("Flavors", ', '.join(cocktail.flavors)),
+        *_field("Best for", ', '.join(cocktail.occasions)),
+        *_field("Season", f"{cocktail.season} | Glass: {cocktail.glass}"),
+        *_field("History", cocktail.history),
+        ("─" * RULE_WIDTH + "\n\n", 'rule'),
+    ]
+
+
+def browse_card(match):
+    """Segments of one short catalog card"""
+    cocktail = match.cocktail
+    return [
+        (f"{cocktail.name.upper()}\n", 'title'),
+        *_field("Spirit", f"{cocktail.base_spirit} | Strength: {cocktail.strength} | Skill: {cocktail.complexity}"),
+        *_field("Flavors", ', '.join(cocktail.flavors)),
+        *_field("Best for", ', '.join(cocktail.occasions)),
+        ("─" * RULE_WIDTH + "\n\n", 'rule'),
+    ]
+
+
+def makeable_card(match, inventory):
+    """Segments of a result card that also lists what inventory lacks"""
+    missing = [item for item in dict.fromkeys(match.cocktail.ingredients) if item not in inventory]
+    card = recommendation_card(match)
+    status = f"Missing: {', '.join(missing)}" if missing else "You have everything"
+    # After the score line
+    card[2:2] = _field("Your bar", status)
+    return card
+
+
+def similar_card(match):
+    """Segments of a result card scored by similarity in percent"""
+    card = recommendation_card(match)
+    card[1] = (f"   Similarity {match.score}%\n", 'score')
+    return card
+
+
+def search_card(match):
+    """Segments of a full result card without the score line"""
+    card = recommendation_card(match)
+    del card[1]
+    return card
+
+
+def plain_text(cards):
+    return ''.join(text for card in cards for text, _ in card)
+
+
+def format_recommendations(matches):
+    """Render scored cocktail records as result cards"""
+    return plain_text(recommendation_card(match) for match in matches)
+
+
+def format_browse_entries(matches):
+    """Render catalog records as short browse cards"""
+    return plain_text(browse_card(match) for match in matches)
@@ -1,12 +1,24 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import subprocess
-import os
 from tkinter import font as tkfont
 import threading
-from pathlib import Path
+from functools import partial
 
-KB_PATH = Path(__file__).parent / 'knowledge' / 'cocktail_knowledge_base.pl'
+from .cancel import CancelToken
+from .formatting import makeable_card, search_card, similar_card
+from .kb import KB_PATH, Preferences, normalize_inventory
+from .metrics import Trace, record, tracing
+from .results_view import FIRST_BATCH, PAGE_SIZE, ResultsView
+from .tasks import DRAIN_BATCH, Busy, TaskRunner
+
+# Quiet period after the last preference change before a live refresh
+DEBOUNCE_MS = 300
+# Suggestions listed under the search box
+TYPEAHEAD_LIMIT = 8
+# How often finished background work is picked up, and how long closing
+# the window waits for queries to stop
+POLL_MS = 15
+SHUTDOWN_TIMEOUT = 2.0
 
 class ModernCocktailExpertSystem:
     def __init__(self, root):
@@ -33,9 +45,106 @@ class ModernCocktailExpertSystem:
         # Store selected buttons for visual feedback
         self.selected_buttons = {}
         
+        # One cached Recommender per engine, created on the task runner by
+        # the warm-up or the first query, so the recommender module (and
+        # numpy) is never imported or loaded on the Tk thread
+        self.recommenders = {}
+        self.recommender_lock = threading.Lock()
+        # Tabs whose widgets are built after the first paint
+        self.deferred_tabs = []
+        # Bumped per query so batches from a superseded one are dropped
+        self.request_id = 0
+        self.active_query = None
+        self.active_trace = None
+        self.live_refresh = None
+        # Bumped per keystroke so stale suggestions are dropped
+        self.typeahead_id = 0
+        # All backend work runs here; results come back through drain_tasks
+        self.tasks = TaskRunner()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         # Configure styles
         self.setup_styles()
         self.setup_ui()
+        self.root.after_idle(self.after_first_paint)
+        self.drain_job = self.root.after(POLL_MS, self.drain_tasks)
+        
+    def on_close(self):
+        """Stop background work before the window goes, so no swipl process outlives it"""
+        self.root.after_cancel(self.drain_job)
+        if self.active_query is not None:
+            self.active_query.cancel()
+        self.tasks.shutdown(SHUTDOWN_TIMEOUT)
+        with self.recommender_lock:
+            recommenders = list(self.recommenders.values())
+        for recommender in recommenders:
+            recommender.close()
+        self.root.destroy()
+
+    def drain_tasks(self):
+        """Run the main-thread callbacks posted by background work, a batch per tick"""
+        try:
+            self.tasks.drain(DRAIN_BATCH)
+        finally:
+            self.drain_job = self.root.after(POLL_MS, self.drain_tasks)
+
+    def run_task(self, kind, func, *args, failure=None):
+        """Queue func(*args) on the task runner; failure titles the error dialog if it raises"""
+        on_error = partial(self.show_task_error, failure) if failure else None
+        try:
+            self.tasks.submit(kind, func, *args, on_error=on_error)
+        except Busy:
+            self.stop_progress()
+            self.status_label.config(text="● Busy, try again", fg=self.colors['warning'])
+
+    def show_task_error(self, failure, error):
+        self.stop_progress()
+        self.status_label.config(text="● Error", fg=self.colors['error'])
+        view = self.results_view
+        if not view.complete:
+            # The list was still streaming in; end it where it stopped
+            view.show_error(f"{failure}: {error}")
+            self.results_count.config(text=f"⚠ {view.received} of {view.total} cocktails loaded")
+        messagebox.showerror("Error", f"{failure}: {error}")
+
+    def after_first_paint(self):
+        """Finish the window once it is on screen and warm up the engine"""
+        self.root.update_idletasks()
+        self.run_task('warm_up', self.warm_up, self.engine_var.get())
+        self.build_deferred_tabs()
+
+    def stop_progress(self):
+        # The loading tab may not be built yet
+        if 'progress' in vars(self):
+            self.progress.stop()
+
+    def build_deferred_tabs(self):
+        while self.deferred_tabs:
+            self.deferred_tabs.pop(0)()
+
+    def warm_up(self, name):
+        """Load the selected engine's KB in the background"""
+        try:
+            self.get_recommender(name).warm_up()
+        except Exception:
+            # The first query reports the problem if it persists
+            pass
+
+    def get_recommender(self, name):
+        """Recommender for engine name, created on first use; runs on the task runner"""
+        with self.recommender_lock:
+            if name not in self.recommenders:
+                from .recommender import Recommender
+                self.recommenders[name] = Recommender(name, KB_PATH, watch=True)
+            return self.recommenders[name]
+
+    def current_preferences(self):
+        return Preferences(spirit=self.spirit_var.get(),
+                           flavor=self.flavor_var.get(),
+                           skill=self.skill_var.get(),
+                           strength=self.strength_var.get(),
+                           occasion=self.occasion_var.get(),
+                           season=self.season_var.get())
         
     def setup_styles(self):
         style = ttk.Style()
@@ -53,10 +162,6 @@ class ModernCocktailExpertSystem:
                  background=[('selected', self.colors['primary'])],
                  foreground=[('selected', 'black')])
 
-    # --- rest of the original GUI implementation ---
-    # For brevity this file preserves the original implementation exactly
-    # except for references to the knowledge base file which now use KB_PATH
-
     def setup_ui(self):
         # Header
         self.create_header()
@@ -77,13 +182,14 @@ class ModernCocktailExpertSystem:
         self.loading_frame = tk.Frame(self.notebook, bg=self.colors['background'])
         self.notebook.add(self.loading_frame, text='⏳ LOADING')
         
+        # Bar inventory ("what can I make")
+        self.bar_frame = tk.Frame(self.notebook, bg=self.colors['background'])
+        self.notebook.add(self.bar_frame, text='🧾 MY BAR')
+        
+        # Only the visible tab is built before the window first paints
         self.setup_preferences_tab()
-        self.setup_results_tab()
-        self.setup_loading_tab()
-
-    # NOTE: The following methods are identical to your original file, but
-    # any filesystem references to the knowledge base have been changed
-    # to use KB_PATH (a Path object pointing to the packaged KB file).
+        self.deferred_tabs = [self.setup_results_tab, self.setup_loading_tab, self.setup_bar_tab]
+        self.notebook.bind('<<NotebookTabChanged>>', lambda event: self.build_deferred_tabs())
 
     def create_header(self):
         header_frame = tk.Frame(self.root, bg=self.colors['secondary'], height=80)
@@ -114,6 +220,40 @@ class ModernCocktailExpertSystem:
                                    bg=self.colors['secondary'],
                                    fg=self.colors['success'])
         self.status_label.pack(side='right', padx=20, pady=20)
+        
+        # Phase timings of the last query
+        self.timing_label = tk.Label(header_frame,
+                                   text="",
+                                   font=('Segoe UI', 9),
+                                   bg=self.colors['secondary'],
+                                   fg=self.colors['text_secondary'])
+        self.timing_label.pack(side='right', pady=20)
+        
+        # Search box; suggestions drop down under it as you type
+        self.search_var = tk.StringVar()
+        self.search_entry = tk.Entry(header_frame,
+                                     textvariable=self.search_var,
+                                     font=('Segoe UI', 11),
+                                     width=22,
+                                     bg=self.colors['background'],
+                                     fg=self.colors['text_primary'],
+                                     insertbackground=self.colors['text_primary'],
+                                     relief='flat')
+        self.search_entry.pack(side='right', padx=10, pady=26)
+        self.search_entry.bind('<KeyRelease>', self.on_search_typed)
+        self.search_entry.bind('<Return>', lambda event: self.run_search())
+        self.search_entry.bind('<Down>', lambda event: self.focus_suggestions())
+        self.search_entry.bind('<Escape>', lambda event: self.hide_suggestions())
+        self.suggestions = tk.Listbox(self.root,
+                                      font=('Segoe UI', 11),
+                                      bg=self.colors['surface'],
+                                      fg=self.colors['text_primary'],
+                                      selectbackground=self.colors['selected'],
+                                      relief='flat',
+                                      activestyle='none')
+        self.suggestions.bind('<ButtonRelease-1>', lambda event: self.pick_suggestion())
+        self.suggestions.bind('<Return>', lambda event: self.pick_suggestion())
+        self.suggestions.bind('<Escape>', lambda event: self.hide_suggestions())
 
     def setup_preferences_tab(self):
         # Main container with modern scrollbar
@@ -288,6 +428,36 @@ class ModernCocktailExpertSystem:
             btn = self.create_choice_button(season_container, text, value, self.season_var, color, "season")
             btn.pack(side='left', padx=5, pady=5, fill='x', expand=True)
         
+        # ===== RECOMMENDATION ENGINE =====
+        engine_frame = self.create_modern_section("⚙️ Recommendation Engine", self.scrollable_frame)
+        self.engine_var = tk.StringVar(value="python")
+        
+        engines = [
+            ("🐍 Python Engine\n(in-process, fastest)", "python", "#FCD34D"),
+            ("🦉 Prolog Backend\n(SWI-Prolog workers)", "prolog", "#93C5FD")
+        ]
+        
+        engine_container = tk.Frame(engine_frame, bg=self.colors['surface'])
+        engine_container.pack(fill='x', padx=10, pady=10)
+        
+        for i, (text, value, color) in enumerate(engines):
+            btn = self.create_choice_button(engine_container, text, value, self.engine_var, color, "engine")
+            btn.pack(side='left', padx=5, pady=5, fill='x', expand=True)
+        
+        # Live results: refresh recommendations whenever a preference changes
+        self.live_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(engine_frame, text="⚡ Live results (update as you change preferences)",
+                       variable=self.live_var,
+                       bg=self.colors['surface'], fg=self.colors['text_primary'],
+                       selectcolor=self.colors['secondary'],
+                       activebackground=self.colors['surface'],
+                       activeforeground=self.colors['text_primary'],
+                       font=('Segoe UI', 10)).pack(anchor='w', padx=10, pady=(0, 10))
+        
+        for var in (self.spirit_var, self.flavor_var, self.strength_var, self.skill_var,
+                    self.occasion_var, self.season_var, self.engine_var):
+            var.trace_add('write', self.on_preferences_changed)
+        
         # ===== ACTION BUTTONS =====
         button_frame = tk.Frame(self.scrollable_frame, bg=self.colors['background'])
         button_frame.pack(fill='x', pady=30)
@@ -441,7 +611,9 @@ class ModernCocktailExpertSystem:
                                    bd=0)
         
         scrollbar = ttk.Scrollbar(text_container, command=self.results_text.yview)
-        self.results_text.config(yscrollcommand=scrollbar.set)
+        # Cards are inserted a page at a time as the user scrolls
+        self.results_view = ResultsView(self.results_text, scrollbar, self.colors, self.tasks,
+                                        on_similar=self.show_similar)
         
         self.results_text.pack(side='left', fill='both', expand=True)
         scrollbar.pack(side='right', fill='y')
@@ -473,10 +645,54 @@ class ModernCocktailExpertSystem:
         self.progress = ttk.Progressbar(loading_container, mode='indeterminate', length=400)
         self.progress.pack(pady=30)
 
-    def show_welcome_message(self):
-        self.results_text.config(state='normal')
-        self.results_text.delete('1.0', 'end')
+    def setup_bar_tab(self):
+        bar_container = tk.Frame(self.bar_frame, bg=self.colors['background'])
+        bar_container.pack(fill='both', expand=True, padx=20, pady=20)
         
+        tk.Label(bar_container, text="🧾 What Can I Make?",
+                font=('Segoe UI', 20, 'bold'),
+                bg=self.colors['background'],
+                fg=self.colors['text_primary']).pack(anchor='w')
+        
+        tk.Label(bar_container,
+                text="List the bottles and mixers you have, separated by commas or new lines. "
+                     "Matches are ranked by your preferences.",
+                font=('Segoe UI', 11),
+                bg=self.colors['background'],
+                fg=self.colors['text_secondary'],
+                wraplength=800, justify='left').pack(anchor='w', pady=(5, 15))
+        
+        self.inventory_text = tk.Text(bar_container,
+                                     height=10,
+                                     bg=self.colors['surface'],
+                                     fg=self.colors['text_primary'],
+                                     insertbackground=self.colors['text_primary'],
+                                     font=('Consolas', 11),
+                                     wrap='word',
+                                     padx=10,
+                                     pady=10,
+                                     relief='flat',
+                                     bd=0)
+        self.inventory_text.pack(fill='both', expand=True)
+        
+        options_frame = tk.Frame(bar_container, bg=self.colors['background'])
+        options_frame.pack(fill='x', pady=15)
+        
+        tk.Label(options_frame, text="Allow missing ingredients:",
+                font=('Segoe UI', 11),
+                bg=self.colors['background'],
+                fg=self.colors['text_primary']).pack(side='left')
+        
+        self.missing_var = tk.IntVar(value=0)
+        tk.Spinbox(options_frame, from_=0, to=5, width=4,
+                   textvariable=self.missing_var,
+                   font=('Segoe UI', 11)).pack(side='left', padx=10)
+        
+        btn = self.create_modern_button(options_frame, "🍹 What Can I Make?", self.find_makeable,
+                                        self.colors['success'])
+        btn.pack(side='right')
+
+    def show_welcome_message(self):
         welcome_text = """
 ╔══════════════════════════════════════════════════╗
                🍸 WELCOME TO MIXMASTER PRO         
@@ -500,180 +716,302 @@ class ModernCocktailExpertSystem:
 
 Ready to find your perfect drink? Let's get started! 🎉
 """
-        self.results_text.insert('1.0', welcome_text)
-        self.results_text.config(state='disabled')
+        self.results_view.show_text(welcome_text)
         self.results_count.config(text="👆 Set preferences to begin")
 
-    def get_recommendations(self):
-        # Show loading screen
-        self.notebook.select(2)  # Loading tab
-        self.progress.start(10)
+    def on_preferences_changed(self, *args):
+        """Debounce preference changes into a single live refresh"""
+        if not self.live_var.get():
+            return
+        if self.live_refresh is not None:
+            self.root.after_cancel(self.live_refresh)
+        self.live_refresh = self.root.after(DEBOUNCE_MS, lambda: self.get_recommendations(live=True))
+
+    def start_query(self, name):
+        """Cancel the query in flight; returns (request id, cancel token, trace) for a new one"""
+        if self.live_refresh is not None:
+            self.root.after_cancel(self.live_refresh)
+            self.live_refresh = None
+        if self.active_query is not None:
+            self.active_query.cancel()
+        self.request_id += 1
+        self.active_query = CancelToken()
+        self.active_trace = Trace(name)
+        return self.request_id, self.active_query, self.active_trace
+
+    def get_recommendations(self, live=False):
+        self.build_deferred_tabs()
+        if not live:
+            # Show loading screen
+            self.notebook.select(2)  # Loading tab
+            self.progress.start(10)
         self.status_label.config(text="● Processing...", fg=self.colors['warning'])
         
-        # Run in separate thread to prevent UI freezing
-        thread = threading.Thread(target=self.process_recommendations)
-        thread.daemon = True
-        thread.start()
+        # Run on the task runner to prevent UI freezing
+        # Tk variables are read here, on the main thread
+        request_id, cancel, trace = self.start_query('gui.recommend')
+        self.run_task('query', self.process_recommendations, request_id, cancel, trace,
+                      self.engine_var.get(), self.current_preferences(), live,
+                      failure="Failed to get recommendations")
 
-    def process_recommendations(self):
-        try:
-            if not KB_PATH.exists():
-                self.root.after(0, lambda: messagebox.showerror("Error", f"{KB_PATH} file not found!"))
-                return
-            
-            # Build Prolog query
-            query = f"""
-            assertz(known(spirit_preference, {self.spirit_var.get()}, _)),
-            assertz(known(flavor_notes, {self.flavor_var.get()}, _)),
-            assertz(known(skill_level, {self.skill_var.get()}, _)),
-            assertz(known(strength, {self.strength_var.get()}, _)),
-            assertz(known(occasion_type, {self.occasion_var.get()}, _)),
-            assertz(known(current_season, {self.season_var.get()}, _)),
-            find_and_display_recommendations.
-            """
-            
-            process = subprocess.Popen(['swipl', '-q', '-s', str(KB_PATH)], 
-                                     stdin=subprocess.PIPE, 
-                                     stdout=subprocess.PIPE, 
-                                     stderr=subprocess.PIPE,
-                                     text=True)
-            
-            stdout, stderr = process.communicate(input=query, timeout=30)
-            
-            # Update UI in main thread
-            self.root.after(0, lambda: self.display_results(stdout, stderr))
-            
-        except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("Error", f"Failed to get recommendations: {str(e)}"))
+    def process_recommendations(self, request_id, cancel, trace, engine, prefs, live=False):
+        if not KB_PATH.exists():
+            raise FileNotFoundError(f"{KB_PATH} file not found!")
+        recommender = self.get_recommender(engine)
+        batches = recommender.stream_recommend(prefs, 0, PAGE_SIZE, FIRST_BATCH, timeout=30, cancel=cancel)
+        self.stream_batches(request_id, trace, batches, partial(self.display_results, live=live),
+                            "🎯 {} cocktails matched your preferences", partial(recommender.recommend, prefs))
+
+    def stream_batches(self, request_id, trace, batches, show_first, summary, fetch):
+        """Pass the first page's batches to the main thread as the backend produces them
+
+        Later pages are only fetched, through fetch(offset, limit), when the
+        user scrolls to them.
+        """
+        with tracing(trace):
+            for number, page in enumerate(batches):
+                if request_id != self.request_id:
+                    batches.close()
+                    return
+                self.tasks.post(show_first if number == 0 else self.append_results, request_id, page)
+        self.tasks.post(self.finish_results, request_id, summary, fetch)
 
-    def display_results(self, stdout, stderr):
+    def display_results(self, request_id, page, live=False):
+        if request_id != self.request_id:
+            return
+        record('gui.first_result', self.active_trace.elapsed_ms(), self.active_trace)
         self.progress.stop()
-        self.notebook.select(1)  # Results tab
-        
-        self.results_text.config(state='normal')
-        self.results_text.delete('1.0', 'end')
-        
-        if stdout:
-            formatted_output = self.format_output(stdout)
-            self.results_text.insert('1.0', formatted_output)
-            
-            # Count cocktails found
-            cocktail_count = formatted_output.count('🍸 🍸 🍸')
-            self.results_count.config(text=f"🎯 {cocktail_count} cocktails matched your preferences")
+        # Live refreshes update the results tab without leaving the preferences
+        if not live or self.notebook.index('current') == 2:
+            self.notebook.select(1)  # Results tab
+        
+        if page.matches:
+            with tracing(self.active_trace):
+                self.results_view.show_page(page, detailed=True)
+            self.update_results_count()
         else:
-            self.results_text.insert('1.0', "❌ No results returned from the expert system.")
+            self.results_view.show_text("❌ No strong matches found with your preferences.")
             self.results_count.config(text="❌ No matches found")
             
-        if stderr and "Warning" not in stderr:
-            self.results_text.insert('end', f"\n\n--- System Messages ---\n{stderr}")
-            
-        self.results_text.config(state='disabled')
         self.status_label.config(text="● Ready", fg=self.colors['success'])
 
-    def format_output(self, output):
-        """Fixed output formatting that preserves all data"""
-        lines = output.split('\n')
-        formatted_lines = []
-        current_section = None
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            if 'Match Score:' in line:
-                score = line.split(':')[1].strip()
-                formatted_lines.append(f"🎯 **MATCH SCORE: {score}**")
-                formatted_lines.append("─" * 50)
-            elif '**' in line and 'Match Score' not in line:
-                # Cocktail name
-                cocktail_name = line.replace('**', '').strip()
-                formatted_lines.append(f"\n🍸 🍸 🍸  {cocktail_name.upper()}  🍸 🍸 🍸\n")
-            elif 'Base Spirit:' in line:
-                formatted_lines.append(f"   🍾 {line}")
-            elif 'Strength:' in line and 'Complexity:' in line:
-                formatted_lines.append(f"   ⚡ {line}")
-            elif 'Ingredients:' in line:
-                # Don't add extra section headers, just show the content
-                ingredients = line.replace('Ingredients:', '').strip()
-                formatted_lines.append(f"   🧪 Ingredients: {ingredients}")
-            elif 'Techniques:' in line:
-                techniques = line.replace('Techniques:', '').strip()
-                formatted_lines.append(f"   ⚙️  Techniques: {techniques}")
-            elif 'Flavors:' in line:
-                flavors = line.replace('Flavors:', '').strip()
-                formatted_lines.append(f"   👅 Flavors: {flavors}")
-            elif 'Best for:' in line:
-                best_for = line.replace('Best for:', '').strip()
-                formatted_lines.append(f"   🎉 Best for: {best_for}")
-            elif 'Season:' in line and 'Glass:' in line:
-                formatted_lines.append(f"   🏺 {line}")
-            elif 'History:' in line:
-                history = line.replace('History:', '').strip()
-                formatted_lines.append(f"   📖 History: {history}")
-            elif '----------------------------------------' in line:
-                formatted_lines.append("\n" + "═" * 60 + "\n")
-            elif line and not any(keyword in line for keyword in 
-                                ['Match Score', '**', 'Base Spirit', 'Strength', 
-                                 'Ingredients', 'Techniques', 'Flavors', 'Best for', 
-                                 'Season', 'Glass', 'History', '----------------------------------------']):
-                # If it's a regular line that got separated, add it with proper indentation
-                formatted_lines.append(f"   {line}")
-        
-        return '\n'.join(formatted_lines)
+    def append_results(self, request_id, page):
+        if request_id == self.request_id:
+            with tracing(self.active_trace):
+                self.results_view.append(page)
+            self.update_results_count()
+
+    def update_results_count(self):
+        view = self.results_view
+        self.results_count.config(text=f"⏳ {view.received} of {view.total} cocktails loaded...")
+
+    def finish_results(self, request_id, summary, fetch):
+        if request_id != self.request_id:
+            return
+        trace = self.active_trace
+        record('gui.total', trace.elapsed_ms(), trace)
+        self.timing_label.config(text=f"⏱ {trace.summary()}")
+        if self.results_view.received:
+            self.results_view.finish(fetch)
+            self.results_count.config(text=summary.format(self.results_view.total))
 
     def browse_all(self):
-        try:
-            if not KB_PATH.exists():
-                messagebox.showerror("Error", f"{KB_PATH} file not found!")
-                return
-            
-            self.notebook.select(2)  # Loading tab
-            self.progress.start(10)
-            
-            thread = threading.Thread(target=self.process_browse_all)
-            thread.daemon = True
-            thread.start()
+        if not KB_PATH.exists():
+            messagebox.showerror("Error", f"{KB_PATH} file not found!")
+            return
+        
+        self.build_deferred_tabs()
+        self.notebook.select(2)  # Loading tab
+        self.progress.start(10)
+        
+        request_id, cancel, trace = self.start_query('gui.browse')
+        self.run_task('query', self.process_browse_all, request_id, cancel, trace, self.engine_var.get(),
+                      failure="Failed to browse cocktails")
+
+    def process_browse_all(self, request_id, cancel, trace, engine):
+        recommender = self.get_recommender(engine)
+        batches = recommender.stream_browse(0, PAGE_SIZE, FIRST_BATCH, timeout=30, cancel=cancel)
+        self.stream_batches(request_id, trace, batches, self.display_browse_results,
+                            "📚 {} total cocktails in database", recommender.browse)
+
+    def display_browse_results(self, request_id, page):
+        if request_id != self.request_id:
+            return
+        record('gui.first_result', self.active_trace.elapsed_ms(), self.active_trace)
+        self.progress.stop()
+        self.notebook.select(1)  # Results tab
+        
+        if page.matches:
+            with tracing(self.active_trace):
+                self.results_view.show_page(page, detailed=False, heading="📚 COMPLETE COCKTAIL DATABASE")
+            self.update_results_count()
+        else:
+            self.results_view.show_text("❌ No cocktails found in database.")
+            self.results_count.config(text="❌ Database empty")
             
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to browse cocktails: {str(e)}")
+        self.status_label.config(text="● Ready", fg=self.colors['success'])
 
-    def process_browse_all(self):
+    def find_makeable(self):
+        self.build_deferred_tabs()
+        text = self.inventory_text.get('1.0', 'end')
+        inventory = [item for line in text.splitlines() for item in line.split(',')]
         try:
-            process = subprocess.Popen(['swipl', '-q', '-s', str(KB_PATH)], 
-                                     stdin=subprocess.PIPE, 
-                                     stdout=subprocess.PIPE, 
-                                     stderr=subprocess.PIPE,
-                                     text=True)
-            
-            stdout, stderr = process.communicate(input="browse_all_cocktails.", timeout=30)
-            
-            self.root.after(0, lambda: self.display_browse_results(stdout, stderr))
-            
-        except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("Error", f"Failed to browse cocktails: {str(e)}"))
+            max_missing = self.missing_var.get()
+        except tk.TclError:
+            # The spinbox was cleared or holds text
+            max_missing = 0
+        
+        self.notebook.select(2)  # Loading tab
+        self.progress.start(10)
+        self.status_label.config(text="● Processing...", fg=self.colors['warning'])
+        
+        request_id, cancel, trace = self.start_query('gui.makeable')
+        self.run_task('query', self.process_makeable, request_id, cancel, trace, self.engine_var.get(),
+                      self.current_preferences(), inventory, max_missing, failure="Failed to match your bar")
 
-    def display_browse_results(self, stdout, stderr):
+    def process_makeable(self, request_id, cancel, trace, engine, prefs, inventory, max_missing):
+        recommender = self.get_recommender(engine)
+        batches = recommender.stream_makeable(prefs, inventory, max_missing, 0, PAGE_SIZE, FIRST_BATCH,
+                                              timeout=30, cancel=cancel)
+        stock = set(normalize_inventory(inventory))
+        self.stream_batches(request_id, trace, batches, partial(self.display_makeable_results, stock=stock),
+                            "🧾 You can make {} cocktails",
+                            partial(recommender.makeable, prefs, inventory, max_missing))
+
+    def display_makeable_results(self, request_id, page, stock):
+        if request_id != self.request_id:
+            return
+        record('gui.first_result', self.active_trace.elapsed_ms(), self.active_trace)
         self.progress.stop()
         self.notebook.select(1)  # Results tab
         
-        self.results_text.config(state='normal')
-        self.results_text.delete('1.0', 'end')
+        if page.matches:
+            with tracing(self.active_trace):
+                self.results_view.show_page(page, heading="🧾 WHAT YOU CAN MAKE",
+                                            card=partial(makeable_card, inventory=stock))
+            self.update_results_count()
+        else:
+            self.results_view.show_text("❌ Nothing in the catalog can be made from your bar yet.")
+            self.results_count.config(text="❌ No makeable cocktails")
+            
+        self.status_label.config(text="● Ready", fg=self.colors['success'])
+
+    def show_similar(self, name):
+        """Replace the results with the cocktails most like name"""
+        self.status_label.config(text="● Processing...", fg=self.colors['warning'])
+        request_id, cancel, trace = self.start_query('gui.similar')
+        self.run_task('query', self.process_similar, request_id, trace, self.engine_var.get(), name,
+                      failure="Failed to find similar cocktails")
+
+    def process_similar(self, request_id, trace, engine, name):
+        with tracing(trace):
+            page = self.get_recommender(engine).similar(name)
+        self.tasks.post(self.display_similar_results, request_id, page, name)
+
+    def display_similar_results(self, request_id, page, name):
+        if request_id != self.request_id:
+            return
+        trace = self.active_trace
+        record('gui.first_result', trace.elapsed_ms(), trace)
+        
+        if page.matches:
+            with tracing(trace):
+                self.results_view.show_page(page, heading=f"🔍 MORE LIKE {name.upper()}", card=similar_card)
+                self.results_view.finish()
+            self.results_count.config(text=f"🔍 {page.total} similar cocktails")
+        else:
+            self.results_view.show_text(f"❌ Nothing in the catalog shares ingredients or flavors with {name}.")
+            self.results_count.config(text="❌ No similar cocktails")
         
-        self.results_text.insert('1.0', "📚 COMPLETE COCKTAIL DATABASE\n\n")
-        self.results_text.insert('end', "═" * 50 + "\n\n")
+        record('gui.total', trace.elapsed_ms(), trace)
+        self.timing_label.config(text=f"⏱ {trace.summary()}")
+        self.status_label.config(text="● Ready", fg=self.colors['success'])
+
+    def on_search_typed(self, event):
+        """Look up suggestions for the text typed so far"""
+        if event.keysym in ('Return', 'Down', 'Up', 'Escape'):
+            return
+        query = self.search_var.get()
+        self.typeahead_id += 1
+        if not query.strip():
+            self.hide_suggestions()
+            return
+        # Suggestions are best effort: no error dialog, Enter reports failures
+        self.run_task('typeahead', self.process_typeahead, self.typeahead_id, self.engine_var.get(), query)
+
+    def process_typeahead(self, typeahead_id, engine, query):
+        if typeahead_id == self.typeahead_id:
+            page = self.get_recommender(engine).search(query, limit=TYPEAHEAD_LIMIT)
+            self.tasks.post(self.show_suggestions, typeahead_id, page)
+
+    def show_suggestions(self, typeahead_id, page):
+        if typeahead_id != self.typeahead_id:
+            return
+        if not page.matches:
+            self.hide_suggestions()
+            return
+        self.suggestions.delete(0, 'end')
+        for match in page.matches:
+            self.suggestions.insert('end', match.cocktail.name)
+        self.suggestions.config(height=len(page.matches))
+        self.suggestions.place(in_=self.search_entry, x=0, rely=1.0, relwidth=1.0, y=4)
+        self.suggestions.lift()
+
+    def hide_suggestions(self):
+        self.suggestions.place_forget()
+
+    def focus_suggestions(self):
+        if self.suggestions.winfo_ismapped():
+            self.suggestions.focus_set()
+            self.suggestions.selection_clear(0, 'end')
+            self.suggestions.selection_set(0)
+            self.suggestions.activate(0)
+
+    def pick_suggestion(self):
+        selection = self.suggestions.curselection()
+        if selection:
+            self.search_var.set(self.suggestions.get(selection[0]))
+            self.search_entry.icursor('end')
+            self.run_search()
+
+    def run_search(self):
+        """Show every cocktail matching the search box in the results tab"""
+        query = self.search_var.get()
+        self.typeahead_id += 1
+        self.hide_suggestions()
+        if not query.strip():
+            return
+        self.build_deferred_tabs()
+        self.status_label.config(text="● Processing...", fg=self.colors['warning'])
+        request_id, cancel, trace = self.start_query('gui.search')
+        self.run_task('query', self.process_search, request_id, trace, self.engine_var.get(), query,
+                      failure="Search failed")
+
+    def process_search(self, request_id, trace, engine, query):
+        recommender = self.get_recommender(engine)
+        with tracing(trace):
+            page = recommender.search(query, limit=PAGE_SIZE)
+        self.tasks.post(self.display_search_results, request_id, page, query,
+                        partial(recommender.search, query))
+
+    def display_search_results(self, request_id, page, query, fetch):
+        if request_id != self.request_id:
+            return
+        trace = self.active_trace
+        record('gui.first_result', trace.elapsed_ms(), trace)
+        self.notebook.select(1)  # Results tab
         
-        if stdout:
-            formatted_output = self.format_output(stdout)
-            self.results_text.insert('end', formatted_output)
-            
-            cocktail_count = formatted_output.count('🍸 🍸 🍸')
-            self.results_count.config(text=f"📚 {cocktail_count} total cocktails in database")
+        if page.matches:
+            with tracing(trace):
+                self.results_view.show_page(page, heading=f"🔎 RESULTS FOR \"{query.strip()}\"", card=search_card)
+                self.results_view.finish(fetch)
+            self.results_count.config(text=f"🔎 {page.total} cocktails found")
         else:
-            self.results_text.insert('end', "❌ No cocktails found in database.")
-            self.results_count.config(text="❌ Database empty")
-            
-        self.results_text.config(state='disabled')
+            self.results_view.show_text(f"❌ No cocktail name, ingredient or history mentions \"{query.strip()}\".")
+            self.results_count.config(text="❌ No matches")
+        
+        record('gui.total', trace.elapsed_ms(), trace)
+        self.timing_label.config(text=f"⏱ {trace.summary()}")
         self.status_label.config(text="● Ready", fg=self.colors['success'])
 
     def reset_preferences(self):
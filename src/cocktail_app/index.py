@@ -0,0 +1,165 @@
+"""Inverted attribute indexes over a Catalog
+
+Posting lists map each spirit, season, flavor, occasion, strength value and
+complexity value to the sorted ids of the cocktails that carry it. A query
+only touches the lists its preferences select, so cocktails that cannot
+reach the score threshold are never looked at.
+"""
+import numpy as np
+
+from . import engine
+
+_EMPTY = np.zeros(0, dtype=np.int32)
+
+# Use the sparse merge while the selected postings hold fewer than
+# 1/SPARSE_RATIO of the catalog
+SPARSE_RATIO = 8
+
+
+def _group_postings(keys, rows, size):
+    """Split rows into sorted, de-duplicated id arrays per key"""
+    if len(keys) == 0:
+        return {}
+    # One int64 per (key, row) pair sorts by key, then id, and drops repeats
+    pairs = np.unique(keys.astype(np.int64) * size + rows)
+    keys, rows = pairs // size, (pairs % size).astype(np.int32)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)]
+    return {int(keys[s]): rows[s:e] for s, e in zip(starts, ends)}
+
+
+class CatalogIndex:
+    """Posting lists for every scored attribute of a Catalog"""
+
+    ATOM_FIELDS = ('base_spirit', 'season', 'strength_value', 'complexity_value')
+    LIST_FIELDS = ('flavors', 'occasions')
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.postings = {}
+        size = max(len(catalog), 1)
+        ids = np.arange(len(catalog), dtype=np.int64)
+        for field in self.ATOM_FIELDS:
+            self.postings[field] = _group_postings(catalog.columns[field], ids, size)
+        for field in self.LIST_FIELDS:
+            offsets = catalog.columns[field + '_offsets']
+            rows = np.repeat(ids, np.diff(offsets))
+            self.postings[field] = _group_postings(catalog.columns[field + '_values'], rows, size)
+
+    def arrays(self):
+        """Posting lists as flat arrays per field: sorted keys, offsets into rows, rows"""
+        arrays = {}
+        for field, postings in self.postings.items():
+            keys = sorted(postings)
+            offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+            np.cumsum([len(postings[key]) for key in keys], out=offsets[1:])
+            arrays[f'index.{field}.keys'] = np.array(keys, dtype=np.int64)
+            arrays[f'index.{field}.offsets'] = offsets
+            arrays[f'index.{field}.rows'] = np.concatenate([postings[key] for key in keys]) if keys else _EMPTY
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, catalog, arrays):
+        """Index over catalog whose posting lists are views of arrays (see arrays)"""
+        index = object.__new__(cls)
+        index.catalog = catalog
+        index.postings = {}
+        for field in cls.ATOM_FIELDS + cls.LIST_FIELDS:
+            keys = arrays[f'index.{field}.keys'].tolist()
+            bounds = arrays[f'index.{field}.offsets'].tolist()
+            rows = arrays[f'index.{field}.rows']
+            index.postings[field] = {key: rows[start:end] for key, start, end in zip(keys, bounds, bounds[1:])}
+        return index
+
+    def updated(self, catalog, reuse):
+        """Index of catalog (see Catalog.updated), patched from this one
+
+        Posting lists are renumbered to the new rows, removed rows drop
+        out and only the rows that had to be encoded are added.
+        """
+        index = object.__new__(type(self))
+        index.catalog = catalog
+        index.postings = {}
+        remap = np.full(len(self.catalog), -1, dtype=np.int64)
+        kept = reuse >= 0
+        remap[reuse[kept]] = np.flatnonzero(kept)
+        fresh = np.flatnonzero(~kept)
+        size = max(len(catalog), 1)
+        for field in self.ATOM_FIELDS + self.LIST_FIELDS:
+            if field in self.ATOM_FIELDS:
+                added = _group_postings(catalog.columns[field][fresh], fresh, size)
+            else:
+                offsets = catalog.columns[field + '_offsets']
+                lengths = offsets[fresh + 1] - offsets[fresh]
+                keys = np.concatenate([catalog.columns[field + '_values'][offsets[i]:offsets[i + 1]] for i in fresh]) \
+                    if len(fresh) else _EMPTY
+                added = _group_postings(keys, np.repeat(fresh, lengths), size)
+            postings = {}
+            for key, posting in self.postings[field].items():
+                posting = remap[posting]
+                posting = posting[posting >= 0]
+                if key in added:
+                    posting = np.union1d(posting, added.pop(key))
+                elif len(posting) > 1 and (posting[1:] < posting[:-1]).any():
+                    # Facts were reordered in the file
+                    posting.sort()
+                if len(posting):
+                    postings[key] = posting.astype(np.int32)
+            postings.update(added)
+            index.postings[field] = postings
+        return index
+
+    def posting(self, field, key):
+        return self.postings[field].get(key, _EMPTY)
+
+    def candidate_lists(self, prefs, base=0):
+        """(posting list, weight) pairs selected by prefs
+
+        A spirit match is worth SPIRIT_WEIGHT in total, so its list carries
+        whatever the no-preference base does not already give.
+        """
+        catalog = self.catalog
+        lists = [(self.posting('base_spirit', catalog.symbol_id(prefs.spirit)), engine.SPIRIT_WEIGHT - base)]
+
+        strength = int(prefs.strength)
+        for value, posting in self.postings['strength_value'].items():
+            if value > 0 and abs(strength - value) <= 2:
+                lists.append((posting, engine.STRENGTH_WEIGHT))
+
+        limit = engine.SKILL_LIMITS.get(prefs.skill, 0)
+        for value, posting in self.postings['complexity_value'].items():
+            if 0 < value <= limit:
+                lists.append((posting, engine.SKILL_WEIGHT))
+
+        seasons = {catalog.symbol_id('all_seasons'), catalog.symbol_id(prefs.season)}
+        for season in seasons:
+            lists.append((self.posting('season', season), engine.SEASON_WEIGHT))
+
+        lists.append((self.posting('occasions', catalog.symbol_id(prefs.occasion)), engine.OCCASION_WEIGHT))
+        lists.append((self.posting('flavors', catalog.symbol_id(prefs.flavor)), engine.FLAVOR_WEIGHT))
+        return [(posting, weight) for posting, weight in lists if len(posting)]
+
+    def matches(self, prefs, threshold=engine.SCORE_THRESHOLD):
+        """(ids, scores) of every cocktail scoring >= threshold, ids ascending"""
+        base = engine.NO_PREFERENCE_WEIGHT if prefs.spirit == 'no_preference' else 0
+        lists = self.candidate_lists(prefs, base)
+        if not lists:
+            return _EMPTY, np.zeros(0, dtype=np.int32)
+        # A cocktail missing from every list can only score the base
+        total = sum(len(posting) for posting, _ in lists)
+        if total * SPARSE_RATIO < len(self.catalog):
+            ids = np.concatenate([posting for posting, _ in lists])
+            weights = np.concatenate([np.full(len(posting), weight, dtype=np.int32) for posting, weight in lists])
+            candidates, slots = np.unique(ids, return_inverse=True)
+            scores = np.bincount(slots, weights=weights, minlength=len(candidates)).astype(np.int32) + base
+        else:
+            # Selective lists cover most of the catalog: a dense int8
+            # accumulator beats sorting the concatenated postings
+            totals = np.zeros(len(self.catalog), dtype=np.int8)
+            for posting, weight in lists:
+                totals[posting] += weight
+            candidates = np.flatnonzero(totals >= threshold - base).astype(np.int32)
+            scores = totals[candidates].astype(np.int32) + base
+        keep = scores >= threshold
+        return candidates[keep], scores[keep]
+
@@ -0,0 +1,52 @@
+"""Ingredient bitsets for "what can I make" queries
+
+Every ingredient used in the catalog gets a dense bit number and each
+recipe is stored as a row of uint64 words with a bit set per ingredient it
+needs. A bar inventory is encoded the same way, so the number of
+ingredients a recipe is missing is the popcount of recipe & ~inventory,
+computed for the whole catalog in a couple of vectorized passes.
+"""
+import numpy as np
+
+WORD_BITS = 64
+
+if hasattr(np, 'bitwise_count'):
+    _popcount = np.bitwise_count
+else:
+    # NumPy < 2.0: count bits a byte at a time
+    _BYTE_COUNTS = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def _popcount(words):
+        return _BYTE_COUNTS[words.view(np.uint8)].reshape(*words.shape, 8).sum(axis=-1)
+
+
+class IngredientBitsets:
+    """One bit row per recipe over the catalog's ingredient vocabulary"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        values = catalog.columns['ingredients_values']
+        offsets = catalog.columns['ingredients_offsets']
+        # Symbol ids of every ingredient, sorted; a symbol's bit is its position
+        self.symbols = np.unique(values)
+        positions = np.searchsorted(self.symbols, values).astype(np.uint64)
+        self.words = max(1, -(-len(self.symbols) // WORD_BITS))
+        rows = np.repeat(np.arange(len(catalog)), np.diff(offsets))
+        self.bits = np.zeros((len(catalog), self.words), dtype=np.uint64)
+        np.bitwise_or.at(self.bits, (rows, positions // WORD_BITS),
+                         np.left_shift(np.uint64(1), positions % WORD_BITS))
+
+    def encode(self, ingredients):
+        """Bit row for an inventory; items no recipe uses are ignored"""
+        row = np.zeros(self.words, dtype=np.uint64)
+        for name in ingredients:
+            symbol = self.catalog.symbol_id(name)
+            position = int(np.searchsorted(self.symbols, symbol))
+            if symbol >= 0 and position < len(self.symbols) and self.symbols[position] == symbol:
+                row[position // WORD_BITS] |= np.uint64(1) << np.uint64(position % WORD_BITS)
+        return row
+
+    def missing_counts(self, inventory):
+        """Distinct ingredients each recipe needs that inventory lacks"""
+        lacking = self.bits & ~self.encode(inventory)
+        return _popcount(lacking).sum(axis=1, dtype=np.int32)
@@ -0,0 +1,305 @@
+"""Knowledge base loading shared by the GUI and the Python engine
+
+Reads the ground cocktail/11 facts straight out of the .pl source so the
+catalog can be scored without a swipl process.
+"""
+import hashlib
+import json
+import re
+from collections import namedtuple
+from pathlib import Path
+
+KB_PATH = Path(__file__).parent / 'knowledge' / 'cocktail_knowledge_base.pl'
+
+# Build artifacts derived from a KB live in this directory next to it
+ARTIFACT_DIR = '.kbcache'
+
+Cocktail = namedtuple('Cocktail', [
+    'name', 'base_spirit', 'ingredients', 'techniques', 'flavors',
+    'strength', 'complexity', 'season', 'occasions', 'glass', 'history',
+])
+
+# A cocktail with its match score (None when browsing)
+Match = namedtuple('Match', ['cocktail', 'score'])
+
+# One slice of a ranked result list; total counts every match
+Page = namedtuple('Page', ['matches', 'total', 'offset'])
+
+Preferences = namedtuple('Preferences', [
+    'spirit', 'flavor', 'skill', 'strength', 'occasion', 'season',
+])
+
+# The GUI's initial (and reset) selections
+DEFAULT_PREFERENCES = Preferences(spirit='no_preference', flavor='citrus', skill='beginner',
+                                  strength=7, occasion='casual_relaxing', season='all_seasons')
+
+
+class KnowledgeBaseError(Exception):
+    """Raised when the knowledge base cannot be read."""
+
+
+class UnknownCocktailError(ValueError):
+    """Raised when a cocktail name is not in the knowledge base."""
+
+
+_TOKENS = [
+    ('skip', r'\s+|%[^\n]*|/\*.*?\*/'),
+    ('qatom', r"'(?:[^'\\]|\\.|'')*'"),
+    ('string', r'"(?:[^"\\]|\\.|"")*"'),
+    ('number', r'\d+(?:\.\d+)?(?:[eE][+-]?\d+)?'),
+    ('var', r'[A-Z_][A-Za-z0-9_]*'),
+    ('atom', r'[a-z][A-Za-z0-9_]*'),
+    ('punct', r'[()\[\]{},|;!]'),
+    ('end', r'\.(?=\s|%|$)'),
+    ('symbol', r'[-+*/\\^<>=~:.?@#&$]+'),
+]
+_TOKEN_RE = re.compile('|'.join(f'(?P<{kind}>{pattern})' for kind, pattern in _TOKENS), re.DOTALL)
+# One whole clause: any tokens up to the first end token. Each token is
+# matched atomically (lookahead, then backreference) so the split is
+# exactly the tokenizer's, whatever a quoted atom or string contains.
+_CLAUSE_RE = re.compile(
+    r'(?:(?=(?P<token>' + '|'.join(pattern for kind, pattern in _TOKENS if kind != 'end') + r'))(?P=token))*?'
+    + dict(_TOKENS)['end'], re.DOTALL)
+
+_ESCAPES = {'n': '\n', 't': '\t', '\\': '\\', "'": "'", '"': '"', '`': '`'}
+
+
+def _unquote(text):
+    body = text[1:-1]
+    quote = text[0]
+    body = body.replace(quote * 2, quote)
+    return re.sub(r'\\(.)', lambda m: _ESCAPES.get(m.group(1), m.group(1)), body)
+
+
+def _tokenize(source, pos=0):
+    length = len(source)
+    while pos < length:
+        match = _TOKEN_RE.match(source, pos)
+        if match is None:
+            line = source.count('\n', 0, pos) + 1
+            raise KnowledgeBaseError(f"Unexpected character {source[pos]!r} on line {line}")
+        pos = match.end()
+        kind = match.lastgroup
+        if kind != 'skip':
+            yield kind, match.group()
+
+
+def iter_clauses(source):
+    """Yield each clause of a Prolog source as a list of (kind, text) tokens"""
+    clause = []
+    for token in _tokenize(source):
+        if token[0] == 'end':
+            if clause:
+                yield clause
+            clause = []
+        else:
+            clause.append(token)
+
+
+def iter_clause_text(source):
+    """Yield the source text of each clause, split where iter_clauses splits it
+
+    Much faster than tokenizing when only the boundaries are needed. Text
+    after the last clause is tokenized so stray characters still raise.
+    """
+    pos = 0
+    while True:
+        match = _CLAUSE_RE.match(source, pos)
+        if match is None:
+            break
+        yield match.group()
+        pos = match.end()
+    for _ in _tokenize(source, pos):
+        pass
+
+
+class _TermParser:
+    """Recursive-descent reader for ground fact arguments"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def expect(self, text):
+        kind, value = self.peek()
+        if value != text:
+            raise KnowledgeBaseError(f"Expected {text!r}, found {value!r}")
+        self.pos += 1
+
+    def term(self):
+        kind, value = self.peek()
+        self.pos += 1
+        if kind == 'atom':
+            if self.peek()[1] == '(':
+                return (value, self.arguments())
+            return value
+        if kind in ('qatom', 'string'):
+            return _unquote(value)
+        if kind == 'number':
+            return float(value) if '.' in value or 'e' in value.lower() else int(value)
+        if value == '[':
+            return self.list_items()
+        raise KnowledgeBaseError(f"Unsupported term starting at {value!r}")
+
+    def arguments(self):
+        self.expect('(')
+        args = [self.term()]
+        while self.peek()[1] == ',':
+            self.pos += 1
+            args.append(self.term())
+        self.expect(')')
+        return args
+
+    def list_items(self):
+        items = []
+        if self.peek()[1] == ']':
+            self.pos += 1
+            return items
+        items.append(self.term())
+        while self.peek()[1] == ',':
+            self.pos += 1
+            items.append(self.term())
+        self.expect(']')
+        return items
+
+
+def parse_cocktails(source):
+    """Return every ground cocktail/11 fact in source as a Cocktail"""
+    cocktails = []
+    for clause in iter_clauses(source):
+        if clause[0] != ('atom', 'cocktail') or len(clause) < 2 or clause[1][1] != '(':
+            continue
+        if any(kind in ('var', 'symbol') for kind, _ in clause):
+            # Rules and non-ground clauses are left to Prolog
+            continue
+        parser = _TermParser(clause)
+        name, args = parser.term()
+        if parser.pos != len(clause) or len(args) != len(Cocktail._fields):
+            continue
+        cocktails.append(Cocktail(*args))
+    return cocktails
+
+
+def load_cocktails(path=KB_PATH):
+    """Read the cocktail/11 facts from a knowledge base file"""
+    try:
+        source = Path(path).read_text(encoding='utf-8')
+    except OSError as e:
+        raise KnowledgeBaseError(f"Cannot read knowledge base {path}: {e}") from e
+    return parse_cocktails(source)
+
+
+def artifact_path(kb_path, suffix):
+    """Location of a build artifact derived from kb_path"""
+    kb_path = Path(kb_path)
+    return kb_path.parent / ARTIFACT_DIR / (kb_path.stem + suffix)
+
+
+def read_kb(path=KB_PATH):
+    """(text, SHA-256) of the knowledge base, from a single read"""
+    try:
+        source = Path(path).read_bytes()
+    except OSError as e:
+        raise KnowledgeBaseError(f"Cannot read knowledge base {path}: {e}") from e
+    return source.decode('utf-8'), hashlib.sha256(source).hexdigest()
+
+
+def kb_fingerprint(path=KB_PATH):
+    """SHA-256 of the knowledge base contents"""
+    try:
+        return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    except OSError as e:
+        raise KnowledgeBaseError(f"Cannot read knowledge base {path}: {e}") from e
+
+
+def match_to_record(match):
+    """JSON-ready dict for a Match, in the layout write_cocktail_json/2 emits"""
+    record = match.cocktail._asdict()
+    record['score'] = None if match.score is None else int(match.score)
+    return record
+
+
+def record_to_match(record):
+    cocktail = Cocktail(**{field: record[field] for field in Cocktail._fields})
+    return Match(cocktail, record.get('score'))
+
+
+def decode_page(output, offset=0):
+    """Decode the output of the *_json predicates into a Page
+
+    The first line is a {"total": N} header, followed by one cocktail
+    object per line.
+    """
+    try:
+        lines = [json.loads(line) for line in output.splitlines() if line.strip()]
+        header, records = lines[0], lines[1:]
+        matches = tuple(record_to_match(record) for record in records)
+        return Page(matches, int(header['total']), offset)
+    except (ValueError, KeyError, TypeError, IndexError) as e:
+        raise KnowledgeBaseError(f"Malformed cocktail record: {e}") from e
+
+
+def decode_stream(payloads, offset=0, batch_size=50):
+    """Decode the item frames of the stream_*_json predicates into Page batches
+
+    The first payload is the {"total": N} header and each later one a
+    single cocktail record. At least one (possibly empty) Page is yielded.
+    """
+    payloads = iter(payloads)
+    batch = []
+    yielded = False
+    try:
+        header = next(payloads, None)
+        if header is None:
+            raise ValueError("missing header")
+        total = int(json.loads(header)['total'])
+        for payload in payloads:
+            batch.append(record_to_match(json.loads(payload)))
+            if len(batch) == batch_size:
+                yield Page(tuple(batch), total, offset)
+                yielded = True
+                offset += len(batch)
+                batch = []
+    except (ValueError, KeyError, TypeError) as e:
+        raise KnowledgeBaseError(f"Malformed cocktail record: {e}") from e
+    if batch or not yielded:
+        yield Page(tuple(batch), total, offset)
+
+
+def split_page(page, batch_size):
+    """Yield page as consecutive Pages of at most batch_size matches"""
+    if not page.matches:
+        yield page
+        return
+    for start in range(0, len(page.matches), batch_size):
+        yield Page(page.matches[start:start + batch_size], page.total, page.offset + start)
+
+
+def normalize_inventory(items):
+    """Sorted, de-duplicated ingredient atoms; 'White Rum' becomes white_rum"""
+    names = (' '.join(str(item).lower().split()).replace(' ', '_') for item in items)
+    return tuple(sorted({name for name in names if name}))
+
+
+def normalize_max_missing(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Missing ingredient allowance must be a whole number, got {value!r}") from None
+    if value < 0:
+        raise ValueError("Missing ingredient allowance cannot be negative")
+    return value
+
+
+def normalize_preferences(prefs):
+    """Canonical Preferences: trimmed lower-case atoms and an int strength"""
+    values = prefs._asdict() if hasattr(prefs, '_asdict') else dict(prefs)
+    normalized = {field: str(values[field]).strip().lower() for field in Preferences._fields if field != 'strength'}
+    try:
+        normalized['strength'] = int(values['strength'])
+    except (TypeError, ValueError):
+        raise ValueError(f"Strength must be a whole number, got {values['strength']!r}") from None
+    return Preferences(**normalized)
@@ -3,8 +3,38 @@
 % (packaged copy)
 % ==========================================
 
+:- use_module(library(http/json)).
+:- use_module(library(heaps)).
+
 :- dynamic known/3.
 
+% ========== NORMALIZED RELATIONS ==========
+% Every cocktail/11 fact below is kept as written and, at load time, also
+% expanded into one fact per attribute value: cocktail_spirit/2,
+% cocktail_strength/2, cocktail_complexity/2, cocktail_season/2 and, per
+% distinct list element, cocktail_occasion/2 and cocktail_flavor/2. The
+% value comes first, so SWI's first-argument (JIT) index goes straight
+% from a preference to the cocktails that have it instead of scanning
+% lists with member/2. The relations are static facts, so a saved state
+% carries them precomputed.
+
+:- discontiguous cocktail/11, cocktail_spirit/2, cocktail_strength/2,
+   cocktail_complexity/2, cocktail_season/2, cocktail_occasion/2,
+   cocktail_flavor/2.
+
+term_expansion(cocktail(Name, Spirit, Ingredients, Techniques, Flavors, Strength, Complexity, Season, Occasions, Glass, History),
+               [ cocktail(Name, Spirit, Ingredients, Techniques, Flavors, Strength, Complexity, Season, Occasions, Glass, History),
+                 cocktail_spirit(Spirit, Name),
+                 cocktail_strength(Strength, Name),
+                 cocktail_complexity(Complexity, Name),
+                 cocktail_season(Season, Name)
+               | Relations ]) :-
+    sort(Occasions, DistinctOccasions),
+    sort(Flavors, DistinctFlavors),
+    findall(cocktail_occasion(Occasion, Name), member(Occasion, DistinctOccasions), OccasionFacts),
+    findall(cocktail_flavor(Flavor, Name), member(Flavor, DistinctFlavors), FlavorFacts),
+    append(OccasionFacts, FlavorFacts, Relations).
+
 % Cocktail database
 cocktail(mojito, rum, 
     [white_rum, mint, lime, sugar, soda_water],
@@ -72,77 +102,192 @@ cocktail(paloma, tequila,
 % ========== GUI COMPATIBLE FUNCTIONS ==========
 
 find_and_display_recommendations :-
-    findall(Cocktail-Score, (
-        cocktail(Cocktail, BaseSpirit, Ingredients, Techniques, Flavors, Strength, Complexity, Season, Occasion, Glass, History),
-        calculate_match_score(Cocktail, Score),
-        Score >= 3
-    ), Candidates),
-    
-    (   Candidates = []
+    ranked_matches(Sorted),
+    (   Sorted = []
     ->  write('No strong matches found with your preferences.'), nl
-    ;   sort_candidates(Candidates, Sorted),
-        show_scored_recommendations(Sorted)
+    ;   show_scored_recommendations(Sorted)
     ).
 
 browse_all_cocktails :-
     findall(Cocktail, cocktail(Cocktail, BaseSpirit, Ingredients, Techniques, Flavors, Strength, Complexity, Season, Occasion, Glass, History), Cocktails),
     display_cocktail_list(Cocktails).
 
+% ========== STRUCTURED (JSON) OUTPUT ==========
+% A {"total": N} header line, then one JSON object per cocktail on the
+% requested page. Decoded by cocktail_app.kb.decode_page.
+
+find_recommendations_json :-
+    find_recommendations_json(0, inf).
+
+find_recommendations_json(Offset, Limit) :-
+    scored_candidates(Candidates),
+    write_ranked_page(Candidates, Offset, Limit).
+
+browse_all_cocktails_json :-
+    browse_all_cocktails_json(0, inf).
+
+browse_all_cocktails_json(Offset, Limit) :-
+    catalog_entries(Cocktails),
+    write_json_page(Cocktails, Offset, Limit).
+
+ranked_matches(Sorted) :-
+    scored_candidates(Candidates),
+    sort_candidates(Candidates, Sorted).
+
+% Only cocktails that earn points for some preference are visited; their
+% points are summed per cocktail. Left unordered: see ranked_page/4.
+scored_candidates(Candidates) :-
+    findall(Cocktail-Points, preference_points(Cocktail, Points), Awarded),
+    keysort(Awarded, ByCocktail),
+    group_pairs_by_key(ByCocktail, Grouped),
+    findall(Cocktail-Score, (
+        member(Cocktail-AllPoints, Grouped),
+        sum_list(AllPoints, Score),
+        Score >= 3
+    ), Candidates).
+
+catalog_entries(Cocktails) :-
+    findall(Cocktail-null, cocktail(Cocktail, _, _, _, _, _, _, _, _, _, _), Cocktails).
+
+% Streaming variants for the persistent worker: the header and every
+% record are sent as separate item frames (send_item/1, worker.pl) so the
+% client can show the first cards before the last ones are written.
+
+stream_recommendations_json(Offset, Limit) :-
+    scored_candidates(Candidates),
+    stream_ranked_page(Candidates, Offset, Limit).
+
+stream_all_cocktails_json(Offset, Limit) :-
+    catalog_entries(Cocktails),
+    stream_json_page(Cocktails, Offset, Limit).
+
+stream_json_page(Pairs, Offset, Limit) :-
+    length(Pairs, Total),
+    page(Pairs, Offset, Limit, Page),
+    stream_json_records(Total, Page).
+
+stream_ranked_page(Candidates, Offset, Limit) :-
+    length(Candidates, Total),
+    ranked_page(Candidates, Offset, Limit, Page),
+    stream_json_records(Total, Page).
+
+stream_json_records(Total, Page) :-
+    with_output_to(string(Header), json_write_dict(current_output, _{total: Total}, [width(0)])),
+    send_item(Header),
+    forall(member(Cocktail-Score, Page),
+           (   with_output_to(string(Record), write_cocktail_json(Cocktail, Score)),
+               send_item(Record)
+           )).
+
+write_json_page(Pairs, Offset, Limit) :-
+    length(Pairs, Total),
+    page(Pairs, Offset, Limit, Page),
+    write_json_records(Total, Page).
+
+write_ranked_page(Candidates, Offset, Limit) :-
+    length(Candidates, Total),
+    ranked_page(Candidates, Offset, Limit, Page),
+    write_json_records(Total, Page).
+
+write_json_records(Total, Page) :-
+    json_write_dict(current_output, _{total: Total}, [width(0)]),
+    nl,
+    forall(member(Cocktail-Score, Page), write_cocktail_json(Cocktail, Score)).
+
+write_cocktail_json(Cocktail, Score) :-
+    cocktail(Cocktail, BaseSpirit, Ingredients, Techniques, Flavors, Strength, Complexity, Season, Occasion, Glass, History),
+    json_write_dict(current_output,
+                    _{name: Cocktail, score: Score, base_spirit: BaseSpirit,
+                      ingredients: Ingredients, techniques: Techniques,
+                      flavors: Flavors, strength: Strength, complexity: Complexity,
+                      season: Season, occasions: Occasion, glass: Glass,
+                      history: History},
+                    [width(0)]),
+    nl.
+
+% ========== INVENTORY ("WHAT CAN I MAKE") ==========
+% Cocktails missing at most MaxMissing of their distinct ingredients from
+% Inventory, ranked like recommendations but without the score cutoff.
+
+find_makeable_json(Inventory, MaxMissing, Offset, Limit) :-
+    makeable_candidates(Inventory, MaxMissing, Candidates),
+    write_ranked_page(Candidates, Offset, Limit).
+
+stream_makeable_json(Inventory, MaxMissing, Offset, Limit) :-
+    makeable_candidates(Inventory, MaxMissing, Candidates),
+    stream_ranked_page(Candidates, Offset, Limit).
+
+makeable_candidates(Inventory, MaxMissing, Candidates) :-
+    sort(Inventory, Stock),
+    findall(Cocktail-Score, (
+        cocktail(Cocktail, _, Ingredients, _, _, _, _, _, _, _, _),
+        sort(Ingredients, Needed),
+        ord_subtract(Needed, Stock, Missing),
+        length(Missing, Count),
+        Count =< MaxMissing,
+        calculate_match_score(Cocktail, Score)
+    ), Candidates).
+
 % ========== MATCHING ENGINE ==========
 
 calculate_match_score(Cocktail, TotalScore) :-
-    cocktail(Cocktail, BaseSpirit, _Ingredients, _Techniques, Flavors, StrengthLevel, ComplexityLevel, Season, Occasion, _Glass, _History),
-    
-    BaseScore = 0,
-    
-    % Spirit preference (HIGH PRIORITY - 3 points)
-    (   known(spirit_preference, BaseSpirit, _) 
-    ->  SpiritScore = 3 
-    ;   known(spirit_preference, no_preference, _)
-    ->  SpiritScore = 1
-    ;   SpiritScore = 0
-    ),
-    
-    % Strength matching (MEDIUM PRIORITY - 2 points)
-    (   known(strength, UserStrength, _),
-        strength_value(StrengthLevel, CocktailStrength),
-        abs(UserStrength - CocktailStrength) =< 2
-    ->  StrengthScore = 2
-    ;   StrengthScore = 0
-    ),
-    
-    % Skill level matching (HIGH PRIORITY - 3 points)
-    (   known(skill_level, UserSkill, _),
-        complexity_value(ComplexityLevel, CocktailComplexity),
-        skill_sufficient(UserSkill, CocktailComplexity)
-    ->  SkillScore = 3
-    ;   SkillScore = 0
-    ),
-    
-    % Season matching (MEDIUM PRIORITY - 2 points)
-    (   known(current_season, CurrentSeason, _),
-        (   Season == all_seasons 
-        ;   Season == CurrentSeason 
-        )
-    ->  SeasonScore = 2
-    ;   SeasonScore = 0
-    ),
-    
-    % Occasion matching (MEDIUM PRIORITY - 2 points)
-    (   known(occasion_type, OccasionType, _),
-        member(OccasionType, Occasion)
-    ->  OccasionScore = 2
-    ;   OccasionScore = 0
-    ),
-    
-    % Flavor notes matching (LOW PRIORITY - 1 point)
-    (   known(flavor_notes, UserFlavor, _),
-        member(UserFlavor, Flavors)
-    ->  FlavorScore = 1
-    ;   FlavorScore = 0
-    ),
-    
-    TotalScore is BaseScore + SpiritScore + StrengthScore + SkillScore + SeasonScore + OccasionScore + FlavorScore.
+    cocktail_spirit(_, Cocktail),
+    aggregate_all(sum(Points), preference_points(Cocktail, Points), TotalScore).
+
+% preference_points(?Cocktail, -Points): one solution per criterion the
+% cocktail meets. Each clause starts from the asserted preference and
+% reaches the matching cocktails through an indexed relation.
+
+% Spirit preference (HIGH PRIORITY - 3 points, 1 with no preference)
+preference_points(Cocktail, Points) :-
+    spirit_points(Cocktail, Points).
+
+% Strength matching (MEDIUM PRIORITY - 2 points)
+preference_points(Cocktail, 2) :-
+    known(strength, UserStrength, _),
+    strength_value(StrengthLevel, CocktailStrength),
+    abs(UserStrength - CocktailStrength) =< 2,
+    cocktail_strength(StrengthLevel, Cocktail).
+
+% Skill level matching (HIGH PRIORITY - 3 points)
+preference_points(Cocktail, 3) :-
+    known(skill_level, UserSkill, _),
+    complexity_value(ComplexityLevel, CocktailComplexity),
+    skill_sufficient(UserSkill, CocktailComplexity),
+    cocktail_complexity(ComplexityLevel, Cocktail).
+
+% Season matching (MEDIUM PRIORITY - 2 points)
+preference_points(Cocktail, 2) :-
+    known(current_season, CurrentSeason, _),
+    season_matches(CurrentSeason, Season),
+    cocktail_season(Season, Cocktail).
+
+% Occasion matching (MEDIUM PRIORITY - 2 points)
+preference_points(Cocktail, 2) :-
+    known(occasion_type, OccasionType, _),
+    cocktail_occasion(OccasionType, Cocktail).
+
+% Flavor notes matching (LOW PRIORITY - 1 point)
+preference_points(Cocktail, 1) :-
+    known(flavor_notes, UserFlavor, _),
+    cocktail_flavor(UserFlavor, Cocktail).
+
+% Without a preference every cocktail gets the point, so all are visited
+spirit_points(Cocktail, Points) :-
+    known(spirit_preference, no_preference, _),
+    !,
+    cocktail_spirit(BaseSpirit, Cocktail),
+    (   BaseSpirit == no_preference
+    ->  Points = 3
+    ;   Points = 1
+    ).
+spirit_points(Cocktail, 3) :-
+    known(spirit_preference, BaseSpirit, _),
+    cocktail_spirit(BaseSpirit, Cocktail).
+
+season_matches(_, all_seasons).
+season_matches(CurrentSeason, CurrentSeason) :-
+    CurrentSeason \== all_seasons.
 
 % ========== DISPLAY FUNCTIONS ==========
 
@@ -197,12 +342,56 @@ write_list([X|Rest]) :-
     ;   true
     ).
 
+% Highest score first, ties broken by name. keysort/2 is stable and,
+% unlike predsort/3, keeps candidates that compare equal.
 sort_candidates(Candidates, Sorted) :-
-    predsort(compare_scores, Candidates, Reversed),
-    reverse(Reversed, Sorted).
+    map_list_to_pairs(rank_key, Candidates, Keyed),
+    keysort(Keyed, SortedPairs),
+    pairs_values(SortedPairs, Sorted).
+
+rank_key(Cocktail-Score, Negated-Cocktail) :-
+    Negated is -Score.
+
+% One page of the ranking. A short page from a long candidate list takes
+% only its first Offset + Limit entries off a heap keyed like
+% sort_candidates/2 (standard order on -Score-Name), instead of sorting
+% every candidate. Long pages still use keysort/2, which beats popping
+% most of a heap.
+ranked_page(Candidates, Offset, Limit, Page) :-
+    Limit \== inf,
+    Wanted is Offset + Limit,
+    length(Candidates, Total),
+    Wanted * 4 < Total,
+    !,
+    map_list_to_pairs(rank_key, Candidates, Keyed),
+    list_to_heap(Keyed, Heap),
+    take_from_heap(Wanted, Heap, Best),
+    page(Best, Offset, Limit, Page).
+ranked_page(Candidates, Offset, Limit, Page) :-
+    sort_candidates(Candidates, Sorted),
+    page(Sorted, Offset, Limit, Page).
+
+take_from_heap(0, _, []) :- !.
+take_from_heap(N, Heap0, [Candidate|Rest]) :-
+    get_from_heap(Heap0, _, Candidate, Heap),
+    !,
+    N1 is N - 1,
+    take_from_heap(N1, Heap, Rest).
+take_from_heap(_, _, []).
+
+page(List, Offset, Limit, Page) :-
+    (   length(Prefix, Offset),
+        append(Prefix, Rest, List)
+    ->  take(Limit, Rest, Page)
+    ;   Page = []
+    ).
 
-compare_scores(Order, _-Score1, _-Score2) :-
-    compare(Order, Score1, Score2).
+take(inf, List, List) :- !.
+take(0, _, []) :- !.
+take(_, [], []) :- !.
+take(N, [X|Xs], [X|Ys]) :-
+    N1 is N - 1,
+    take(N1, Xs, Ys).
 
 % ========== INITIALIZATION ==========
 
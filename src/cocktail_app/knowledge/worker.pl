@@ -0,0 +1,52 @@
+% ==========================================
+% PERSISTENT WORKER LOOP
+% Loaded after the knowledge base by cocktail_app.prolog_pool.
+% Each request is one goal term on stdin; each reply is a frame
+%     %%FRAME <status> <length>\n<payload>
+% where status is ready, ok, fail or error and length counts the
+% characters of the payload that follows. A goal may also send any number
+% of item frames with send_item/1 before its final frame.
+% ==========================================
+
+serve_requests :-
+    set_stream(user_input, encoding(utf8)),
+    set_stream(user_output, encoding(utf8)),
+    set_stream(user_output, newline(posix)),
+    send_frame(ready, ""),
+    repeat,
+    read_request(Goal),
+    (   Goal == end_of_file
+    ->  !
+    ;   handle_request(Goal),
+        fail
+    ).
+
+read_request(Goal) :-
+    catch(read_term(user_input, Goal0, []), Error, true),
+    (   var(Error)
+    ->  Goal = Goal0
+    ;   Goal = throw(Error)
+    ).
+
+% Facts asserted by a request never leak into the next one.
+handle_request(Goal) :-
+    retractall(known(_, _, _)),
+    catch(with_output_to(string(Output), run_goal(Goal, Status)),
+          Error,
+          ( Status = error, term_string(Error, Output) )),
+    retractall(known(_, _, _)),
+    send_frame(Status, Output).
+
+run_goal(Goal, Status) :-
+    (   call(Goal)
+    ->  Status = ok
+    ;   Status = fail
+    ).
+
+send_item(Payload) :-
+    send_frame(item, Payload).
+
+send_frame(Status, Payload) :-
+    string_length(Payload, Length),
+    format(user_output, '%%FRAME ~w ~d~n~w', [Status, Length, Payload]),
+    flush_output(user_output).
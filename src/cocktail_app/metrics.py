@@ -0,0 +1,214 @@
+"""Latency spans, counters and their export
+
+Code wraps each phase of a query in span(); the duration is recorded in a
+per-operation latency histogram, appended to the active Trace (what the
+GUI shows next to its status label) and logged as one JSON line on the
+'cocktail_app.metrics' logger.
+
+Set MIXMASTER_LOG to a file path (or - for stderr) to write those JSON
+lines, and MIXMASTER_METRICS_FILE to have a snapshot of every counter and
+histogram (count, mean, p50/p95/p99) rewritten periodically. The HTTP
+service also serves the snapshot at /metrics.
+"""
+import atexit
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger('cocktail_app.metrics')
+
+# Upper bounds (ms) of the exported histogram buckets
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+# Recent samples kept per operation for percentiles
+SAMPLE_WINDOW = 2048
+EXPORT_INTERVAL = 10.0
+
+
+def _percentile(ordered, fraction):
+    # Nearest-rank percentile
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Histogram:
+    """Cumulative bucket counts plus a window of recent samples"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.samples = deque(maxlen=SAMPLE_WINDOW)
+
+    def observe(self, ms):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.buckets[bisect_left(BUCKETS_MS, ms)] += 1
+        self.samples.append(ms)
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        buckets = {f'le_{bound}': n for bound, n in zip(BUCKETS_MS, self.buckets)}
+        buckets['le_inf'] = self.buckets[-1]
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total_ms / self.count, 3),
+            'max_ms': round(self.max_ms, 3),
+            'p50_ms': round(_percentile(ordered, 0.50), 3),
+            'p95_ms': round(_percentile(ordered, 0.95), 3),
+            'p99_ms': round(_percentile(ordered, 0.99), 3),
+            'buckets': buckets,
+        }
+
+
+class Metrics:
+    """Thread-safe registry of counters and latency histograms"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, ms):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'counters': dict(self.counters),
+                'latency': {name: h.summary() for name, h in sorted(self.histograms.items())},
+            }
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+class Trace:
+    """Phase timings of one user-visible operation"""
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def add(self, phase, ms):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + ms
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def summary(self):
+        """Short text for the status bar, e.g. 'engine.recommend 3 ms · gui.render 5 ms'
+
+        Repeated phases (one render per streamed batch) are summed.
+        """
+        with self._lock:
+            return ' · '.join(f"{phase} {ms:.0f} ms" for phase, ms in self.phases.items())
+
+
+METRICS = Metrics()
+_local = threading.local()
+
+
+def current_trace():
+    return getattr(_local, 'trace', None)
+
+
+@contextmanager
+def tracing(trace):
+    """Make trace the target of spans opened on this thread"""
+    previous = current_trace()
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+def record(name, ms, trace=None, status='ok', **fields):
+    """Record a measured duration as if it had been a span"""
+    METRICS.observe(name, ms)
+    trace = trace or current_trace()
+    if trace is not None:
+        trace.add(name, ms)
+    if logger.isEnabledFor(logging.INFO):
+        line = {'event': 'span', 'name': name, 'ms': round(ms, 3), 'status': status}
+        if trace is not None:
+            line['trace'] = trace.name
+        line.update(fields)
+        logger.info(json.dumps(line, default=str))
+
+
+@contextmanager
+def span(name, trace=None, **fields):
+    """Time the enclosed block as one phase of operation name"""
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        yield
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        record(name, (time.perf_counter() - start) * 1000, trace, status, **fields)
+
+
+def count(name, n=1):
+    METRICS.count(name, n)
+
+
+def snapshot():
+    return METRICS.snapshot()
+
+
+def write_snapshot(path):
+    """Atomically replace path with the current metrics snapshot"""
+    partial = f"{path}.{os.getpid()}.tmp"
+    with open(partial, 'w', encoding='utf-8') as out:
+        json.dump(snapshot(), out, indent=2)
+    os.replace(partial, path)
+
+
+def configure_from_env():
+    """Set up JSON log lines and periodic metrics export from the environment"""
+    destination = os.environ.get('MIXMASTER_LOG')
+    if destination and not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr) if destination == '-' else \
+            logging.FileHandler(destination, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    path = os.environ.get('MIXMASTER_METRICS_FILE')
+    if path:
+        def export():
+            while True:
+                time.sleep(EXPORT_INTERVAL)
+                try:
+                    write_snapshot(path)
+                except OSError:
+                    pass
+
+        threading.Thread(target=export, daemon=True).start()
+        # Also capture whatever happened since the last export on exit
+        atexit.register(lambda: write_snapshot(path))
@@ -0,0 +1,145 @@
+"""Precomputed recommendation table over the whole preference domain
+
+Every GUI preference comes from a small fixed set, so the ranked answer for
+each combination can be built ahead of time. Combinations are addressed by
+a mixed-radix key over PREFERENCE_DOMAIN and the table is tied to the KB it
+was built from by its SHA-256.
+"""
+import itertools
+import json
+from pathlib import Path
+
+import numpy as np
+
+from .compiled import load_catalog
+from .engine import recommend
+from .kb import KB_PATH, Preferences, artifact_path, kb_fingerprint
+
+# Same values, in the same order, as the choice buttons in the GUI
+PREFERENCE_DOMAIN = {
+    'spirit': ('rum', 'gin', 'vodka', 'whiskey', 'tequila', 'no_preference'),
+    'flavor': ('citrus', 'sweet', 'herbal', 'creamy', 'strong'),
+    'skill': ('beginner', 'intermediate', 'expert'),
+    'strength': tuple(range(1, 11)),
+    'occasion': ('party', 'romantic_dinner', 'casual_relaxing', 'celebration', 'after_dinner', 'aperitif'),
+    'season': ('spring', 'summer', 'autumn', 'winter', 'all_seasons'),
+}
+DEFAULT_TOP_N = 100
+TABLE_SUFFIX = '.table.npz'
+# Bumped whenever the ranking rules change, so older tables read as stale
+TABLE_VERSION = 2
+
+
+def domain_size(domain=PREFERENCE_DOMAIN):
+    size = 1
+    for field in Preferences._fields:
+        size *= len(domain[field])
+    return size
+
+
+def iter_domain(domain=PREFERENCE_DOMAIN):
+    """Every Preferences in the domain, in key order"""
+    for values in itertools.product(*(domain[field] for field in Preferences._fields)):
+        yield Preferences(*values)
+
+
+def preference_key(prefs, domain=PREFERENCE_DOMAIN):
+    """Mixed-radix index of prefs, or None when a value is outside the domain"""
+    key = 0
+    for field in Preferences._fields:
+        values = domain[field]
+        try:
+            digit = values.index(getattr(prefs, field))
+        except ValueError:
+            return None
+        key = key * len(values) + digit
+    return key
+
+
+def table_path(kb_path=KB_PATH):
+    return artifact_path(kb_path, TABLE_SUFFIX)
+
+
+class RecommendationTable:
+    """Top-N catalog indices and scores for every preference combination"""
+
+    def __init__(self, ids, scores, counts, kb_hash, domain=PREFERENCE_DOMAIN):
+        self.ids = ids
+        self.scores = scores
+        self.counts = counts
+        self.kb_hash = kb_hash
+        self.domain = domain
+
+    @property
+    def top_n(self):
+        return self.ids.shape[1]
+
+    @classmethod
+    def build(cls, catalog, kb_hash, top_n=DEFAULT_TOP_N, domain=PREFERENCE_DOMAIN):
+        size = domain_size(domain)
+        top_n = max(1, min(top_n, len(catalog)))
+        ids = np.full((size, top_n), -1, dtype=np.int32)
+        scores = np.zeros((size, top_n), dtype=np.int8)
+        counts = np.zeros(size, dtype=np.int32)
+        for key, prefs in enumerate(iter_domain(domain)):
+            indices, matched, total = recommend(catalog, prefs, limit=top_n)
+            ids[key, :len(indices)] = indices
+            scores[key, :len(indices)] = matched
+            counts[key] = total
+        return cls(ids, scores, counts, kb_hash, domain)
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        domain = {field: list(values) for field, values in self.domain.items()}
+        with open(path, 'wb') as f:
+            np.savez(f, ids=self.ids, scores=self.scores, counts=self.counts,
+                     kb_hash=np.array(self.kb_hash), domain=np.array(json.dumps(domain)),
+                     version=np.array(TABLE_VERSION))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if 'version' not in data or int(data['version']) != TABLE_VERSION:
+                raise ValueError(f"{path} was built by an older version")
+            domain = {field: tuple(values) for field, values in json.loads(str(data['domain'])).items()}
+            return cls(data['ids'], data['scores'], data['counts'], str(data['kb_hash']), domain)
+
+    def lookup(self, prefs, offset=0, limit=None):
+        """(indices, scores, total) for one page, or None if the table cannot answer
+
+        The table cannot answer preferences outside its domain or pages
+        reaching past the top-N it stored.
+        """
+        key = preference_key(prefs, self.domain)
+        if key is None:
+            return None
+        total = int(self.counts[key])
+        end = total if limit is None else min(total, offset + limit)
+        if end > self.top_n:
+            return None
+        start = min(offset, end)
+        return self.ids[key, start:end], self.scores[key, start:end], total
+
+
+def load_table(kb_path=KB_PATH, kb_hash=None):
+    """The saved table for kb_path, or None when missing or stale"""
+    path = table_path(kb_path)
+    if not path.exists():
+        return None
+    try:
+        table = RecommendationTable.load(path)
+    except (OSError, ValueError, KeyError):
+        return None
+    if table.kb_hash != (kb_hash or kb_fingerprint(kb_path)):
+        return None
+    return table
+
+
+def build_table(kb_path=KB_PATH, top_n=DEFAULT_TOP_N):
+    """Score the whole domain against kb_path and save the table next to it"""
+    kb_hash = kb_fingerprint(kb_path)
+    table = RecommendationTable.build(load_catalog(kb_path), kb_hash, top_n)
+    path = table_path(kb_path)
+    table.save(path)
+    return path, table
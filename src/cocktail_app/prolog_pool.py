@@ -0,0 +1,452 @@
+"""Pool of long-lived SWI-Prolog workers
+
+Each worker consults the knowledge base once and then answers goals sent
+over stdin using the framed protocol implemented in knowledge/worker.pl.
+When a saved state of the KB and worker loop is available (see
+compile_state), workers restore it instead of consulting the source.
+
+A state is tied to the SHA-256 of the KB and worker.pl it was saved from,
+recorded in a stamp file next to it. A pool that finds no matching state
+starts on the source and saves one in the background; workers restarted
+after that restore it.
+"""
+import json
+import os
+import queue
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+from .cancel import Cancelled
+from .kb import KnowledgeBaseError, artifact_path, kb_fingerprint
+from .metrics import count, record, span
+
+WORKER_PATH = Path(__file__).parent / 'knowledge' / 'worker.pl'
+FRAME_MARKER = '%%FRAME '
+DEFAULT_POOL_SIZE = 2
+DEFAULT_TIMEOUT = 30
+STARTUP_TIMEOUT = 30
+HEALTH_INTERVAL = 30.0
+COMPILE_TIMEOUT = 300
+STATE_SUFFIX = '.state'
+STAMP_SUFFIX = '.state.json'
+
+
+class PrologError(Exception):
+    """Raised when a Prolog worker cannot answer a request."""
+
+
+def prolog_atom(value):
+    """Quote any text as a Prolog atom so it cannot be read as code"""
+    text = str(value).replace('\\', '\\\\').replace("'", "\\'").replace('\n', '\\n')
+    return f"'{text}'"
+
+
+def prolog_quote(path):
+    """Quote a filesystem path as a Prolog atom"""
+    return prolog_atom(Path(path).as_posix())
+
+
+def default_pool_size():
+    """Pool size from MIXMASTER_POOL_SIZE, falling back to DEFAULT_POOL_SIZE"""
+    try:
+        return max(1, int(os.environ.get('MIXMASTER_POOL_SIZE', DEFAULT_POOL_SIZE)))
+    except ValueError:
+        return DEFAULT_POOL_SIZE
+
+
+def state_path(kb_path):
+    return artifact_path(kb_path, STATE_SUFFIX)
+
+
+def state_stamp_path(kb_path):
+    return artifact_path(kb_path, STAMP_SUFFIX)
+
+
+def state_fingerprint(kb_path):
+    """Hashes of the sources a saved state is built from"""
+    return {'kb_hash': kb_fingerprint(kb_path), 'worker_hash': kb_fingerprint(WORKER_PATH)}
+
+
+def compile_state(kb_path, executable='swipl', timeout=COMPILE_TIMEOUT):
+    """Save a swipl state with the KB and worker loop already loaded
+
+    Restoring the state skips parsing the source and the KB's
+    initialization(main) banner, which only runs when the file is loaded.
+    """
+    path = state_path(kb_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Taken first: an edit made while compiling leaves the stamp stale
+    fingerprint = state_fingerprint(kb_path)
+    partial = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    goal = (f"consult([{prolog_quote(kb_path)}, {prolog_quote(WORKER_PATH)}]), "
+            f"qsave_program({prolog_quote(partial)}, [stand_alone(false)])")
+    try:
+        with span('prolog.compile_state'):
+            result = subprocess.run([executable, '-q', '-g', goal, '-t', 'halt'],
+                                    stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.PIPE, text=True, timeout=timeout)
+        error = result.stderr.strip() if result.returncode != 0 else None
+    except subprocess.TimeoutExpired:
+        error = f"took longer than {timeout}s"
+    if error is not None or not partial.exists():
+        if partial.exists():
+            partial.unlink()
+        raise PrologError(f"Could not save Prolog state: {error or 'no state written'}")
+    os.replace(partial, path)
+    stamp = state_stamp_path(kb_path)
+    partial = stamp.with_name(f"{stamp.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    partial.write_text(json.dumps(fingerprint), encoding='utf-8')
+    os.replace(partial, stamp)
+    return path
+
+
+def fresh_state(kb_path):
+    """Path of a saved state built from the current KB and worker loop, or None"""
+    path = state_path(kb_path)
+    try:
+        stamp = json.loads(state_stamp_path(kb_path).read_text(encoding='utf-8'))
+        fingerprint = state_fingerprint(kb_path)
+    except (OSError, ValueError, KnowledgeBaseError):
+        return None
+    return path if stamp == fingerprint and path.exists() else None
+
+
+_builds = set()
+_builds_lock = threading.Lock()
+
+
+def build_state_in_background(kb_path, executable='swipl', on_ready=None):
+    """Save a state for kb_path on a daemon thread; on_ready(path) runs once it is written
+
+    Does nothing while a build for the same KB is already running. A
+    failed build is counted and otherwise ignored: workers keep consulting
+    the source.
+    """
+    key = str(Path(kb_path).resolve())
+    with _builds_lock:
+        if key in _builds:
+            return
+        _builds.add(key)
+
+    def build():
+        try:
+            path = compile_state(kb_path, executable)
+        except (OSError, PrologError, KnowledgeBaseError):
+            count('prolog.state_error')
+            return
+        finally:
+            with _builds_lock:
+                _builds.discard(key)
+        if on_ready is not None:
+            on_ready(path)
+
+    threading.Thread(target=build, name='prolog-state', daemon=True).start()
+
+
+class SwiplWorker:
+    """A single pre-consulted swipl process"""
+
+    def __init__(self, kb_path, executable='swipl', state=None):
+        self.kb_path = Path(kb_path)
+        self.executable = executable
+        self.state = state
+        self.process = None
+
+    def spawn(self):
+        """Start the swipl process without waiting for it to be ready"""
+        if self.state is not None and self.state.exists():
+            command = [self.executable, '-x', str(self.state), '-q', '-g', 'serve_requests', '-t', 'halt']
+        else:
+            load_goal = f"consult([{prolog_quote(self.kb_path)}, {prolog_quote(WORKER_PATH)}])"
+            command = [self.executable, '-q', '-g', load_goal, '-g', 'serve_requests', '-t', 'halt']
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding='utf-8')
+
+    def wait_ready(self, timeout=STARTUP_TIMEOUT):
+        """Block until the worker has consulted the KB and sent its ready frame"""
+        status, _ = self._with_deadline(self._read_frame, timeout)
+        if status != 'ready':
+            self.stop()
+            raise PrologError(f"Prolog worker sent '{status}' instead of ready")
+
+    def start(self, timeout=STARTUP_TIMEOUT):
+        with span('prolog.spawn'):
+            self.spawn()
+        with span('prolog.load', state=self.state is not None):
+            self.wait_ready(timeout)
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def request(self, goal, timeout=DEFAULT_TIMEOUT):
+        """Run one goal and return everything it printed"""
+        if not self.alive():
+            raise PrologError("Prolog worker is not running")
+
+        def exchange():
+            self.process.stdin.write(goal.strip().rstrip('.') + '.\n')
+            self.process.stdin.flush()
+            return self._read_frame()
+
+        with span('prolog.query'):
+            status, payload = self._with_deadline(exchange, timeout)
+        if status == 'ok':
+            return payload
+        if status == 'fail':
+            raise PrologError(f"Prolog goal failed: {goal.strip()}")
+        raise PrologError(f"Prolog error: {payload}")
+
+    def stream(self, goal, timeout=DEFAULT_TIMEOUT, cancel=None):
+        """Run one goal, yielding the payload of each item frame it sends
+
+        Closing the generator early drains the remaining frames so the
+        worker stays in step for the next request. Cancelling the token
+        kills the process instead and raises Cancelled.
+        """
+        if not self.alive():
+            raise PrologError("Prolog worker is not running")
+        watchdog = threading.Timer(timeout, self.kill)
+        watchdog.daemon = True
+        watchdog.start()
+        release = cancel.on_cancel(self.kill) if cancel is not None else None
+        start = time.perf_counter()
+        items = 0
+        try:
+            self.process.stdin.write(goal.strip().rstrip('.') + '.\n')
+            self.process.stdin.flush()
+            while True:
+                status, payload = self._read_frame()
+                if status != 'item':
+                    break
+                if items == 0:
+                    record('prolog.first_item', (time.perf_counter() - start) * 1000)
+                items += 1
+                try:
+                    yield payload
+                except GeneratorExit:
+                    self._drain()
+                    raise
+        except (OSError, PrologError) as e:
+            self.kill()
+            if cancel is not None and cancel.cancelled:
+                raise Cancelled("Prolog query was cancelled") from None
+            if isinstance(e, PrologError):
+                raise
+            raise PrologError(f"Prolog worker pipe closed: {e}") from e
+        finally:
+            watchdog.cancel()
+            if release is not None:
+                release()
+        record('prolog.stream', (time.perf_counter() - start) * 1000, items=items)
+        if status == 'fail':
+            raise PrologError(f"Prolog goal failed: {goal.strip()}")
+        if status != 'ok':
+            raise PrologError(f"Prolog error: {payload}")
+
+    def ping(self, timeout=5):
+        try:
+            self.request('true', timeout)
+            return True
+        except PrologError:
+            return False
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            if self.process.poll() is None:
+                self.process.stdin.close()
+                self.process.wait(timeout=2)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def kill(self):
+        """Hard-stop the process; the pool restarts it on check-in"""
+        if self.alive():
+            self.process.kill()
+            self.process.wait()
+
+    def _with_deadline(self, func, timeout):
+        # A blocked pipe read cannot time out on its own, so a watchdog kills
+        # the process and the read returns EOF instead.
+        watchdog = threading.Timer(timeout, self.kill)
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            return func()
+        except (OSError, PrologError) as e:
+            # The stream is out of sync now; make sure alive() reports it
+            self.kill()
+            if isinstance(e, PrologError):
+                raise
+            raise PrologError(f"Prolog worker pipe closed: {e}") from e
+        finally:
+            watchdog.cancel()
+
+    def _drain(self):
+        try:
+            while self._read_frame()[0] == 'item':
+                pass
+        except (OSError, PrologError):
+            self.kill()
+
+    def _read_frame(self):
+        stdout = self.process.stdout
+        while True:
+            header = stdout.readline()
+            if not header:
+                raise PrologError("Prolog worker exited unexpectedly")
+            if header.startswith(FRAME_MARKER):
+                break
+        _, status, length = header.split()
+        payload = stdout.read(int(length))
+        if len(payload) != int(length):
+            raise PrologError("Prolog worker exited mid-reply")
+        return status, payload
+
+
+class SwiplPool:
+    """Fixed-size pool of SwiplWorker processes
+
+    Workers are started on first use, pinged in the background while idle,
+    and restarted whenever one is found dead.
+    """
+
+    def __init__(self, kb_path, size=None, executable='swipl', health_interval=HEALTH_INTERVAL,
+                 use_state=True):
+        self.kb_path = Path(kb_path)
+        self.size = size or default_pool_size()
+        self.executable = executable
+        self.health_interval = health_interval
+        self.use_state = use_state
+        self.state = None
+        self._workers = []
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+    @property
+    def started(self):
+        return bool(self._workers)
+
+    def start(self):
+        """Spawn every worker and wait for all of them to be ready"""
+        with self._lock:
+            if self._workers:
+                return
+            if self._closed.is_set():
+                raise PrologError("Prolog pool has been closed")
+            state = self.state = fresh_state(self.kb_path) if self.use_state else None
+            if self.use_state and state is None:
+                # Never wait for qsave_program here: it can take minutes
+                build_state_in_background(self.kb_path, self.executable, self._state_ready)
+            workers = [SwiplWorker(self.kb_path, self.executable, state) for _ in range(self.size)]
+            try:
+                # Spawn first so the workers consult the KB in parallel
+                with span('prolog.spawn', workers=len(workers)):
+                    for worker in workers:
+                        worker.spawn()
+                with span('prolog.load', workers=len(workers), state=state is not None):
+                    for worker in workers:
+                        worker.wait_ready()
+            except (OSError, PrologError):
+                for worker in workers:
+                    worker.stop()
+                raise
+            self._workers = workers
+            for worker in workers:
+                self._idle.put(worker)
+        if self.health_interval:
+            thread = threading.Thread(target=self._health_loop, daemon=True)
+            thread.start()
+
+    def query(self, goal, timeout=DEFAULT_TIMEOUT):
+        """Run goal on the next free worker and return its output"""
+        self.start()
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise PrologError("No Prolog worker became available") from None
+        try:
+            return worker.request(goal, timeout)
+        finally:
+            self._checkin(worker)
+
+    def stream(self, goal, timeout=DEFAULT_TIMEOUT, cancel=None):
+        """Run goal on the next free worker, yielding its item frames"""
+        self.start()
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise PrologError("No Prolog worker became available") from None
+        try:
+            if cancel is not None:
+                cancel.check()
+            yield from worker.stream(goal, timeout, cancel)
+        finally:
+            self._checkin(worker)
+
+    def check_health(self):
+        """Ping every idle worker and restart the ones that do not answer"""
+        for _ in range(len(self._workers)):
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            if not worker.ping():
+                worker.kill()
+            self._checkin(worker)
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            for worker in self._workers:
+                worker.stop()
+            self._workers = []
+
+    def retire(self):
+        """Close the pool without interrupting queries in flight
+
+        Idle workers stop now; busy ones stop when they are checked back in.
+        """
+        self._closed.set()
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            worker.stop()
+
+    def _checkin(self, worker):
+        if self._closed.is_set():
+            worker.stop()
+            return
+        if not worker.alive():
+            count('prolog.worker_restarts')
+            worker.state = self.state
+            try:
+                worker.restart()
+            except (OSError, PrologError):
+                # Leave it dead; the next health check tries again
+                pass
+        self._idle.put(worker)
+
+    def _state_ready(self, path):
+        self.state = path
+
+    def _health_loop(self):
+        while not self._closed.wait(self.health_interval):
+            self.check_health()
@@ -0,0 +1,36 @@
+"""Deterministic top-K ranking with offset/limit pagination
+
+Matches are ordered by score, highest first, then by cocktail name, so
+ties are kept and always come out in the same order. Only the first
+offset + limit entries are selected and sorted; the rest of the candidates
+are never fully ordered.
+"""
+import numpy as np
+
+_EMPTY = np.zeros(0, dtype=np.int32)
+
+
+def rank_keys(name_rank, ids, scores):
+    """One int64 per match that sorts by (-score, name)"""
+    return name_rank[ids].astype(np.int64) - scores.astype(np.int64) * len(name_rank)
+
+
+def top_k(keys, k):
+    """Positions of the k smallest keys, smallest first"""
+    if k <= 0:
+        return _EMPTY
+    if k < len(keys):
+        # Bounded selection: O(n) partition, then sort only the k winners
+        selected = np.argpartition(keys, k - 1)[:k]
+        return selected[np.argsort(keys[selected])]
+    return np.argsort(keys)
+
+
+def rank(name_rank, ids, scores, offset=0, limit=None):
+    """(ids, scores, total) for one page of the ranking"""
+    total = len(ids)
+    end = total if limit is None else min(total, offset + limit)
+    if offset >= end:
+        return _EMPTY, np.zeros(0, dtype=scores.dtype), total
+    order = top_k(rank_keys(name_rank, ids, scores), end)[offset:]
+    return ids[order], scores[order], total
@@ -0,0 +1,278 @@
+"""Cached access to a recommendation backend
+
+Recommender is the entry point shared by the GUI and headless callers.
+"""
+import threading
+from itertools import chain
+
+from .backends import STREAM_BATCH, create_backend
+from .cache import DEFAULT_CACHE_SIZE, ResultCache
+from .compiled import load_catalog
+from .engine import SCORE_THRESHOLD, score_cocktail, search, similar
+from .kb import (KB_PATH, Match, Page, normalize_inventory, normalize_max_missing, normalize_preferences,
+                 split_page)
+from .metrics import count, span
+from .precompute import load_table
+from .search import SEARCH_LIMIT
+from .watcher import KBWatcher
+
+SIMILAR_LIMIT = 10
+
+
+class Recommender:
+    """A backend fronted by a ResultCache keyed on normalized preferences
+
+    When a precomputed table built from the current KB exists, cache misses
+    are answered from it and the backend only runs for preferences the
+    table does not cover.
+
+    Edits to the knowledge base are picked up on the next query. With
+    watch=True a background KBWatcher applies them as they are saved,
+    patching the catalog and dropping only the cached results they affect.
+    Given kb_hash instead, the recommender is pinned to the contents it
+    names, already loaded by another process: the file is neither read nor
+    checked for edits. Batch workers use this for their parent's catalog.
+    """
+
+    def __init__(self, engine='python', kb_path=KB_PATH, cache_size=DEFAULT_CACHE_SIZE, use_table=True,
+                 watch=False, backend=None, kb_hash=None):
+        self.engine = engine
+        self.kb_path = kb_path
+        self.use_table = use_table
+        self.backend = backend or create_backend(engine, kb_path)
+        self.cache = ResultCache(cache_size)
+        self.watcher = KBWatcher(kb_path, self._on_kb_change, baseline=self._loaded_cocktails)
+        self.pinned_hash = kb_hash
+        # Bumped around every KB change; results computed across one are not cached
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._table = None
+        self._table_loaded = False
+        self._catalog = None
+        if watch and kb_hash is None:
+            self.watcher.start()
+
+    @property
+    def catalog(self):
+        """Catalog used to materialize table hits"""
+        catalog = getattr(self.backend, 'catalog', None)
+        if catalog is not None:
+            return catalog
+        with self._lock:
+            if self._catalog is None:
+                self._catalog = load_catalog(self.kb_path)
+            return self._catalog
+
+    @property
+    def table(self):
+        """Precomputed table for the current KB, or None if missing or stale"""
+        if not self.use_table:
+            return None
+        kb_hash = self.pinned_hash or self.watcher.kb_hash
+        with self._lock:
+            if not self._table_loaded:
+                self._table = load_table(self.kb_path, kb_hash)
+                self._table_loaded = True
+            return self._table
+
+    def recommend(self, prefs, offset=0, limit=None, timeout=30):
+        """One kb.Page of the ranked matches for prefs"""
+        prefs = normalize_preferences(prefs)
+        key = ('recommend', prefs, offset, limit)
+        generation = self.check_kb()
+        page = self.cache.get(key)
+        if page is None:
+            page = self._lookup_table(prefs, offset, limit)
+            if page is None:
+                with span('backend.recommend', engine=self.engine):
+                    page = self.backend.recommend(prefs, offset, limit, timeout=timeout)
+            self._cache_put(generation, key, page)
+        return page
+
+    def stream_recommend(self, prefs, offset=0, limit=None, batch_size=STREAM_BATCH, timeout=30, cancel=None):
+        """Yield the ranked matches for prefs as kb.Page batches, best first
+
+        Cached and precomputed answers are replayed in batches; anything else
+        streams from the backend and is cached once the last batch arrives.
+        Cancelling cancel (a cancel.CancelToken) abandons the backend work.
+        """
+        prefs = normalize_preferences(prefs)
+        key = ('recommend', prefs, offset, limit)
+        generation = self.check_kb()
+        page = self.cache.get(key)
+        if page is None:
+            page = self._lookup_table(prefs, offset, limit)
+            if page is not None:
+                self._cache_put(generation, key, page)
+        if page is not None:
+            return split_page(page, batch_size)
+        return self._stream_into_cache(
+            generation, key, self.backend.stream_recommend(prefs, offset, limit, batch_size, timeout, cancel),
+            offset)
+
+    def makeable(self, prefs, inventory, max_missing=0, offset=0, limit=None, timeout=30):
+        """One kb.Page of the cocktails inventory can make, allowing max_missing ingredients
+
+        Ranked by match score for prefs, then name, without the score cutoff.
+        """
+        prefs = normalize_preferences(prefs)
+        inventory = normalize_inventory(inventory)
+        max_missing = normalize_max_missing(max_missing)
+        key = ('makeable', prefs, inventory, max_missing, offset, limit)
+        generation = self.check_kb()
+        page = self.cache.get(key)
+        if page is None:
+            with span('backend.makeable', engine=self.engine):
+                page = self.backend.makeable(prefs, inventory, max_missing, offset, limit, timeout=timeout)
+            self._cache_put(generation, key, page)
+        return page
+
+    def stream_makeable(self, prefs, inventory, max_missing=0, offset=0, limit=None, batch_size=STREAM_BATCH,
+                        timeout=30, cancel=None):
+        """Yield makeable() results as kb.Page batches, best first"""
+        prefs = normalize_preferences(prefs)
+        inventory = normalize_inventory(inventory)
+        max_missing = normalize_max_missing(max_missing)
+        key = ('makeable', prefs, inventory, max_missing, offset, limit)
+        generation = self.check_kb()
+        page = self.cache.get(key)
+        if page is not None:
+            return split_page(page, batch_size)
+        return self._stream_into_cache(
+            generation, key,
+            self.backend.stream_makeable(prefs, inventory, max_missing, offset, limit, batch_size, timeout, cancel),
+            offset)
+
+    def similar(self, name, limit=SIMILAR_LIMIT):
+        """kb.Page of the cocktails most like name, scored by similarity in percent
+
+        Answered from the catalog's similarity index whichever engine is
+        selected.
+        """
+        name = str(name).strip()
+        key = ('similar', name, limit)
+        generation = self.check_kb()
+        page = self.cache.get(key)
+        if page is None:
+            catalog = self.catalog
+            with span('engine.similar'):
+                indices, similarities = similar(catalog, name, limit)
+            matches = tuple(Match(catalog.cocktail(i), int(round(similarity * 100)))
+                            for i, similarity in zip(indices, similarities))
+            page = Page(matches, len(matches), 0)
+            self._cache_put(generation, key, page)
+        return page
+
+    def search(self, query, offset=0, limit=SEARCH_LIMIT):
+        """kb.Page of the cocktails whose name, ingredients or history match query
+
+        Meant to run on every keystroke: answered from the catalog's word
+        index whichever engine is selected, and not cached.
+        """
+        self.check_kb()
+        catalog = self.catalog
+        with span('engine.search'):
+            indices, scores, total = search(catalog, str(query), offset, limit)
+        matches = tuple(Match(catalog.cocktail(i), int(score)) for i, score in zip(indices, scores))
+        return Page(matches, total, offset)
+
+    def browse(self, offset=0, limit=None, timeout=30):
+        """One kb.Page of the whole catalog in knowledge base order"""
+        key = ('browse', offset, limit)
+        generation = self.check_kb()
+        page = self.cache.get(key)
+        if page is None:
+            with span('backend.browse', engine=self.engine):
+                page = self.backend.browse(offset, limit, timeout=timeout)
+            self._cache_put(generation, key, page)
+        return page
+
+    def stream_browse(self, offset=0, limit=None, batch_size=STREAM_BATCH, timeout=30, cancel=None):
+        """Yield the catalog as kb.Page batches in knowledge base order"""
+        key = ('browse', offset, limit)
+        generation = self.check_kb()
+        page = self.cache.get(key)
+        if page is not None:
+            return split_page(page, batch_size)
+        return self._stream_into_cache(
+            generation, key, self.backend.stream_browse(offset, limit, batch_size, timeout, cancel), offset)
+
+    def check_kb(self):
+        """Apply a pending KB edit unless the watcher thread does; returns the generation"""
+        if self.pinned_hash is None and not self.watcher.running:
+            self.watcher.check()
+        return self.generation
+
+    def warm_up(self):
+        """Do the backend's one-off loading now instead of in the first query"""
+        self.backend.warm_up()
+        self.table
+        self.catalog.search
+
+    def close(self):
+        self.watcher.stop()
+        self.backend.close()
+
+    def _cache_put(self, generation, key, page):
+        if generation == self.generation:
+            self.cache.put(key, page)
+
+    def _stream_into_cache(self, generation, key, batches, offset):
+        # Batches are only kept while the result could still fit in the cache
+        matches = []
+        total = 0
+        try:
+            for batch in batches:
+                if matches is not None:
+                    matches.extend(batch.matches)
+                    if len(matches) > self.cache.max_matches:
+                        matches = None
+                total = batch.total
+                yield batch
+        finally:
+            # Hands a Prolog worker back to the pool if the caller stops early
+            batches.close()
+        if matches is not None:
+            self._cache_put(generation, key, Page(tuple(matches), total, offset))
+
+    def _lookup_table(self, prefs, offset, limit):
+        table = self.table
+        hit = table.lookup(prefs, offset, limit) if table is not None else None
+        if hit is None:
+            return None
+        count('table.hit')
+        catalog = self.catalog
+        indices, scores, total = hit
+        matches = tuple(Match(catalog.cocktail(i), int(score)) for i, score in zip(indices, scores))
+        return Page(matches, total, offset)
+
+    def _loaded_cocktails(self, kb_hash):
+        """Cocktails of the catalog in memory, if it was loaded from kb_hash"""
+        catalog = getattr(self.backend, 'loaded_catalog', None)
+        if catalog is None:
+            with self._lock:
+                catalog = self._catalog
+        if catalog is None or catalog.kb_hash != kb_hash:
+            return None
+        return catalog.cocktails()
+
+    def _on_kb_change(self, cocktails, diff):
+        """Apply a knowledge base edit reported by the watcher"""
+        self.generation += 1
+        if cocktails is None:
+            self.backend.reload()
+        else:
+            self.backend.apply_changes(cocktails, diff, self.watcher.kb_hash)
+        with self._lock:
+            self._table = None
+            self._table_loaded = False
+            self._catalog = None
+        if diff is None:
+            self.cache.clear()
+        else:
+            # Browse pages follow file order, so any edit can move them; a
+            # ranked result only changes if an edited cocktail matches it
+            edited = list(chain(diff.added, diff.removed, *diff.changed))
+            self.cache.discard(lambda key: key[0] != 'recommend' or any(
+                score_cocktail(cocktail, key[1]) >= SCORE_THRESHOLD for cocktail in edited))
+        self.generation += 1
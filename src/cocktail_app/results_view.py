@@ -0,0 +1,286 @@
+"""Virtualized results list for the GUI
+
+The first page of a result list streams in as batches of FIRST_BATCH. Further pages are
+fetched on the task runner when the user scrolls near either end, and the
+Text widget only ever holds a window of WINDOW_PAGES pages: scrolling
+down drops the cards at the top and scrolling back up fetches them again.
+However long the list, a bounded number of cards is formatted, held in
+the widget or kept in memory. Each page's cards carry a page tag, so a
+batch, a fetched page or a dropped one only inserts or deletes its own
+cards; the heading and status lines around them are redrawn on their own.
+
+When given an on_similar callback, every card ends with a "More like this"
+link that calls it with the card's cocktail name.
+"""
+from .formatting import browse_card, recommendation_card
+from .metrics import span
+from .tasks import Busy
+
+PAGE_SIZE = 20
+# Matches per streamed batch of the first page, so it fills in while the rest is ranked
+FIRST_BATCH = 5
+# Pages kept in the widget, around the one being read
+WINDOW_PAGES = 3
+# Fraction of the content scrolled past (from either end) before the next page is fetched
+LOAD_THRESHOLD = 0.85
+
+
+class ResultsView:
+    """Drives a tk.Text widget as a windowed, tag-styled card list"""
+
+    def __init__(self, text, scrollbar, colors, tasks, on_similar=None):
+        self.text = text
+        self.scrollbar = scrollbar
+        self.tasks = tasks
+        self.on_similar = on_similar
+        self.card = None
+        self.heading = None
+        self.fetch = None
+        self.pages = {}
+        # Page number -> (match list, cards of it in the widget)
+        self.shown = {}
+        self.total = 0
+        self.received = 0
+        self.complete = True
+        self.loading = None
+        self.error = None
+        self.generation = 0
+        self.text.config(yscrollcommand=self.on_scroll)
+        self.configure_tags(colors)
+
+    def configure_tags(self, colors):
+        family = 'Segoe UI'
+        self.text.tag_configure('heading', font=(family, 16, 'bold'), foreground=colors['primary'],
+                                spacing3=12)
+        self.text.tag_configure('title', font=(family, 14, 'bold'), foreground=colors['text_primary'],
+                                spacing1=6, spacing3=4)
+        self.text.tag_configure('score', font=(family, 11, 'bold'), foreground=colors['success'],
+                                spacing3=4)
+        # Wrapped values line up under the first value column
+        self.text.tag_configure('label', foreground=colors['text_secondary'], lmargin2=130)
+        self.text.tag_configure('value', foreground=colors['text_primary'])
+        self.text.tag_configure('rule', foreground=colors['secondary'])
+        self.text.tag_configure('status', foreground=colors['text_secondary'], justify='center')
+        self.text.tag_configure('error', foreground=colors['error'])
+        self.text.tag_configure('link', foreground=colors['primary'], underline=True)
+        self.text.tag_bind('link', '<Enter>', lambda event: self.text.config(cursor='hand2'))
+        self.text.tag_bind('link', '<Leave>', lambda event: self.text.config(cursor=''))
+        self.text.tag_bind('link', '<Button-1>', self.on_link)
+
+    def show_text(self, content):
+        """Replace the view with a static message"""
+        self.reset()
+        self.text.config(state='normal')
+        self.text.insert('1.0', content)
+        self.text.config(state='disabled')
+
+    def show_page(self, page, detailed=True, heading=None, card=None):
+        """Start a result list with its first batch of matches
+
+        Later batches of the first page arrive through append(); finish()
+        ends the stream and says where further pages come from. card
+        overrides the segment builder chosen by detailed.
+        """
+        self.reset()
+        self.card = card or (recommendation_card if detailed else browse_card)
+        self.heading = heading
+        self.complete = False
+        self.append(page)
+
+    def append(self, page):
+        """Add a streamed batch of matches"""
+        self.add(page)
+        self.received += len(page.matches)
+        self.render()
+
+    def finish(self, fetch=None):
+        """Mark the stream complete; fetch(offset, limit) returns the kb.Page slices after it"""
+        self.complete = True
+        self.fetch = fetch
+        self.render()
+
+    def reset(self):
+        self.generation += 1
+        self.card = None
+        self.heading = None
+        self.fetch = None
+        self.pages = {}
+        self.shown = {}
+        self.total = 0
+        self.received = 0
+        self.complete = True
+        self.loading = None
+        self.error = None
+        self.text.config(state='normal')
+        self.text.delete('1.0', 'end')
+        self.text.config(state='disabled')
+        self.text.yview_moveto(0)
+
+    def add(self, page):
+        self.total = page.total
+        for row, match in enumerate(page.matches, page.offset):
+            self.pages.setdefault(row // PAGE_SIZE, []).append(match)
+
+    def render(self):
+        """Bring the widget in line with the pages in the window, keeping the card at the top in place"""
+        if self.card is None:
+            return
+        anchor = self.anchor()
+        with span('gui.render'):
+            self.text.config(state='normal')
+            for number, (matches, _) in list(self.shown.items()):
+                # Dropped from the window, or fetched again as a new list
+                if self.pages.get(number) is not matches:
+                    self.remove_page(number)
+            for number in sorted(self.pages):
+                matches = self.pages[number]
+                count = self.shown[number][1] if number in self.shown else 0
+                if count < len(matches):
+                    self.text.insert(self.page_end(number), *self.card_segments(number, count, matches[count:]))
+                    self.shown[number] = (matches, len(matches))
+            self.replace_region('top', '1.0', self.top_segments())
+            self.replace_region('footer', 'end', self.footer_segments())
+            self.text.config(state='disabled')
+            if anchor is not None:
+                name, lines = anchor
+                start = self.text.tag_ranges(name)
+                if start:
+                    self.text.yview(f'{start[0]} + {lines} lines')
+
+    def card_segments(self, number, count, matches):
+        """insert() arguments for matches, the cards of page number from its count-th on"""
+        segments = []
+        first = number * PAGE_SIZE + count
+        with span('gui.format', cards=len(matches)):
+            for row, match in enumerate(matches, first):
+                card = self.card(match)
+                if self.on_similar:
+                    # Before the closing rule
+                    card[-1:-1] = [("   🔍 More like this\n", 'link')]
+                tags = ('card' + str(row), 'page' + str(number))
+                for text, tag in card:
+                    segments.extend((text, (tag,) + tags))
+        return segments
+
+    def top_segments(self):
+        segments = []
+        if self.heading:
+            segments.append((self.heading + "\n", 'heading'))
+        first = min(self.pages) * PAGE_SIZE if self.pages else 0
+        if first:
+            segments.append((f"Scroll up for results 1 to {first}...\n", 'status'))
+        return segments
+
+    def footer_segments(self):
+        first = min(self.pages) * PAGE_SIZE if self.pages else 0
+        end = first + sum(len(matches) for matches in self.pages.values())
+        if self.error:
+            return [(self.error + "\n", 'error')]
+        if end < self.total:
+            return [(f"Showing {first + 1} to {end} of {self.total}, scroll for more...\n", 'status')]
+        return []
+
+    def page_end(self, number):
+        """Index where the next cards of page number go"""
+        ranges = self.text.tag_ranges('page' + str(number))
+        if ranges:
+            return ranges[-1]
+        later = [other for other in self.shown if other > number]
+        if later:
+            return self.text.tag_ranges('page' + str(min(later)))[0]
+        ranges = self.text.tag_ranges('footer')
+        return ranges[0] if ranges else 'end'
+
+    def remove_page(self, number):
+        _, count = self.shown.pop(number)
+        ranges = self.text.tag_ranges('page' + str(number))
+        if ranges:
+            self.text.delete(ranges[0], ranges[-1])
+        first = number * PAGE_SIZE
+        self.text.tag_delete('page' + str(number), *('card' + str(row) for row in range(first, first + count)))
+
+    def replace_region(self, name, index, segments):
+        """Swap the lines tagged name for segments, inserted at index"""
+        ranges = self.text.tag_ranges(name)
+        if ranges:
+            self.text.delete(ranges[0], ranges[-1])
+        insert = []
+        for text, tag in segments:
+            insert.extend((text, (tag, name)))
+        if insert:
+            self.text.insert(index, *insert)
+
+    def anchor(self):
+        """(card tag, lines into it) at the top of the view, or None"""
+        top = self.text.index('@0,0')
+        for name in self.text.tag_names(top):
+            if name.startswith('card'):
+                start = self.text.tag_prevrange(name, f'{top} + 1c')
+                if start:
+                    # count() gives None rather than 0 for an empty range
+                    lines = self.text.count(start[0], top, 'lines')
+                    return name, lines[0] if lines else 0
+        return None
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if not self.complete or self.fetch is None or self.loading is not None or self.error or not self.pages:
+            return
+        numbers = sorted(self.pages)
+        first, last = float(first), float(last)
+        if last >= LOAD_THRESHOLD and (numbers[-1] + 1) * PAGE_SIZE < self.total:
+            # With the whole window on screen there is nothing to scroll towards
+            if first > 0 or len(numbers) < WINDOW_PAGES:
+                self.load(numbers[-1] + 1)
+        elif first <= 1 - LOAD_THRESHOLD and numbers[0] > 0:
+            self.load(numbers[0] - 1)
+
+    def load(self, number):
+        """Fetch page number on the task runner"""
+        self.loading = number
+        try:
+            self.tasks.submit('page', self.fetch_page, self.generation, number, self.fetch,
+                              on_error=lambda error, generation=self.generation: self.failed(generation, error))
+        except Busy:
+            self.loading = None
+
+    def fetch_page(self, generation, number, fetch):
+        # Runs on a worker thread
+        page = fetch(number * PAGE_SIZE, PAGE_SIZE)
+        self.tasks.post(self.loaded_page, generation, number, page)
+
+    def loaded_page(self, generation, number, page):
+        if generation != self.generation:
+            return
+        self.loading = None
+        self.pages.pop(number, None)
+        self.add(page)
+        for other in list(self.pages):
+            if abs(other - number) >= WINDOW_PAGES:
+                del self.pages[other]
+        self.render()
+
+    def failed(self, generation, error):
+        if generation == self.generation:
+            self.show_error(f"Could not load more results: {error}")
+
+    def match(self, row):
+        page = self.pages.get(row // PAGE_SIZE, ())
+        index = row % PAGE_SIZE
+        return page[index] if index < len(page) else None
+
+    def on_link(self, event):
+        for tag in self.text.tag_names(f'@{event.x},{event.y}'):
+            if tag.startswith('card'):
+                match = self.match(int(tag[len('card'):]))
+                if match is not None:
+                    self.on_similar(match.cocktail.name)
+                return
+
+    def show_error(self, message):
+        """Stop the list where it is and end it with an error line"""
+        self.error = message
+        self.complete = True
+        self.fetch = None
+        self.loading = None
+        self.render()
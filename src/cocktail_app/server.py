@@ -0,0 +1,278 @@
+"""Headless HTTP recommendation service
+
+Serves the same Recommender the GUI uses over a small asyncio HTTP/1.1
+server with keep-alive. Backend calls run on a bounded thread pool so at
+most max_concurrency queries reach the engine (or swipl pool) at once.
+
+Run with: python -m cocktail_app serve --port 8080
+
+    GET /recommend?spirit=rum&flavor=citrus&skill=beginner&strength=7
+                  &occasion=party&season=summer&offset=0&limit=20
+    GET /makeable?have=gin,lime,sugar&missing=1&spirit=gin&offset=0&limit=20
+    GET /similar?name=mojito&limit=10
+    GET /search?q=whiskey+so&offset=0&limit=20
+    GET /browse?offset=0&limit=50
+    GET /health
+    GET /metrics    counters and p50/p95/p99 latency per operation
+"""
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+from .kb import (DEFAULT_PREFERENCES, KB_PATH, KnowledgeBaseError, Preferences, UnknownCocktailError,
+                 match_to_record)
+from .metrics import count, snapshot, span
+from .prolog_pool import PrologError
+from .recommender import SEARCH_LIMIT, SIMILAR_LIMIT, Recommender
+from .shards import ShardError
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+DEFAULT_CONCURRENCY = 4
+KEEP_ALIVE_TIMEOUT = 15
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024
+
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable',
+}
+
+
+class HTTPError(Exception):
+    """An error that maps directly onto an HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def page_to_json(page):
+    return {
+        'total': page.total,
+        'offset': page.offset,
+        'results': [match_to_record(match) for match in page.matches],
+    }
+
+
+def parse_paging(params):
+    try:
+        offset = int(params.get('offset', 0))
+        limit = int(params['limit']) if params.get('limit') not in (None, '') else None
+    except ValueError:
+        raise HTTPError(400, "offset and limit must be whole numbers") from None
+    if offset < 0 or (limit is not None and limit < 0):
+        raise HTTPError(400, "offset and limit must not be negative")
+    return offset, limit
+
+
+def parse_preferences(params):
+    values = DEFAULT_PREFERENCES._asdict()
+    for field in Preferences._fields:
+        if params.get(field) not in (None, ''):
+            values[field] = params[field]
+    return Preferences(**values)
+
+
+def parse_inventory(params):
+    """Ingredients from have: a comma-separated string or, in a JSON body, a list"""
+    have = params.get('have', '')
+    if isinstance(have, str):
+        have = have.split(',')
+    if not isinstance(have, list):
+        raise HTTPError(400, "have must be a list of ingredients")
+    return have
+
+
+class RecommendationServer:
+    """asyncio HTTP front end for a Recommender"""
+
+    def __init__(self, recommender, max_concurrency=DEFAULT_CONCURRENCY):
+        self.recommender = recommender
+        self.max_concurrency = max_concurrency
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='recommend')
+        self.semaphore = None
+        self.routes = {
+            '/recommend': self.recommend,
+            '/makeable': self.makeable,
+            '/similar': self.similar,
+            '/search': self.search,
+            '/browse': self.browse,
+            '/health': self.health,
+            '/metrics': self.metrics,
+        }
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        server = await asyncio.start_server(self.handle_connection, host, port,
+                                            limit=MAX_HEADER_BYTES)
+        addresses = ', '.join(str(sock.getsockname()) for sock in server.sockets)
+        print(f"Serving recommendations on {addresses}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.recommender.close()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self.read_request(reader), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except HTTPError as e:
+                    await self.write_response(writer, e.status, {'error': str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+                status, payload = await self.dispatch(method, target, body)
+                keep_alive = self.wants_keep_alive(version, headers)
+                await self.write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def read_request(self, reader):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as e:
+            if not e.partial:
+                return None
+            raise
+        except asyncio.LimitOverrunError:
+            raise HTTPError(413, "Request headers too large") from None
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ', 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line") from None
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length") from None
+        if length < 0:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target, version, headers, body
+
+    @staticmethod
+    def wants_keep_alive(version, headers):
+        connection = headers.get('connection', '').lower()
+        if version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        handler = self.routes.get(url.path.rstrip('/') or '/')
+        try:
+            if handler is None:
+                raise HTTPError(404, f"No such endpoint: {url.path}")
+            if method not in ('GET', 'POST'):
+                raise HTTPError(405, f"{method} is not supported")
+            params = dict(parse_qsl(url.query))
+            if method == 'POST' and body:
+                try:
+                    params.update(json.loads(body))
+                except (ValueError, TypeError):
+                    raise HTTPError(400, "Body must be a JSON object") from None
+            with span(f'http{url.path}'):
+                return 200, await handler(params)
+        except HTTPError as e:
+            return e.status, {'error': str(e)}
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        except (PrologError, ShardError, KnowledgeBaseError) as e:
+            return 503, {'error': str(e)}
+        except Exception as e:
+            return 500, {'error': f"Internal error: {e}"}
+
+    async def run_backend(self, func, *args):
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+
+    async def recommend(self, params):
+        prefs = parse_preferences(params)
+        offset, limit = parse_paging(params)
+        page = await self.run_backend(self.recommender.recommend, prefs, offset, limit)
+        return page_to_json(page)
+
+    async def makeable(self, params):
+        prefs = parse_preferences(params)
+        offset, limit = parse_paging(params)
+        page = await self.run_backend(self.recommender.makeable, prefs, parse_inventory(params),
+                                      params.get('missing', 0), offset, limit)
+        return page_to_json(page)
+
+    async def similar(self, params):
+        if not params.get('name'):
+            raise HTTPError(400, "name is required")
+        _, limit = parse_paging(params)
+        try:
+            page = await self.run_backend(self.recommender.similar, params['name'],
+                                          SIMILAR_LIMIT if limit is None else limit)
+        except UnknownCocktailError as e:
+            raise HTTPError(404, str(e)) from None
+        return page_to_json(page)
+
+    async def search(self, params):
+        offset, limit = parse_paging(params)
+        page = await self.run_backend(self.recommender.search, params.get('q', ''), offset,
+                                      SEARCH_LIMIT if limit is None else limit)
+        return page_to_json(page)
+
+    async def browse(self, params):
+        offset, limit = parse_paging(params)
+        page = await self.run_backend(self.recommender.browse, offset, limit)
+        return page_to_json(page)
+
+    async def health(self, params):
+        return {'status': 'ok', 'engine': self.recommender.engine, 'cache': self.recommender.cache.stats()}
+
+    async def metrics(self, params):
+        return snapshot()
+
+    async def write_response(self, writer, status, payload, keep_alive):
+        count(f'http.status.{status}')
+        body = json.dumps(payload).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                f"\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, engine='python', kb_path=KB_PATH,
+          max_concurrency=DEFAULT_CONCURRENCY):
+    """Run the service until interrupted"""
+    server = RecommendationServer(Recommender(engine, kb_path, watch=True), max_concurrency)
+    try:
+        asyncio.run(server.serve(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -0,0 +1,282 @@
+"""Scatter-gather scoring over catalog shards in worker processes
+
+The catalog's rows are split into contiguous shards and each shard is
+owned by one worker process. Workers attach to a catalog the coordinator
+has published with shared.CatalogPublisher, so the columns are mapped
+once for all of them, and each indexes only its own rows. A query is sent
+to every shard at once with the generation it was made against; each
+worker scores its slice of that generation with the same rules as
+calculate_match_score/2 and answers with its own top offset + limit. The
+coordinator merges those short lists into the final page.
+
+Ranking keys are computed against the whole catalog's name order, so the
+merged ranking is exactly the one a single process would produce. A KB
+reload is a new generation: workers re-slice on the first query that
+asks for it, without restarting. A worker whose process has died is
+replaced before the next query is scattered.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, wait
+
+import numpy as np
+
+from .metrics import count, span
+from .ranking import top_k
+from .shared import KEEP_GENERATIONS, SharedCatalog
+
+READY_TIMEOUT = 120
+STOP_TIMEOUT = 5
+_EMPTY = np.zeros(0, dtype=np.int32)
+
+
+class ShardError(Exception):
+    """Raised when a shard worker cannot answer a request."""
+
+
+def default_shard_count():
+    """Shard count from MIXMASTER_SHARDS, falling back to one per core"""
+    try:
+        return max(1, int(os.environ.get('MIXMASTER_SHARDS', 0)) or os.cpu_count() or 1)
+    except ValueError:
+        return os.cpu_count() or 1
+
+
+def shard_bounds(size, shards):
+    """[start, end) row ranges of at most shards near-equal, non-empty shards"""
+    edges = np.linspace(0, size, max(1, min(shards, size)) + 1).astype(np.int64).tolist()
+    return [(start, end) for start, end in zip(edges, edges[1:]) if end > start]
+
+
+class _Shard:
+    """A worker's slice of one catalog generation"""
+
+    def __init__(self, catalog, number, count):
+        bounds = shard_bounds(len(catalog), count)
+        self.start, self.end = bounds[number] if number < len(bounds) else (0, 0)
+        self.size = len(catalog)
+        self.name_rank = catalog.columns['name_rank'][self.start:self.end].astype(np.int64)
+        self.catalog = catalog.rows(self.start, self.end)
+        self.catalog.index
+
+    def top(self, prefs, k):
+        ids, scores = self.catalog.index.matches(prefs)
+        keys = self.name_rank[ids] - scores.astype(np.int64) * self.size
+        order = top_k(keys, len(ids) if k is None else k)
+        return ids[order] + self.start, scores[order], keys[order], len(ids)
+
+
+def _run_shard(connection, directory, number, count):
+    """Worker process: answer (request id, generation, prefs, k) with the shard's top k"""
+    try:
+        shared = SharedCatalog(directory)
+        shards = {}
+        if shared.generation:
+            shards[shared.generation] = _Shard(shared.attach(), number, count)
+    except Exception as e:
+        connection.send(('error', f"{e.__class__.__name__}: {e}"))
+        return
+    connection.send(('ready', number))
+    while True:
+        try:
+            message = connection.recv()
+        except (EOFError, OSError):
+            return
+        if message is None:
+            return
+        request_id, generation, prefs, k = message
+        try:
+            shard = shards.get(generation)
+            if shard is None:
+                shard = _Shard(shared.attach(generation), number, count)
+                # Queries of the generation being replaced may still arrive
+                shards = {key: value for key, value in shards.items() if key > generation - KEEP_GENERATIONS}
+                shards[generation] = shard
+            reply = shard.top(prefs, k)
+        except Exception as e:
+            reply = ShardError(f"{e.__class__.__name__}: {e}")
+        connection.send((request_id, reply))
+
+
+class ShardWorker:
+    """One shard process and the pipe the coordinator talks to it over"""
+
+    def __init__(self, context, directory, number, count):
+        self.number = number
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_run_shard, args=(child, str(directory), number, count),
+                                       name=f'shard-{number}', daemon=True)
+        self.process.start()
+        child.close()
+        self.pending = {}
+        self._send_lock = threading.Lock()
+        self._reader = None
+
+    def wait_ready(self, timeout=READY_TIMEOUT):
+        if not self.connection.poll(timeout):
+            raise ShardError(f"Shard {self.number} did not start within {timeout}s")
+        try:
+            status, detail = self.connection.recv()
+        except (EOFError, OSError):
+            raise ShardError(f"Shard {self.number} exited while loading") from None
+        if status != 'ready':
+            raise ShardError(f"Shard {self.number} failed to load: {detail}")
+        self._reader = threading.Thread(target=self._read_replies, name=self.process.name, daemon=True)
+        self._reader.start()
+
+    def submit(self, request_id, generation, prefs, k):
+        future = Future()
+        with self._send_lock:
+            self.pending[request_id] = future
+            try:
+                self.connection.send((request_id, generation, prefs, k))
+            except (OSError, ValueError):
+                self.pending.pop(request_id, None)
+                raise ShardError(f"Shard {self.number} is not running") from None
+        return future
+
+    def alive(self):
+        return self.process.is_alive()
+
+    def forget(self, request_id):
+        """Drop a request the coordinator gave up on; its reply is ignored if it ever comes"""
+        with self._send_lock:
+            self.pending.pop(request_id, None)
+
+    def _read_replies(self):
+        while True:
+            try:
+                request_id, reply = self.connection.recv()
+            except (EOFError, OSError):
+                break
+            future = self.pending.pop(request_id, None)
+            if future is None:
+                continue
+            if isinstance(reply, Exception):
+                future.set_exception(reply)
+            else:
+                future.set_result(reply)
+        with self._send_lock:
+            pending, self.pending = self.pending, {}
+        for future in pending.values():
+            future.set_exception(ShardError(f"Shard {self.number} exited"))
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        with self._send_lock:
+            try:
+                self.connection.send(None)
+            except (OSError, ValueError):
+                pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+        self.connection.close()
+
+
+class ShardPool:
+    """Worker processes owning the shards of the catalogs published to directory
+
+    Workers are started on first use. Requests are pipelined: each worker
+    answers them in order while the coordinator waits on all shards at
+    once.
+    """
+
+    def __init__(self, directory, shards=None):
+        self.directory = directory
+        self.shards = shards or default_shard_count()
+        self.next_id = 0
+        self._context = None
+        self._workers = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def started(self):
+        return bool(self._workers)
+
+    @property
+    def pids(self):
+        return [worker.process.pid for worker in self._workers]
+
+    def start(self):
+        """Spawn every shard worker and wait for all of them to be ready"""
+        with self._lock:
+            if self._workers:
+                return
+            if self._closed:
+                raise ShardError("Shard pool has been closed")
+            # Spawned, not forked: the coordinator may be running threads
+            self._context = multiprocessing.get_context('spawn')
+            workers = []
+            try:
+                with span('shards.spawn', shards=self.shards):
+                    for number in range(self.shards):
+                        workers.append(ShardWorker(self._context, self.directory, number, self.shards))
+                with span('shards.load', shards=self.shards):
+                    for worker in workers:
+                        worker.wait_ready()
+            except (OSError, ShardError):
+                for worker in workers:
+                    worker.stop()
+                raise
+            self._workers = workers
+
+    def recommend(self, generation, prefs, offset=0, limit=None, timeout=None):
+        """(ids, scores, total) for one page of generation, merged from every shard's top offset + limit"""
+        self.start()
+        k = None if limit is None else offset + limit
+        with self._lock:
+            if self._closed:
+                raise ShardError("Shard pool has been closed")
+            self._restart_dead()
+            self.next_id += 1
+            request_id = self.next_id
+            workers = self._workers
+        with span('shards.scatter', shards=len(workers)):
+            futures = []
+            try:
+                for worker in workers:
+                    futures.append(worker.submit(request_id, generation, prefs, k))
+                _, waiting = wait(futures, timeout)
+                if waiting:
+                    raise ShardError(f"Shards did not answer within {timeout}s")
+            except ShardError:
+                for worker in workers:
+                    worker.forget(request_id)
+                raise
+            parts = [future.result() for future in futures]
+        with span('shards.gather'):
+            ids, scores, keys = (np.concatenate([part[i] for part in parts]) for i in range(3))
+            total = sum(part[3] for part in parts)
+            end = total if limit is None else min(total, offset + limit)
+            if offset >= end:
+                return _EMPTY, np.zeros(0, dtype=np.int32), total
+            order = top_k(keys, end)[offset:]
+        return ids[order], scores[order], total
+
+    def _restart_dead(self):
+        # Called with the lock held, so one request does the restart and the others wait for it
+        for position, worker in enumerate(self._workers):
+            if worker.alive():
+                continue
+            count('shards.worker_restarts')
+            worker.stop()
+            try:
+                replacement = ShardWorker(self._context, self.directory, worker.number, self.shards)
+            except OSError as e:
+                raise ShardError(f"Shard {worker.number} could not be restarted: {e}") from e
+            try:
+                replacement.wait_ready()
+            except ShardError:
+                replacement.stop()
+                raise
+            self._workers = self._workers[:position] + [replacement] + self._workers[position + 1:]
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.stop()
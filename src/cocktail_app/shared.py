@@ -0,0 +1,105 @@
+"""Catalogs shared read-only with worker processes
+
+A CatalogPublisher writes each catalog once, in the compiled artifact
+format, as a numbered generation file in a directory on /dev/shm where
+there is one. Workers attach with a SharedCatalog: columns, strings and
+index posting lists are read-only views of the mapped file, so no worker
+parses the KB, indexes it or copies a column, and the catalog's memory
+is paid once however many workers there are.
+
+A control file holds the generation counter. Publishing writes the next
+generation's file, then bumps the counter, and attached workers map the
+new file the next time they look. The previous generation is kept, so a
+worker that read the counter just before a publish still finds its file.
+"""
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from .compiled import open_catalog, save_catalog
+from .kb import KnowledgeBaseError
+from .metrics import span
+
+SHM_DIR = '/dev/shm'
+CONTROL_NAME = 'generation'
+KEEP_GENERATIONS = 2
+ATTACH_RETRIES = 3
+
+
+def generation_path(directory, generation):
+    return Path(directory) / f'catalog.{generation}.bin'
+
+
+class CatalogPublisher:
+    """Owner of a shared catalog directory; publishes new generations into it"""
+
+    def __init__(self, directory=None):
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix='mixmaster-', dir=SHM_DIR if os.path.isdir(SHM_DIR) else None)
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        control = self.directory / CONTROL_NAME
+        control.write_bytes(bytes(8))
+        self.counter = np.memmap(control, dtype=np.int64, mode='r+', shape=(1,))
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def publish(self, catalog):
+        """Share catalog, with its index, as the next generation; returns the generation"""
+        catalog.index
+        with self._lock:
+            generation = self.generation + 1
+            with span('shared.publish', generation=generation, rows=len(catalog)):
+                save_catalog(catalog, generation_path(self.directory, generation))
+            self.counter[0] = generation
+            self.generation = generation
+            try:
+                generation_path(self.directory, generation - KEEP_GENERATIONS).unlink()
+            except OSError:
+                # Never written, or still mapped on a platform that forbids it
+                pass
+        return generation
+
+    def close(self):
+        """Remove the directory; workers keep the generations they have mapped"""
+        del self.counter
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class SharedCatalog:
+    """A worker's read-only attachment to a CatalogPublisher's directory"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.counter = np.memmap(self.directory / CONTROL_NAME, dtype=np.int64, mode='r', shape=(1,))
+        self._generation = 0
+        self._catalog = None
+
+    @property
+    def generation(self):
+        """Latest published generation, 0 before the first publish"""
+        return int(self.counter[0])
+
+    def attach(self, generation=None):
+        """Catalog of generation (default: the latest), mapped on first use"""
+        for _ in range(ATTACH_RETRIES):
+            wanted = self.generation if generation is None else generation
+            if wanted <= 0:
+                raise KnowledgeBaseError(f"No catalog has been published to {self.directory}")
+            if wanted == self._generation:
+                return self._catalog
+            try:
+                with span('shared.attach', generation=wanted):
+                    catalog = open_catalog(generation_path(self.directory, wanted))
+            except FileNotFoundError:
+                if generation is not None:
+                    raise KnowledgeBaseError(f"Generation {wanted} is no longer published") from None
+                # Superseded twice while reading the counter
+                continue
+            self._catalog, self._generation = catalog, wanted
+            return catalog
+        raise KnowledgeBaseError(f"The catalog in {self.directory} is changing too fast to attach")
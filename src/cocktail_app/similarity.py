@@ -0,0 +1,228 @@
+""""More like this" search over MinHash signatures
+
+Each cocktail is described by a set of tokens: its base spirit and every
+ingredient, flavor and technique. Similarity is the Jaccard overlap of
+those sets. Comparing a cocktail with the whole catalog is avoided with
+locality-sensitive hashing: every cocktail gets a MinHash signature, split
+into bands, and only cocktails sharing at least one band bucket with the
+query are compared exactly. When the buckets hold fewer than k
+cocktails, the search widens to ones sharing the base spirit or a flavor,
+rarest first and at most MAX_WIDENED of them, rather than the catalog.
+
+Signatures are a catalog column, so compile-kb stores them in the compiled
+artifact, and hot reloads only hash the rows that changed and patch them
+into the band tables.
+"""
+import numpy as np
+
+from .ranking import top_k
+
+FIELDS = ('base_spirit', 'ingredients', 'flavors', 'techniques')
+NUM_HASHES = 32
+BAND_ROWS = 4
+# Cap on the cocktails taken from a single bucket
+MAX_BUCKET = 256
+# Cap on the cocktails compared when the buckets come up short
+MAX_WIDENED = 4096
+# Above this share of new rows, patching the tables costs more than a rebuild
+PATCH_RATIO = 4
+SEED = 20240229
+# Mersenne prime for the universal hashes (a * token + b) mod PRIME
+PRIME = (1 << 31) - 1
+_EMPTY = np.zeros(0, dtype=np.int32)
+
+_rng = np.random.default_rng(SEED)
+_HASH_A = _rng.integers(1, PRIME, NUM_HASHES, dtype=np.uint64)
+_HASH_B = _rng.integers(0, PRIME, NUM_HASHES, dtype=np.uint64)
+
+
+def cocktail_tokens(catalog, rows):
+    """(offsets, tokens) of each row's distinct tokens, sorted per row
+
+    A token is symbol id * len(FIELDS) + field number, so the same symbol
+    as a flavor and as an ingredient counts as two features.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    keys, owners = [], []
+    for number, field in enumerate(FIELDS):
+        if field == 'base_spirit':
+            values = catalog.columns[field][rows].astype(np.int64)
+            owner = np.arange(len(rows))
+        else:
+            offsets = catalog.columns[field + '_offsets']
+            lengths = (offsets[rows + 1] - offsets[rows]).astype(np.int64)
+            starts = np.repeat(offsets[rows].astype(np.int64) - np.cumsum(lengths) + lengths, lengths)
+            values = catalog.columns[field + '_values'][starts + np.arange(lengths.sum())].astype(np.int64)
+            owner = np.repeat(np.arange(len(rows)), lengths)
+        keys.append(values * len(FIELDS) + number)
+        owners.append(owner)
+    keys = np.concatenate(keys)
+    owners = np.concatenate(owners)
+    # Sort by (row, token) and drop repeats
+    span = int(keys.max()) + 1 if len(keys) else 1
+    pairs = np.sort(owners * span + keys)
+    pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]]]
+    owners, tokens = pairs // span, pairs % span
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owners, minlength=len(rows)), out=offsets[1:])
+    return offsets, tokens
+
+
+def minhash(catalog, rows, chunk=8192):
+    """(len(rows), NUM_HASHES) uint32 MinHash signatures"""
+    signatures = np.full((len(rows), NUM_HASHES), PRIME, dtype=np.uint32)
+    for start in range(0, len(rows), chunk):
+        offsets, tokens = cocktail_tokens(catalog, rows[start:start + chunk])
+        vocabulary, positions = np.unique(tokens, return_inverse=True)
+        # Hash each distinct token once, then gather
+        hashed = ((vocabulary.astype(np.uint64)[:, None] * _HASH_A + _HASH_B) % PRIME).astype(np.uint32)
+        filled = np.flatnonzero(np.diff(offsets) > 0)
+        if len(filled):
+            block = np.minimum.reduceat(hashed[positions], offsets[filled], axis=0)
+            signatures[start + filled] = block
+    return signatures
+
+
+def band_keys(signatures):
+    """(rows, bands) uint64 key per band of BAND_ROWS signature values"""
+    bands = signatures.reshape(len(signatures), -1, BAND_ROWS).astype(np.uint64)
+    keys = np.zeros(bands.shape[:2], dtype=np.uint64)
+    for i in range(BAND_ROWS):
+        keys = keys * np.uint64(0x100000001B3) + bands[:, :, i]
+    return keys
+
+
+class SimilarityIndex:
+    """LSH band tables over a catalog's MinHash signatures"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        signatures = catalog.columns.get('minhash')
+        if signatures is None or len(signatures) != len(catalog) * NUM_HASHES:
+            signatures = minhash(catalog, np.arange(len(catalog))).reshape(-1)
+            catalog.columns['minhash'] = signatures
+        self.signatures = signatures.reshape(len(catalog), NUM_HASHES)
+        keys = band_keys(self.signatures)
+        self.order = np.argsort(keys, axis=0, kind='stable').T.astype(np.int32)
+        self.keys = np.take_along_axis(keys, self.order.T, axis=0).T
+        self.offsets, self.tokens = cocktail_tokens(catalog, np.arange(len(catalog)))
+
+    def updated(self, catalog, reuse):
+        """Index of catalog (see Catalog.updated), patched from this one
+
+        catalog must already hold the patched minhash column. Bucket
+        entries are renumbered to the new rows, removed rows drop out and
+        only the rows that had to be encoded are inserted, so the tables
+        match a fresh build.
+        """
+        kept = reuse >= 0
+        fresh = np.flatnonzero(~kept)
+        if len(fresh) * PATCH_RATIO > len(catalog):
+            return type(self)(catalog)
+        index = object.__new__(type(self))
+        index.catalog = catalog
+        index.signatures = catalog.columns['minhash'].reshape(len(catalog), NUM_HASHES)
+        remap = np.full(len(self.catalog), -1, dtype=np.int64)
+        remap[reuse[kept]] = np.flatnonzero(kept)
+        fresh_keys = band_keys(index.signatures[fresh])
+        orders, keys = [], []
+        for band in range(len(self.keys)):
+            rows = remap[self.order[band]]
+            alive = rows >= 0
+            band_rows, bucket_keys = rows[alive], self.keys[band][alive]
+            same = bucket_keys[1:] == bucket_keys[:-1]
+            if (same & (band_rows[1:] < band_rows[:-1])).any():
+                # Facts were reordered in the file
+                by_key = np.lexsort((band_rows, bucket_keys))
+                band_rows, bucket_keys = band_rows[by_key], bucket_keys[by_key]
+            new_keys = fresh_keys[:, band]
+            by_key = np.lexsort((fresh, new_keys))
+            new_rows, new_keys = fresh[by_key], new_keys[by_key]
+            # Within a bucket entries stay in row order, as the stable sort leaves them
+            starts = np.searchsorted(bucket_keys, new_keys, side='left')
+            ends = np.searchsorted(bucket_keys, new_keys, side='right')
+            positions = starts.copy()
+            for i in np.flatnonzero(ends > starts):
+                positions[i] += np.searchsorted(band_rows[starts[i]:ends[i]], new_rows[i])
+            orders.append(np.insert(band_rows, positions, new_rows))
+            keys.append(np.insert(bucket_keys, positions, new_keys))
+        index.order = np.array(orders, dtype=np.int32).reshape(len(self.keys), len(catalog))
+        index.keys = np.array(keys, dtype=np.uint64).reshape(len(self.keys), len(catalog))
+        # Token runs of kept rows are copied; only fresh rows are tokenized
+        fresh_offsets, fresh_tokens = cocktail_tokens(catalog, fresh)
+        lengths = np.zeros(len(catalog), dtype=np.int64)
+        lengths[kept] = np.diff(self.offsets)[reuse[kept]]
+        lengths[fresh] = np.diff(fresh_offsets)
+        index.offsets = np.zeros(len(catalog) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=index.offsets[1:])
+        index.tokens = np.empty(index.offsets[-1], dtype=self.tokens.dtype)
+        runs = lengths[kept]
+        steps = np.arange(runs.sum()) - np.repeat(np.cumsum(runs) - runs, runs)
+        index.tokens[np.repeat(index.offsets[:-1][kept], runs) + steps] = \
+            self.tokens[np.repeat(self.offsets[reuse[kept]], runs) + steps]
+        runs = lengths[fresh]
+        steps = np.arange(runs.sum()) - np.repeat(np.cumsum(runs) - runs, runs)
+        index.tokens[np.repeat(index.offsets[:-1][fresh], runs) + steps] = fresh_tokens
+        return index
+
+    def candidates(self, row):
+        """Rows sharing at least one band bucket with row, excluding it"""
+        found = []
+        for band, key in enumerate(band_keys(self.signatures[row:row + 1])[0]):
+            keys = self.keys[band]
+            start = np.searchsorted(keys, key, side='left')
+            end = min(np.searchsorted(keys, key, side='right'), start + MAX_BUCKET)
+            found.append(self.order[band, start:end])
+        ids = np.unique(np.concatenate(found)) if found else _EMPTY
+        return ids[ids != row]
+
+    def widened(self, row, ids):
+        """ids plus cocktails sharing row's base spirit or a flavor, rarest first, at most MAX_WIDENED
+
+        Cocktails sharing neither rarely make the top k, and finding them
+        would mean comparing the whole catalog.
+        """
+        columns = self.catalog.columns
+        index = self.catalog.index
+        offsets = columns['flavors_offsets']
+        postings = [index.posting('base_spirit', int(columns['base_spirit'][row]))]
+        postings.extend(index.posting('flavors', int(flavor))
+                        for flavor in columns['flavors_values'][offsets[row]:offsets[row + 1]])
+        found = [ids]
+        room = MAX_WIDENED - len(ids)
+        for posting in sorted(postings, key=len):
+            if room <= 0:
+                break
+            found.append(posting[:room])
+            room -= len(found[-1])
+        ids = np.unique(np.concatenate(found)).astype(np.int32)
+        return ids[ids != row]
+
+    def jaccard(self, row, ids):
+        """Exact token-set Jaccard similarity of row with each of ids"""
+        query = self.tokens[self.offsets[row]:self.offsets[row + 1]]
+        starts, ends = self.offsets[ids], self.offsets[ids + 1]
+        lengths = ends - starts
+        gathered = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        hits = np.isin(self.tokens[gathered], query)
+        owners = np.repeat(np.arange(len(ids)), lengths)
+        shared = np.bincount(owners, weights=hits, minlength=len(ids))
+        return shared / np.maximum(len(query) + lengths - shared, 1)
+
+    def similar(self, row, k=10):
+        """(ids, similarities) of the k cocktails most like row, best first
+
+        Ties are broken by name. When the buckets hold fewer than k
+        candidates the search is widened (see widened), never to the whole
+        catalog.
+        """
+        ids = self.candidates(row)
+        if len(ids) < k:
+            ids = self.widened(row, ids)
+        similarities = self.jaccard(row, ids)
+        ids, similarities = ids[similarities > 0], similarities[similarities > 0]
+        # Rank by similarity (in 1/10000ths), then name
+        name_rank = self.catalog.columns['name_rank']
+        keys = name_rank[ids].astype(np.int64) - np.round(similarities * 10000).astype(np.int64) * len(name_rank)
+        order = top_k(keys, k)
+        return ids[order], similarities[order]
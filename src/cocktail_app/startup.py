@@ -0,0 +1,131 @@
+"""Startup budget checks
+
+python -m cocktail_app check-startup measures, each time in a fresh
+interpreter, how long importing the GUI module takes and how long after
+launch the window first paints, and checks that the modules behind the
+headless commands never import tkinter. Each figure is reported against
+its target and the command exits non-zero when one is missed.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+IMPORT_TARGET_MS = 100
+FIRST_PAINT_TARGET_MS = 750
+# Modules behind serve, batch, bench, build-table and compile-kb, and the engine they share
+HEADLESS_MODULES = (
+    'cocktail_app.recommender',
+    'cocktail_app.backends',
+    'cocktail_app.shards',
+    'cocktail_app.server',
+    'cocktail_app.batch',
+    'cocktail_app.bench',
+    'cocktail_app.precompute',
+    'cocktail_app.compiled',
+    'cocktail_app.prolog_pool',
+)
+# Set to the launch time (time.time()) to have the GUI report its first paint and exit
+PROBE_ENV = 'MIXMASTER_STARTUP_PROBE'
+PROBE_TIMEOUT = 60
+
+
+def _run(args, env=None, timeout=PROBE_TIMEOUT):
+    environment = dict(os.environ, **(env or {}))
+    # The child must import this copy of the package
+    package_root = str(Path(__file__).resolve().parent.parent)
+    environment['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [package_root, environment.get('PYTHONPATH')]))
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True,
+                          env=environment, timeout=timeout)
+
+
+def _last_line(text):
+    lines = text.strip().splitlines()
+    return lines[-1] if lines else ''
+
+
+def measure_import(module='cocktail_app.gui', runs=3):
+    """Fastest of runs cold imports of module, in ms"""
+    code = (f"import time; start = time.perf_counter(); import {module}; "
+            f"print((time.perf_counter() - start) * 1000)")
+    timings = []
+    for _ in range(runs):
+        result = _run(['-c', code])
+        if result.returncode != 0:
+            raise RuntimeError(f"importing {module} failed: {_last_line(result.stderr)}")
+        timings.append(float(_last_line(result.stdout)))
+    return min(timings)
+
+
+def gui_imports(module):
+    """Whether importing module loads tkinter"""
+    code = f"import sys, {module}; print('tkinter' in sys.modules)"
+    result = _run(['-c', code])
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed: {_last_line(result.stderr)}")
+    return _last_line(result.stdout) == 'True'
+
+
+def measure_first_paint():
+    """Ms from launching the GUI to its first paint, or None and the reason it could not run"""
+    result = _run(['-m', 'cocktail_app', 'gui'], env={PROBE_ENV: repr(time.time())})
+    for line in result.stdout.splitlines():
+        if line.startswith('{'):
+            return json.loads(line)['first_paint_ms'], None
+    return None, _last_line(result.stderr) or f"exit status {result.returncode}"
+
+
+def report_first_paint(root):
+    """Print the time since launch once root has painted, then close it
+
+    Must be registered before the app schedules its own idle work, so that
+    the deferred parts of the window are not counted.
+    """
+    launched = float(os.environ[PROBE_ENV])
+
+    def painted():
+        root.update_idletasks()
+        elapsed = (time.time() - launched) * 1000
+        print(json.dumps({'first_paint_ms': round(elapsed, 1)}), flush=True)
+        root.after(1, root.destroy)
+
+    root.after_idle(painted)
+
+
+def check(import_target=IMPORT_TARGET_MS, paint_target=FIRST_PAINT_TARGET_MS, runs=3):
+    """Run every startup check; returns (report lines, whether all passed)"""
+    lines = []
+    passed = True
+
+    def verdict(ok):
+        nonlocal passed
+        passed = passed and ok
+        return 'ok' if ok else 'FAIL'
+
+    import_ms = measure_import('cocktail_app.gui', runs)
+    lines.append(f"import cocktail_app.gui  {import_ms:8.1f} ms  (target {import_target} ms)  "
+                 f"{verdict(import_ms <= import_target)}")
+
+    paint_ms, reason = measure_first_paint()
+    if paint_ms is None:
+        lines.append(f"first paint              skipped: {reason}")
+    else:
+        lines.append(f"first paint              {paint_ms:8.1f} ms  (target {paint_target} ms)  "
+                     f"{verdict(paint_ms <= paint_target)}")
+
+    offenders = [module for module in HEADLESS_MODULES if gui_imports(module)]
+    if offenders:
+        lines.append(f"headless imports         {verdict(False)}: tkinter loaded by {', '.join(offenders)}")
+    else:
+        lines.append(f"headless imports         {verdict(True)}: no tkinter in {len(HEADLESS_MODULES)} modules")
+    return lines, passed
+
+
+def main(args):
+    lines, passed = check(args.import_target, args.paint_target, args.runs)
+    print('\n'.join(lines))
+    if not passed:
+        raise SystemExit(1)
@@ -0,0 +1,107 @@
+"""Synthetic knowledge-base generator for benchmarks
+
+Writes a copy of the packaged knowledge base whose cocktail/11 facts are
+replaced by n generated ones. Attribute frequencies are skewed the way a
+real menu is: a handful of spirits, flavors and ingredients dominate and a
+long tail appears rarely.
+"""
+import random
+import re
+from pathlib import Path
+
+from .kb import KB_PATH
+
+SPIRITS = [('vodka', 24), ('gin', 20), ('rum', 18), ('whiskey', 16), ('tequila', 12),
+           ('brandy', 5), ('mezcal', 3), ('pisco', 2)]
+FLAVORS = ['sweet', 'citrus', 'bitter', 'sour', 'strong', 'refreshing', 'herbal', 'creamy',
+           'fruity', 'complex', 'balanced', 'aromatic', 'spicy', 'smoky', 'floral', 'minty',
+           'rich', 'coffee', 'salty', 'tropical', 'nutty', 'caffeinated']
+STRENGTHS = [('medium', 50), ('strong', 30), ('light', 20)]
+COMPLEXITIES = [('beginner', 45), ('intermediate', 40), ('expert', 15)]
+SEASONS = [('all_seasons', 35), ('summer', 30), ('winter', 15), ('spring', 10), ('autumn', 10)]
+OCCASIONS = ['party', 'casual', 'relaxing', 'sophisticated', 'celebration', 'after_dinner',
+             'aperitif', 'romantic', 'romantic_dinner', 'casual_relaxing']
+TECHNIQUES = ['shaking', 'stirring', 'straining', 'muddling', 'building', 'layering',
+              'dry_shaking', 'blending', 'smoking', 'infusing', 'fat_washing']
+GLASSES = ['rocks', 'highball', 'cocktail', 'martini', 'coupe', 'collins', 'tiki', 'flute']
+BASE_INGREDIENTS = ['lime', 'lemon', 'simple_syrup', 'sugar', 'soda_water', 'mint', 'bitters',
+                    'orange', 'cherry', 'egg_white', 'heavy_cream', 'coffee_liqueur', 'campari',
+                    'sweet_vermouth', 'dry_vermouth', 'grapefruit_soda', 'salt', 'maraschino',
+                    'violet_liqueur', 'fresh_espresso', 'pineapple', 'ginger_beer', 'honey',
+                    'agave_syrup', 'cranberry', 'triple_sec', 'grenadine', 'coconut_cream']
+ADJECTIVES = ['smoky', 'golden', 'velvet', 'midnight', 'tropical', 'silver', 'wild', 'bitter',
+              'royal', 'crimson', 'frozen', 'spiced', 'hidden', 'lucky', 'electric', 'salted']
+NOUNS = ['sunset', 'breeze', 'mule', 'sour', 'fizz', 'smash', 'julep', 'flip', 'cobbler',
+         'punch', 'sling', 'rickey', 'spritz', 'swizzle', 'toddy', 'collins']
+HISTORY_WORDS = ['created', 'classic', 'bar', 'bartender', 'named', 'after', 'popular', 'in',
+                 'the', 'served', 'first', 'for', 'a', 'famous', 'hotel', 'revival', 'modern',
+                 'twist', 'on', 'century', 'island', 'city', 'club', 'legend']
+
+# Long tail of rare ingredients, drawn with a Zipf-like weight
+RARE_INGREDIENTS = [f'ingredient_{i}' for i in range(500)]
+RARE_WEIGHTS = [1.0 / (i + 1) for i in range(len(RARE_INGREDIENTS))]
+
+_FACT_RE = re.compile(r'^cocktail\(.*?\)\.[ \t]*\n', re.MULTILINE | re.DOTALL)
+
+
+def _weighted(rng, pairs):
+    values, weights = zip(*pairs)
+    return rng.choices(values, weights)[0]
+
+
+def _skewed_sample(rng, population, low, high):
+    """A few distinct items, biased towards the front of population"""
+    count = rng.randint(low, high)
+    picked = []
+    while len(picked) < count:
+        item = population[min(int(rng.expovariate(4.0 / len(population))), len(population) - 1)]
+        if item not in picked:
+            picked.append(item)
+    return picked
+
+
+def _atom_list(items):
+    return '[' + ', '.join(items) + ']'
+
+
+def generate_fact(rng, index):
+    """Source text of one random cocktail/11 fact"""
+    spirit = _weighted(rng, SPIRITS)
+    name = f"{rng.choice(ADJECTIVES)}_{rng.choice(NOUNS)}_{index}"
+    ingredients = [spirit] + _skewed_sample(rng, BASE_INGREDIENTS, 2, 4)
+    if rng.random() < 0.4:
+        ingredients += rng.choices(RARE_INGREDIENTS, RARE_WEIGHTS, k=rng.randint(1, 2))
+    ingredients = list(dict.fromkeys(ingredients))
+    techniques = _skewed_sample(rng, TECHNIQUES, 1, 3)
+    flavors = _skewed_sample(rng, FLAVORS, 2, 5)
+    occasions = _skewed_sample(rng, OCCASIONS, 1, 3)
+    history = ' '.join(rng.choice(HISTORY_WORDS) for _ in range(rng.randint(4, 12))).capitalize()
+    return (f"cocktail({name}, {spirit},\n"
+            f"    {_atom_list(ingredients)},\n"
+            f"    {_atom_list(techniques)},\n"
+            f"    {_atom_list(flavors)},\n"
+            f"    {_weighted(rng, STRENGTHS)}, {_weighted(rng, COMPLEXITIES)}, {_weighted(rng, SEASONS)}, "
+            f"{_atom_list(occasions)}, {rng.choice(GLASSES)},\n"
+            f"    '{history}').\n\n")
+
+
+def generate_kb(path, size, seed=0, template=KB_PATH):
+    """Write a knowledge base with size generated cocktails to path
+
+    Everything except the template's own cocktail/11 facts (directives,
+    matching engine, display predicates) is copied unchanged, so the file
+    works with both backends.
+    """
+    source = Path(template).read_text(encoding='utf-8')
+    facts = list(_FACT_RE.finditer(source))
+    head = source[:facts[0].start()] if facts else source
+    tail = _FACT_RE.sub('', source[facts[0].start():]) if facts else ''
+    rng = random.Random(seed)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as out:
+        out.write(head)
+        for index in range(size):
+            out.write(generate_fact(rng, index))
+        out.write(tail)
+    return path
@@ -0,0 +1,108 @@
+"""Background work for the GUI
+
+TaskRunner runs backend calls on a fixed set of worker threads, so the
+number of queries in flight never grows with clicking. Tasks wait in a
+bounded queue and a task submitted while another of the same kind is
+still waiting replaces it: only the latest query of a kind is wanted.
+
+Workers never touch Tk. They post callbacks to an outbox that the GUI
+drains on the main thread from a root.after polling loop, a batch per
+tick. Errors are posted the same way, as an argument of the task's
+on_error callback.
+"""
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+
+from .cancel import Cancelled
+
+DEFAULT_WORKERS = 2
+MAX_PENDING = 8
+# Callbacks run per drain, so a burst of results cannot stall the event loop
+DRAIN_BATCH = 50
+
+Task = namedtuple('Task', ['task_id', 'kind', 'func', 'args', 'on_error'])
+
+
+class Busy(Exception):
+    """Raised when the task queue is full."""
+
+
+class TaskRunner:
+    """Worker threads fed from a bounded, kind-coalescing queue"""
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_pending=MAX_PENDING):
+        self.max_pending = max_pending
+        self.pending = OrderedDict()
+        self.outbox = deque()
+        self.next_id = 0
+        self.closed = False
+        self._condition = threading.Condition()
+        self._threads = [threading.Thread(target=self._work, name=f'gui-worker-{i}', daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, kind, func, *args, on_error=None):
+        """Queue func(*args) and return its task id
+
+        A waiting task of the same kind is dropped in favour of this one;
+        kind None never replaces anything. on_error(exception) is posted
+        if func raises anything but Cancelled.
+        """
+        with self._condition:
+            if self.closed:
+                raise Busy("The task runner has shut down")
+            self.next_id += 1
+            key = ('task', self.next_id) if kind is None else kind
+            if key not in self.pending and len(self.pending) >= self.max_pending:
+                raise Busy(f"{len(self.pending)} tasks are already waiting")
+            self.pending.pop(key, None)
+            self.pending[key] = Task(self.next_id, kind, func, args, on_error)
+            self._condition.notify()
+            return self.next_id
+
+    def post(self, callback, *args):
+        """Have the main thread run callback(*args) on its next drain"""
+        if not self.closed:
+            self.outbox.append((callback, args))
+
+    def drain(self, limit=DRAIN_BATCH):
+        """Run up to limit posted callbacks on the calling thread; returns how many ran"""
+        ran = 0
+        while ran < limit and self.outbox:
+            callback, args = self.outbox.popleft()
+            ran += 1
+            callback(*args)
+        return ran
+
+    def shutdown(self, timeout=None):
+        """Drop waiting tasks and wait for running ones; True if every worker stopped
+
+        Callers cancel the queries in flight first so workers return promptly.
+        """
+        with self._condition:
+            self.closed = True
+            self.pending.clear()
+            self._condition.notify_all()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+        self.outbox.clear()
+        return not any(thread.is_alive() for thread in self._threads)
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self.pending and not self.closed:
+                    self._condition.wait()
+                if self.closed:
+                    return
+                _, task = self.pending.popitem(last=False)
+            try:
+                task.func(*task.args)
+            except Cancelled:
+                pass
+            except Exception as error:
+                if task.on_error is not None:
+                    self.post(task.on_error, error)
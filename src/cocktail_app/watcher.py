@@ -0,0 +1,174 @@
+"""Knowledge base hot reload
+
+KBWatcher polls the knowledge base file. When its contents change it
+re-reads the cocktail/11 facts, working out which cocktails were added,
+removed or changed, and hands that diff to a callback which patches the
+live catalog, indexes and caches. Only facts whose text changed are
+parsed again, so an edit to a large menu is picked up quickly.
+
+The file is split into clauses where kb's tokenizer ends them, so a quoted
+history containing ")." does not end a fact early.
+
+A watcher given a baseline does not parse the file when it starts: the
+first edit is diffed against the cocktails the caller already loaded.
+"""
+import hashlib
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+from .kb import KnowledgeBaseError, iter_clause_text, kb_fingerprint, parse_cocktails
+from .metrics import count, span
+
+POLL_INTERVAL = 1.0
+
+# Cocktails only in the new file, only in the old one, and (old, new) pairs
+# of cocktails whose fact changed
+KBDiff = namedtuple('KBDiff', ['added', 'removed', 'changed'])
+
+
+def diff_cocktails(old, new):
+    """KBDiff between two cocktail lists, matched by name
+
+    Returns None when either list repeats a name, since facts can then
+    not be paired up; callers treat that as a full reload.
+    """
+    before = {cocktail.name: cocktail for cocktail in old}
+    after = {cocktail.name: cocktail for cocktail in new}
+    if len(before) != len(old) or len(after) != len(new):
+        return None
+    added = tuple(cocktail for name, cocktail in after.items() if name not in before)
+    removed = tuple(cocktail for name, cocktail in before.items() if name not in after)
+    changed = tuple((before[name], cocktail) for name, cocktail in after.items()
+                    if name in before and before[name] != cocktail)
+    return KBDiff(added, removed, changed)
+
+
+class KBWatcher:
+    """Reports edits to a knowledge base file to on_change(cocktails, diff)
+
+    check() is cheap while the file is untouched: one stat. Until start()
+    is called the watcher only notices that the contents changed and calls
+    on_change(None, None), asking for a full reload. Once started, a
+    background thread polls every interval seconds, keeps the parsed facts
+    and passes the new cocktail list with its KBDiff (or a None diff when
+    facts cannot be paired by name).
+
+    baseline(kb_hash), when given, returns the cocktails already loaded
+    from the contents with that hash, or None. The started watcher then
+    only hashes the file until it changes, and diffs the first edit
+    against the baseline instead of a parse of its own.
+    """
+
+    def __init__(self, kb_path, on_change, interval=POLL_INTERVAL, baseline=None):
+        self.kb_path = Path(kb_path)
+        self.on_change = on_change
+        self.interval = interval
+        self.baseline = baseline
+        self.reloads = 0
+        self._cocktails = None
+        self._facts = {}
+        self._stamp = None
+        self._hash = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and not self._stopped.is_set()
+
+    @property
+    def kb_hash(self):
+        """Fingerprint of the contents last seen, reading the file if none was"""
+        return self._hash or kb_fingerprint(self.kb_path)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._poll, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def check(self):
+        """Pick up an edit made since the last check; True if one was applied
+
+        Never waits: if another thread is applying an edit, returns False.
+        """
+        stamp = self._stat()
+        if stamp is None or stamp == self._stamp:
+            return False
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            return self._refresh(stamp)
+        finally:
+            self._lock.release()
+
+    def _stat(self):
+        try:
+            stat = self.kb_path.stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _refresh(self, stamp):
+        # The stamp is taken before reading so a write during the read is seen next time
+        try:
+            source = self.kb_path.read_bytes()
+        except OSError:
+            return False
+        self._stamp = stamp
+        digest = hashlib.sha256(source).hexdigest()
+        if digest == self._hash:
+            return False
+        first = self._hash is None
+        cocktails = None
+        if self.running and not (first and self.baseline is not None):
+            try:
+                cocktails = self._parse(source.decode('utf-8'))
+            except (KnowledgeBaseError, UnicodeDecodeError):
+                # Most likely saved half-way; keep serving the last good facts
+                count('kb.reload_error')
+                return False
+        previous = self._cocktails
+        if previous is None and cocktails is not None and not first and self.baseline is not None:
+            previous = self.baseline(self._hash)
+        self._hash = digest
+        self._cocktails = cocktails
+        if first:
+            return False
+        diff = None
+        if previous is not None and cocktails is not None:
+            diff = diff_cocktails(previous, cocktails)
+        fields = {} if diff is None else {
+            'added': len(diff.added), 'removed': len(diff.removed), 'changed': len(diff.changed)}
+        with span('kb.reload', **fields):
+            self.on_change(cocktails, diff)
+        self.reloads += 1
+        count('kb.reload')
+        return True
+
+    def _parse(self, source):
+        """Cocktails in source, parsing only facts not seen in the last version"""
+        facts = {}
+        cocktails = []
+        for text in iter_clause_text(source):
+            if text in self._facts:
+                parsed = self._facts[text]
+            else:
+                parsed = parse_cocktails(text)
+            facts[text] = parsed
+            cocktails.extend(parsed)
+        self._facts = facts
+        return cocktails
+
+    def _poll(self):
+        while True:
+            stamp = self._stat()
+            if stamp is not None and stamp != self._stamp:
+                with self._lock:
+                    self._refresh(stamp)
+            if self._stopped.wait(self.interval):
+                return
@@ -0,0 +1,47 @@
+"""Shared fixtures for the test suite
+
+The package is run with src on PYTHONPATH; the tests put it there too, so
+`python -m pytest` works from the project root.
+"""
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from cocktail_app.engine import Catalog  # noqa: E402
+from cocktail_app.kb import Preferences, load_cocktails  # noqa: E402
+from cocktail_app.synth import FLAVORS, OCCASIONS, SEASONS, SPIRITS, generate_kb  # noqa: E402
+
+SYNTHETIC_SIZE = 3000
+
+
+def preference_grid(count=60, seed=11):
+    """A fixed sample of preferences, including values no cocktail has"""
+    rng = random.Random(seed)
+    spirits = ['no_preference', 'absinthe'] + [spirit for spirit, _ in SPIRITS]
+    flavors = FLAVORS + ['umami']
+    occasions = OCCASIONS + ['funeral']
+    seasons = [season for season, _ in SEASONS]
+    return [Preferences(spirit=rng.choice(spirits), flavor=rng.choice(flavors),
+                        skill=rng.choice(['beginner', 'intermediate', 'expert']),
+                        strength=rng.randint(1, 10), occasion=rng.choice(occasions),
+                        season=rng.choice(seasons))
+            for _ in range(count)]
+
+
+@pytest.fixture(scope='session')
+def synthetic_kb(tmp_path_factory):
+    return generate_kb(tmp_path_factory.mktemp('kb') / 'synthetic.pl', SYNTHETIC_SIZE, seed=7)
+
+
+@pytest.fixture(scope='session')
+def cocktails(synthetic_kb):
+    return load_cocktails(synthetic_kb)
+
+
+@pytest.fixture
+def catalog(cocktails):
+    return Catalog.from_cocktails(cocktails)
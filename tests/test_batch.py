@@ -0,0 +1,50 @@
+"""Batch scoring across a process pool"""
+import io
+import json
+
+from conftest import preference_grid
+from cocktail_app import batch
+from cocktail_app.compiled import load_catalog
+from cocktail_app.recommender import Recommender
+from cocktail_app.shards import ShardError
+from cocktail_app.synth import generate_kb
+
+
+def test_results_in_input_order(synthetic_kb):
+    grid = preference_grid(count=10)
+    profiles = [(number, dict(prefs._asdict(), id=f'p{number}')) for number, prefs in enumerate(grid)]
+    profiles.append((10, {'id': 'bad', 'strength': 'strong'}))
+    profiles.append((11, {'id': 11, '__error__': "Invalid JSON"}))
+    out = io.StringIO()
+    assert batch.run_batch(iter(profiles), out, synthetic_kb, jobs=2, chunk_size=3, limit=5) == 12
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [result['id'] for result in results] == [f'p{number}' for number in range(10)] + ['bad', 11]
+    recommender = Recommender('python', synthetic_kb, use_table=False)
+    for prefs, result in zip(grid, results):
+        page = recommender.recommend(prefs, 0, 5)
+        assert result['total'] == page.total
+        assert result['results'] == [{'name': m.cocktail.name, 'score': m.score} for m in page.matches]
+    assert 'Strength' in results[10]['error']
+    assert results[11]['error'] == "Invalid JSON"
+
+
+def test_backend_errors_are_reported_per_profile(monkeypatch):
+    class Unavailable:
+        def recommend(self, prefs, offset, limit):
+            raise ShardError("shard 1 did not answer")
+
+    monkeypatch.setattr(batch, '_recommender', Unavailable())
+    assert batch._score_profile(3, {'id': 'a'}, 5) == {'id': 'a', 'error': "shard 1 did not answer"}
+
+
+def test_pinned_recommender_leaves_the_file_alone(tmp_path):
+    kb_path = generate_kb(tmp_path / 'kb.pl', 200, seed=3)
+    catalog = load_catalog(kb_path)
+    assert catalog.kb_hash is not None
+    recommender = Recommender('python', kb_path, use_table=False, kb_hash=catalog.kb_hash)
+    prefs = preference_grid(count=1)[0]
+    before = recommender.recommend(prefs)
+    kb_path.write_text('', encoding='utf-8')
+    assert recommender.recommend(prefs._replace(strength=prefs.strength + 1)).total >= 0
+    assert recommender.generation == 0
+    assert recommender.recommend(prefs) == before
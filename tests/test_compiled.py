@@ -0,0 +1,99 @@
+"""Compiled catalog artifact round trip"""
+import os
+
+import numpy as np
+import pytest
+
+from conftest import preference_grid
+from cocktail_app.compiled import catalog_path, compile_catalog, load_catalog, open_catalog, save_catalog
+from cocktail_app.engine import recommend, search, similar
+from cocktail_app.kb import KnowledgeBaseError, kb_fingerprint
+from cocktail_app.synth import generate_kb
+
+
+@pytest.fixture
+def kb_path(tmp_path):
+    return generate_kb(tmp_path / 'kb.pl', 500, seed=2)
+
+
+def assert_same_catalog(got, expected):
+    assert len(got) == len(expected)
+    assert list(got.symbols) == list(expected.symbols)
+    assert set(got.columns) >= set(expected.columns)
+    for name, column in expected.columns.items():
+        np.testing.assert_array_equal(got.columns[name], column, err_msg=name)
+    assert [got.cocktail(i) for i in range(len(got))] == [expected.cocktail(i) for i in range(len(expected))]
+
+
+def test_round_trip(catalog, tmp_path):
+    catalog.index
+    catalog.similarity
+    path = tmp_path / 'catalog.bin'
+    save_catalog(catalog, path, 'abc')
+    opened = open_catalog(path, 'abc')
+    assert_same_catalog(opened, catalog)
+    # The index comes back from the file instead of being rebuilt
+    assert opened._index is not None
+    for field, postings in catalog.index.postings.items():
+        assert sorted(opened.index.postings[field]) == sorted(postings)
+        for key, posting in postings.items():
+            np.testing.assert_array_equal(opened.index.postings[field][key], posting)
+    for prefs in preference_grid(count=20):
+        for got, expected in zip(recommend(opened, prefs), recommend(catalog, prefs)):
+            np.testing.assert_array_equal(got, expected)
+    name = catalog.cocktail(0).name
+    for got, expected in zip(similar(opened, name), similar(catalog, name)):
+        np.testing.assert_array_equal(got, expected)
+    for got, expected in zip(search(opened, 'gin lime'), search(catalog, 'gin lime')):
+        np.testing.assert_array_equal(got, expected)
+
+
+def test_columns_are_read_only(catalog, tmp_path):
+    path = save_catalog(catalog, tmp_path / 'catalog.bin')
+    opened = open_catalog(path)
+    with pytest.raises(ValueError):
+        opened.columns['name'][0] = 1
+
+
+def test_other_kb_hash_is_refused(catalog, tmp_path):
+    path = save_catalog(catalog, tmp_path / 'catalog.bin', 'abc')
+    with pytest.raises(KnowledgeBaseError):
+        open_catalog(path, 'def')
+
+
+def test_load_catalog_uses_fresh_artifact(kb_path):
+    compile_catalog(kb_path)
+    catalog = load_catalog(kb_path)
+    # Opened, not parsed: the index comes with it and the columns are read-only views
+    assert catalog._index is not None
+    assert not catalog.columns['name'].flags.writeable
+
+
+def test_load_catalog_follows_contents_not_mtime(kb_path):
+    first = load_catalog(kb_path)
+    assert catalog_path(kb_path).exists()
+    stat = os.stat(kb_path)
+    source = kb_path.read_text(encoding='utf-8')
+    start = source.index('\ncocktail(') + 1
+    end = source.index('\ncocktail(', start) + 1
+    kb_path.write_text(source[:start] + source[end:], encoding='utf-8')
+    # Same timestamps as the artifact was built against
+    os.utime(kb_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    second = load_catalog(kb_path)
+    assert len(second) == len(first) - 1
+    assert second.cocktail(0) == first.cocktail(1)
+    # and the rebuilt artifact carries the new hash
+    assert len(open_catalog(catalog_path(kb_path), kb_fingerprint(kb_path))) == len(second)
+
+
+@pytest.mark.parametrize('damage', [
+    lambda data: b'MXCATLG2 not really',
+    lambda data: data[:12],
+    lambda data: data[:len(data) // 2],
+    lambda data: b'NOTMAGIC' + data[8:],
+], ids=['garbage', 'short_header', 'truncated', 'magic'])
+def test_damaged_artifact_is_rebuilt(kb_path, damage):
+    expected = load_catalog(kb_path)
+    path = catalog_path(kb_path)
+    path.write_bytes(damage(path.read_bytes()))
+    assert_same_catalog(load_catalog(kb_path), expected)
@@ -0,0 +1,34 @@
+"""Posting-list pruning against scoring the whole catalog"""
+import numpy as np
+import pytest
+
+from conftest import preference_grid
+from cocktail_app import index
+from cocktail_app.engine import SCORE_THRESHOLD, score_catalog
+
+
+def full_scan(catalog, prefs, threshold=SCORE_THRESHOLD):
+    scores = score_catalog(catalog, prefs)
+    ids = np.flatnonzero(scores >= threshold)
+    return ids, scores[ids]
+
+
+# 0 always takes the dense accumulator, a huge ratio always the sparse merge
+@pytest.mark.parametrize('ratio', [0, index.SPARSE_RATIO, 10 ** 9], ids=['dense', 'default', 'sparse'])
+def test_matches_equal_full_scan(catalog, monkeypatch, ratio):
+    monkeypatch.setattr(index, 'SPARSE_RATIO', ratio)
+    for prefs in preference_grid():
+        ids, scores = catalog.index.matches(prefs)
+        expected_ids, expected_scores = full_scan(catalog, prefs)
+        np.testing.assert_array_equal(ids, expected_ids, err_msg=str(prefs))
+        np.testing.assert_array_equal(scores, expected_scores, err_msg=str(prefs))
+
+
+# Above the no_preference base, so every match is in some posting list
+@pytest.mark.parametrize('threshold', [2, 5, 9, 13, 14])
+def test_thresholds(catalog, threshold):
+    for prefs in preference_grid(count=10):
+        ids, scores = catalog.index.matches(prefs, threshold)
+        expected_ids, expected_scores = full_scan(catalog, prefs, threshold)
+        np.testing.assert_array_equal(ids, expected_ids, err_msg=str(prefs))
+        np.testing.assert_array_equal(scores, expected_scores, err_msg=str(prefs))
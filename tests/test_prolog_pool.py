@@ -0,0 +1,187 @@
+"""The framed worker protocol, against a stand-in for swipl
+
+The fake worker below speaks the protocol of knowledge/worker.pl, so the
+Python side is exercised without SWI-Prolog installed.
+"""
+import os
+import stat
+import sys
+import time
+
+import pytest
+
+from cocktail_app.kb import decode_stream
+from cocktail_app.prolog_pool import PrologError, SwiplPool, SwiplWorker, fresh_state, state_path
+
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason="the fake worker is a script run through its shebang")
+
+FAKE_WORKER = '''#!{python}
+import json
+import os
+import sys
+import time
+sys.stdin.reconfigure(encoding='utf-8')
+sys.stdout.reconfigure(encoding='utf-8', newline='\\n')
+
+goals = ' '.join(sys.argv)
+if 'qsave_program(' in goals:
+    # Saving a state: hold off until the test opens the gate
+    gate = os.environ.get('FAKE_SWIPL_GATE')
+    while gate and not os.path.exists(gate):
+        time.sleep(0.01)
+    target = goals.split("qsave_program('", 1)[1].split("'", 1)[0]
+    with open(target, 'w') as state:
+        state.write('saved')
+    sys.exit(0)
+
+
+def send(status, payload=''):
+    sys.stdout.write('%%FRAME ' + status + ' ' + str(len(payload)) + '\\n' + payload)
+    sys.stdout.flush()
+
+
+# Anything printed before the ready frame (a banner, warnings) is skipped
+print('Welcome to not-quite SWI-Prolog')
+send('ready')
+for line in sys.stdin:
+    goal = line.strip()
+    if goal == 'true.':
+        send('ok')
+    elif goal == 'fail.':
+        send('fail')
+    elif goal == 'tricky.':
+        # Lengths count characters, and a payload may look like a frame header
+        send('ok', 'caf\\u00e9 \\u20ac\\n%%FRAME ok 3\\nabc')
+    elif goal.startswith('items('):
+        count = int(goal[len('items('):-2])
+        send('item', json.dumps({{'total': count}}))
+        for i in range(count):
+            send('item', json.dumps({{
+                'name': 'drink_' + str(i), 'score': 10 - i % 3, 'base_spirit': 'gin',
+                'ingredients': ['gin', 'lime'], 'techniques': ['shaking'], 'flavors': ['citrus'],
+                'strength': 'medium', 'complexity': 'beginner', 'season': 'all_seasons',
+                'occasions': ['casual'], 'glass': 'coupe', 'history': 'Made up.'}}))
+        send('ok')
+    elif goal == 'restored.':
+        send('ok', str('-x' in sys.argv).lower())
+    elif goal == 'die.':
+        sys.exit(1)
+    else:
+        send('error', 'unknown procedure ' + goal)
+'''
+
+
+@pytest.fixture
+def executable(tmp_path):
+    path = tmp_path / 'fake-swipl'
+    path.write_text(FAKE_WORKER.format(python=sys.executable), encoding='utf-8')
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return str(path)
+
+
+@pytest.fixture
+def worker(executable, tmp_path):
+    worker = SwiplWorker(tmp_path / 'kb.pl', executable)
+    worker.start()
+    yield worker
+    worker.stop()
+
+
+def test_request_replies(worker):
+    assert worker.request('true') == ''
+    assert worker.request('tricky.') == 'café €\n%%FRAME ok 3\nabc'
+    # Still in step after a payload holding a frame marker
+    assert worker.request('true') == ''
+
+
+def test_failures_raise(worker):
+    with pytest.raises(PrologError, match='failed'):
+        worker.request('fail')
+    with pytest.raises(PrologError, match='unknown procedure'):
+        worker.request('nonsense')
+    assert worker.request('true') == ''
+
+
+def test_stream_items(worker):
+    payloads = list(worker.stream('items(5)'))
+    assert len(payloads) == 6
+    pages = list(decode_stream(payloads, offset=10, batch_size=2))
+    assert [page.offset for page in pages] == [10, 12, 14]
+    assert all(page.total == 5 for page in pages)
+    matches = [match for page in pages for match in page.matches]
+    assert [match.score for match in matches] == [10, 9, 8, 10, 9]
+    assert matches[0].cocktail.name == 'drink_0' and matches[0].cocktail.flavors == ['citrus']
+
+
+def test_closing_a_stream_early_drains_it(worker):
+    stream = worker.stream('items(50)')
+    next(stream)
+    next(stream)
+    stream.close()
+    assert worker.alive()
+    assert worker.request('tricky') == 'café €\n%%FRAME ok 3\nabc'
+
+
+def test_dead_worker(worker):
+    with pytest.raises(PrologError, match='exited'):
+        worker.request('die')
+    assert not worker.alive()
+    with pytest.raises(PrologError, match='not running'):
+        worker.request('true')
+
+
+def test_pool_restarts_dead_workers(executable, tmp_path):
+    pool = SwiplPool(tmp_path / 'kb.pl', size=1, executable=executable, health_interval=0, use_state=False)
+    try:
+        assert pool.query('true') == ''
+        with pytest.raises(PrologError):
+            pool.query('die')
+        # Checked back in dead, so it was restarted
+        assert pool.query('tricky') == 'café €\n%%FRAME ok 3\nabc'
+    finally:
+        pool.close()
+
+
+def test_pool_saves_state_in_background(executable, tmp_path, monkeypatch):
+    kb_path = tmp_path / 'kb.pl'
+    kb_path.write_text('cocktail_fact.\n', encoding='utf-8')
+    gate = tmp_path / 'gate'
+    monkeypatch.setenv('FAKE_SWIPL_GATE', str(gate))
+    pool = SwiplPool(kb_path, size=1, executable=executable, health_interval=0)
+    try:
+        # Answers from the source while the state is still being saved
+        assert pool.query('restored') == 'false'
+        assert pool.state is None and fresh_state(kb_path) is None
+        gate.touch()
+        deadline = time.monotonic() + 10
+        while pool.state is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert pool.state == state_path(kb_path) == fresh_state(kb_path)
+        # Workers restarted from now on restore it
+        with pytest.raises(PrologError):
+            pool.query('die')
+        assert pool.query('restored') == 'true'
+    finally:
+        pool.close()
+
+
+def test_state_follows_contents_not_mtime(executable, tmp_path):
+    kb_path = tmp_path / 'kb.pl'
+    kb_path.write_text('cocktail_fact.\n', encoding='utf-8')
+    pool = SwiplPool(kb_path, size=1, executable=executable, health_interval=0)
+    pool.start()
+    deadline = time.monotonic() + 10
+    while pool.state is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pool.close()
+    assert fresh_state(kb_path) is not None
+    stat_before = kb_path.stat()
+    kb_path.write_text('other_fact.\n', encoding='utf-8')
+    os.utime(kb_path, ns=(stat_before.st_atime_ns, stat_before.st_mtime_ns))
+    assert fresh_state(kb_path) is None
+
+
+def test_decode_stream_without_items():
+    pages = list(decode_stream(['{"total": 0}']))
+    assert len(pages) == 1
+    assert pages[0].matches == () and pages[0].total == 0
@@ -0,0 +1,95 @@
+"""Ranking order, ties and pagination"""
+import numpy as np
+import pytest
+
+from conftest import preference_grid
+from cocktail_app.engine import Catalog, recommend, score_catalog
+from cocktail_app.kb import Cocktail, Preferences
+from cocktail_app.ranking import rank, top_k
+from cocktail_app.recommender import Recommender
+from cocktail_app.results_view import FIRST_BATCH, PAGE_SIZE
+
+
+def expected_ranking(catalog, prefs):
+    """(name, score) of every match, sorted the way sort_candidates/2 does"""
+    scores = score_catalog(catalog, prefs)
+    names = catalog.field('name')
+    return sorted(((names[i], int(scores[i])) for i in np.flatnonzero(scores >= 3)),
+                  key=lambda pair: (-pair[1], pair[0]))
+
+
+def ranked(catalog, ids, scores):
+    names = catalog.field('name')
+    return [(names[i], int(score)) for i, score in zip(ids, scores)]
+
+
+def test_full_ranking(catalog):
+    for prefs in preference_grid():
+        ids, scores, total = recommend(catalog, prefs)
+        expected = expected_ranking(catalog, prefs)
+        assert total == len(expected)
+        assert ranked(catalog, ids, scores) == expected
+
+
+@pytest.mark.parametrize('limit', [1, 7, 20, 1000])
+def test_pages_tile_the_ranking(catalog, limit):
+    prefs = preference_grid(count=1)[0]
+    expected = expected_ranking(catalog, prefs)
+    pages = []
+    for offset in range(0, len(expected) + limit, limit):
+        ids, scores, total = recommend(catalog, prefs, offset, limit)
+        assert total == len(expected)
+        assert len(ids) == max(0, min(limit, len(expected) - offset))
+        pages.extend(ranked(catalog, ids, scores))
+    assert pages == expected
+
+
+def test_ties_are_broken_by_name():
+    # Every cocktail scores the same, inserted in reverse name order
+    names = [f'drink_{i:03d}' for i in range(200)][::-1] + ['Zombie', 'apple', 'aperol_spritz']
+    cocktails = [Cocktail(name, 'gin', ['lime'], ['shaking'], ['citrus'], 'medium', 'beginner',
+                          'all_seasons', ['casual'], 'coupe', '') for name in names]
+    catalog = Catalog.from_cocktails(cocktails)
+    prefs = Preferences('gin', 'citrus', 'beginner', 6, 'casual', 'summer')
+    ids, scores, total = recommend(catalog, prefs, 0, 50)
+    assert set(scores.tolist()) == {13}
+    # Prolog's standard order of atoms compares character codes
+    assert [catalog.field('name')[i] for i in ids] == sorted(names)[:50]
+    ids, _, _ = recommend(catalog, prefs, 195, 50)
+    assert [catalog.field('name')[i] for i in ids] == sorted(names)[195:]
+
+
+def test_top_k_selects_the_smallest_keys():
+    rng = np.random.default_rng(5)
+    keys = rng.integers(0, 50, 1000)
+    for k in (0, 1, 10, 999, 1000, 1500):
+        order = top_k(keys, k)
+        assert len(order) == min(k, len(keys))
+        np.testing.assert_array_equal(keys[order], np.sort(keys)[:k])
+
+
+def test_rank_with_equal_scores_and_offsets():
+    name_rank = np.array([3, 0, 4, 1, 2], dtype=np.int32)
+    ids = np.arange(5, dtype=np.int32)
+    scores = np.array([5, 5, 9, 5, 9], dtype=np.int32)
+    page, page_scores, total = rank(name_rank, ids, scores)
+    assert total == 5
+    assert page.tolist() == [4, 2, 1, 3, 0]
+    assert page_scores.tolist() == [9, 9, 5, 5, 5]
+    page, _, _ = rank(name_rank, ids, scores, 2, 2)
+    assert page.tolist() == [1, 3]
+    page, page_scores, total = rank(name_rank, ids, scores, 5, 2)
+    assert len(page) == 0 and len(page_scores) == 0 and total == 5
+
+
+def test_first_page_streams_in_several_batches(synthetic_kb):
+    recommender = Recommender('python', synthetic_kb, use_table=False)
+    backend = recommender.backend
+    prefs = max(preference_grid(), key=lambda prefs: backend.recommend(prefs, 0, 0).total)
+    expected = backend.recommend(prefs, 0, PAGE_SIZE)
+    assert expected.total > PAGE_SIZE
+    # Streamed from the backend, then replayed from the cache
+    for _ in range(2):
+        batches = list(recommender.stream_recommend(prefs, 0, PAGE_SIZE, FIRST_BATCH))
+        assert [len(batch.matches) for batch in batches] == [FIRST_BATCH] * (PAGE_SIZE // FIRST_BATCH)
+        assert [match for batch in batches for match in batch.matches] == list(expected.matches)
@@ -0,0 +1,147 @@
+"""Hot reload: patched catalogs against a fresh load"""
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from conftest import preference_grid
+from cocktail_app.engine import Catalog, recommend
+from cocktail_app.recommender import Recommender
+from cocktail_app.similarity import SimilarityIndex
+from cocktail_app.synth import generate_kb
+from cocktail_app.watcher import KBWatcher, diff_cocktails
+
+FACT = ("cocktail({name}, gin, [gin, lime], [shaking], [citrus], medium, beginner, all_seasons, "
+        "[casual], coupe, {history}).\n")
+
+
+def edited(cocktails):
+    """cocktails with a change, a removal, an insertion, a new atom and two facts swapped"""
+    new = list(cocktails)
+    new[10] = new[10]._replace(flavors=['umami'], strength='strong')
+    new[20] = new[20]._replace(history='Rewritten.')
+    del new[30:45]
+    new.insert(100, new[5]._replace(name='brand_new_fizz', base_spirit='aquavit'))
+    new[200], new[300] = new[300], new[200]
+    return new
+
+
+def reuse_rows(old, new):
+    """What PythonBackend.apply_changes passes to Catalog.updated"""
+    diff = diff_cocktails(old, new)
+    touched = {drink.name for drink in diff.added} | {drink.name for _, drink in diff.changed}
+    rows = {drink.name: row for row, drink in enumerate(old)}
+    return [-1 if drink.name in touched else rows[drink.name] for drink in new]
+
+
+def by_name(catalog, ids, scores):
+    names = catalog.field('name')
+    return [(names[i], int(score)) for i, score in zip(ids, scores)]
+
+
+@pytest.fixture
+def reloaded(cocktails):
+    old = Catalog.from_cocktails(cocktails)
+    # Build every index so updated() has something to patch
+    old.index, old.similarity, old.search
+    new = edited(cocktails)
+    return old.updated(new, reuse_rows(cocktails, new)), Catalog.from_cocktails(new), new
+
+
+def test_rows_match_fresh_load(reloaded):
+    patched, fresh, new = reloaded
+    assert len(patched) == len(fresh) == len(new)
+    assert [patched.cocktail(i) for i in range(len(patched))] == new
+    np.testing.assert_array_equal(patched.columns['name_rank'], fresh.columns['name_rank'])
+
+
+def test_recommendations_match_fresh_load(reloaded):
+    patched, fresh, _ = reloaded
+    for prefs in preference_grid():
+        assert by_name(patched, *recommend(patched, prefs)[:2]) == by_name(fresh, *recommend(fresh, prefs)[:2])
+
+
+def test_patched_index_matches_rebuild(reloaded):
+    patched, _, _ = reloaded
+    rebuilt = Catalog(patched.symbols, patched.columns, patched.history)
+    for prefs in preference_grid(count=20):
+        for got, expected in zip(patched.index.matches(prefs), rebuilt.index.matches(prefs)):
+            np.testing.assert_array_equal(got, expected)
+    similarity = SimilarityIndex(patched)
+    for field in ('order', 'keys', 'offsets', 'tokens'):
+        np.testing.assert_array_equal(getattr(patched.similarity, field), getattr(similarity, field))
+    for query in ('brand new', 'rewritten', 'gin'):
+        got = patched.search.search(query)
+        expected = rebuilt.search.search(query)
+        for got_part, expected_part in zip(got, expected):
+            np.testing.assert_array_equal(got_part, expected_part)
+
+
+def test_watcher_reports_edits(tmp_path):
+    kb_path = tmp_path / 'kb.pl'
+    # A quoted history may contain ")." at the end of a line
+    first = FACT.format(name='tricky', history="'Ends with (this).\\nAnd goes on (there).\n more'")
+    second = FACT.format(name='plain', history="'Plain.'")
+    kb_path.write_text(first + second, encoding='utf-8')
+    changes = []
+    changed = threading.Event()
+
+    def on_change(cocktails, diff):
+        changes.append((cocktails, diff))
+        changed.set()
+
+    watcher = KBWatcher(kb_path, on_change, interval=0.01)
+    watcher.start()
+    try:
+        watcher.check()
+        kb_path.write_text(first + FACT.format(name='plain', history="'Edited.'")
+                           + FACT.format(name='added', history="'New.'"), encoding='utf-8')
+        assert changed.wait(5)
+    finally:
+        watcher.stop()
+    cocktails, diff = changes[0]
+    assert [drink.name for drink in cocktails] == ['tricky', 'plain', 'added']
+    assert cocktails[0].history == "Ends with (this).\nAnd goes on (there).\n more"
+    assert [drink.name for drink in diff.added] == ['added']
+    assert [new.history for _, new in diff.changed] == ['Edited.']
+    assert diff.removed == ()
+
+
+def test_first_edit_is_diffed_against_the_loaded_catalog(tmp_path, monkeypatch):
+    kb_path = generate_kb(tmp_path / 'kb.pl', 300, seed=5)
+    parses = []
+    parse = KBWatcher._parse
+    monkeypatch.setattr(KBWatcher, '_parse', lambda self, source: parses.append(1) or parse(self, source))
+    recommender = Recommender('python', kb_path, use_table=False)
+    recommender.warm_up()
+    old = recommender.backend.catalog
+    changes = []
+    changed = threading.Event()
+
+    def on_change(cocktails, diff):
+        recommender._on_kb_change(cocktails, diff)
+        changes.append(diff)
+        changed.set()
+
+    watcher = recommender.watcher
+    watcher.on_change = on_change
+    watcher.interval = 0.01
+    watcher.start()
+    try:
+        deadline = time.monotonic() + 5
+        while watcher._hash is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Started without parsing the file the catalog was just loaded from
+        assert watcher._hash == old.kb_hash and parses == []
+        source = kb_path.read_text(encoding='utf-8')
+        start = source.index('\ncocktail(') + 1
+        end = source.index('\ncocktail(', start) + 1
+        kb_path.write_text(source[:start] + source[end:], encoding='utf-8')
+        assert changed.wait(5)
+    finally:
+        watcher.stop()
+    [diff] = changes
+    assert [drink.name for drink in diff.removed] == [old.cocktail(0).name]
+    assert diff.added == () and diff.changed == ()
+    assert len(recommender.backend.catalog) == len(old) - 1
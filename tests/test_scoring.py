@@ -0,0 +1,78 @@
+"""Python scoring against the rules of calculate_match_score/2"""
+import shutil
+
+import numpy as np
+import pytest
+
+from conftest import preference_grid
+from cocktail_app.backends import PrologBackend, PythonBackend
+from cocktail_app.engine import Catalog, score_catalog, score_cocktail
+from cocktail_app.kb import Cocktail, Preferences
+from cocktail_app.synth import generate_kb
+
+
+def cocktail(name, spirit='gin', strength='medium', complexity='beginner', season='all_seasons',
+             occasions=('casual',), flavors=('citrus',)):
+    return Cocktail(name, spirit, ['lime'], ['shaking'], list(flavors), strength, complexity, season,
+                    list(occasions), 'coupe', 'History.')
+
+
+PREFS = Preferences(spirit='gin', flavor='citrus', skill='beginner', strength=6, occasion='casual',
+                    season='summer')
+
+# (cocktail, prefs, score) worked out clause by clause from preference_points/2
+CASES = [
+    (cocktail('all'), PREFS, 3 + 2 + 3 + 2 + 2 + 1),
+    (cocktail('other_spirit', spirit='rum'), PREFS, 10),
+    (cocktail('any_spirit', spirit='rum'), PREFS._replace(spirit='no_preference'), 11),
+    # spirit_points/2 gives the full 3 to a cocktail whose spirit is literally no_preference
+    (cocktail('literal', spirit='no_preference'), PREFS._replace(spirit='no_preference'), 13),
+    # abs(UserStrength - CocktailStrength) =< 2, inclusive at both ends
+    (cocktail('strong_at_7', strength='strong'), PREFS._replace(strength=7), 13),
+    (cocktail('strong_at_6', strength='strong'), PREFS, 11),
+    (cocktail('light_at_1', strength='light'), PREFS._replace(strength=1), 13),
+    (cocktail('unknown_strength', strength='deadly'), PREFS, 11),
+    # skill_sufficient/2
+    (cocktail('too_hard', complexity='intermediate'), PREFS, 10),
+    (cocktail('hard_enough', complexity='intermediate'), PREFS._replace(skill='intermediate'), 13),
+    (cocktail('expert', complexity='expert'), PREFS._replace(skill='expert'), 13),
+    (cocktail('unknown_skill', complexity='expert'), PREFS._replace(skill='guru'), 10),
+    # season_matches/2: all_seasons matches any season, a season only itself
+    (cocktail('in_season', season='summer'), PREFS, 13),
+    (cocktail('out_of_season', season='winter'), PREFS, 11),
+    (cocktail('wants_all', season='summer'), PREFS._replace(season='all_seasons'), 11),
+    (cocktail('both_all'), PREFS._replace(season='all_seasons'), 13),
+    (cocktail('no_occasion', occasions=('party',)), PREFS, 11),
+    (cocktail('no_flavor', flavors=('bitter', 'sweet')), PREFS, 12),
+    (cocktail('nothing', spirit='rum', strength='light', complexity='expert', season='winter',
+              occasions=('party',), flavors=('bitter',)), PREFS, 0),
+]
+
+
+@pytest.mark.parametrize('drink, prefs, expected', CASES, ids=[case[0].name for case in CASES])
+def test_prolog_rules(drink, prefs, expected):
+    assert score_cocktail(drink, prefs) == expected
+    catalog = Catalog.from_cocktails([cocktail('filler', spirit='vodka'), drink])
+    assert score_catalog(catalog, prefs)[1] == expected
+
+
+def test_vectorized_scores_match_reference(catalog, cocktails):
+    for prefs in preference_grid(count=20):
+        expected = np.array([score_cocktail(drink, prefs) for drink in cocktails])
+        np.testing.assert_array_equal(score_catalog(catalog, prefs), expected, err_msg=str(prefs))
+
+
+@pytest.mark.skipif(shutil.which('swipl') is None, reason="SWI-Prolog is not installed")
+def test_python_backend_matches_prolog(tmp_path):
+    kb_path = generate_kb(tmp_path / 'kb.pl', 300, seed=3)
+    prolog = PrologBackend(kb_path, pool_size=1)
+    python = PythonBackend(kb_path)
+    try:
+        for prefs in preference_grid(count=10):
+            expected = prolog.recommend(prefs)
+            page = python.recommend(prefs)
+            assert page.total == expected.total
+            assert [(m.cocktail, m.score) for m in page.matches] == \
+                [(m.cocktail, m.score) for m in expected.matches]
+    finally:
+        prolog.close()
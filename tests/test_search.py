@@ -0,0 +1,29 @@
+"""Full-text search: sparse and dense scoring agree"""
+import numpy as np
+import pytest
+
+from cocktail_app import search
+from cocktail_app.search import words
+
+QUERIES = ['g', 'gi', 'gin', 'gin ', 'gin l', 'gin lime', 'lime gin', 'sour', 'a', 'zzz', 'gin zzz', 'the']
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_sparse_matches_dense(catalog, monkeypatch, query):
+    index = catalog.search
+    monkeypatch.setattr(search, 'SPARSE_RATIO', 0)
+    sparse = index.search(query)
+    monkeypatch.setattr(search, 'SPARSE_RATIO', 10 ** 9)
+    dense = index.search(query)
+    for got, expected in zip(sparse, dense):
+        np.testing.assert_array_equal(got, expected)
+
+
+def test_every_word_must_match(catalog):
+    ids, scores, total = catalog.search.search('gin lime')
+    assert total == len(ids) > 0
+    for row in ids:
+        drink = catalog.cocktail(int(row))
+        text = words(' '.join([drink.name, drink.history] + list(drink.ingredients)))
+        assert 'gin' in text and 'lime' in text
+    assert np.all(scores >= 2)
@@ -0,0 +1,76 @@
+"""HTTP service: request parsing and error statuses over a real socket"""
+import asyncio
+import json
+
+import pytest
+
+from cocktail_app.recommender import Recommender
+from cocktail_app.server import RecommendationServer
+
+
+@pytest.fixture
+def server(synthetic_kb):
+    server = RecommendationServer(Recommender('python', synthetic_kb, use_table=False), max_concurrency=2)
+    yield server
+    server.close()
+
+
+def exchange(server, *requests):
+    """(status, JSON body) for each raw request, sent one after another on one connection"""
+
+    async def run():
+        listener = await asyncio.start_server(server.handle_connection, '127.0.0.1', 0)
+        server.semaphore = asyncio.Semaphore(server.max_concurrency)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        replies = []
+        try:
+            for request in requests:
+                writer.write(request)
+                await writer.drain()
+                head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 10)
+                lines = head.decode('latin-1').split('\r\n')
+                headers = dict(line.lower().split(': ', 1) for line in lines[1:] if ': ' in line)
+                body = await reader.readexactly(int(headers['content-length']))
+                replies.append((int(lines[0].split()[1]), json.loads(body)))
+        finally:
+            writer.close()
+            listener.close()
+            await listener.wait_closed()
+        return replies
+
+    return asyncio.run(run())
+
+
+def get(path):
+    return f'GET {path} HTTP/1.1\r\nHost: test\r\n\r\n'.encode('latin-1')
+
+
+def test_recommend_and_keep_alive(server):
+    replies = exchange(server, get('/recommend?spirit=gin&limit=5'), get('/health'))
+    status, payload = replies[0]
+    assert status == 200
+    assert len(payload['results']) == 5 and payload['total'] >= 5
+    assert replies[1][0] == 200
+
+
+@pytest.mark.parametrize('length', ['-1', 'abc'])
+def test_invalid_content_length(server, length):
+    request = f'POST /recommend HTTP/1.1\r\nContent-Length: {length}\r\n\r\n'.encode('latin-1')
+    [(status, payload)] = exchange(server, request)
+    assert status == 400
+    assert payload['error'] == "Invalid Content-Length"
+
+
+def test_body_too_large(server):
+    [(status, _)] = exchange(server, b'POST /recommend HTTP/1.1\r\nContent-Length: 999999999\r\n\r\n')
+    assert status == 413
+
+
+def test_similar_statuses(server, cocktails):
+    replies = exchange(server, get(f'/similar?name={cocktails[0].name}&limit=3'),
+                       get('/similar?name=no_such_drink'), get('/similar'), get('/nowhere'),
+                       get('/recommend?limit=-1'))
+    assert [status for status, _ in replies] == [200, 404, 400, 404, 400]
+    assert len(replies[0][1]['results']) == 3
+    assert 'no_such_drink' in replies[1][1]['error']
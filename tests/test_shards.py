@@ -0,0 +1,88 @@
+"""Sharded scoring against single-process results"""
+import os
+import signal
+import time
+
+import numpy as np
+import pytest
+
+from conftest import preference_grid
+from cocktail_app.engine import Catalog, recommend
+from cocktail_app.shards import ShardError, ShardPool, shard_bounds
+from cocktail_app.shared import CatalogPublisher
+
+PAGES = [(0, 10), (0, None), (7, 25), (500, 100), (10 ** 6, 10)]
+
+
+@pytest.fixture(scope='module')
+def publisher():
+    publisher = CatalogPublisher()
+    yield publisher
+    publisher.close()
+
+
+@pytest.fixture(scope='module')
+def pool(publisher):
+    pool = ShardPool(publisher.directory, 3)
+    yield pool
+    pool.close()
+
+
+def assert_same_page(got, expected):
+    for got_part, expected_part in zip(got, expected):
+        np.testing.assert_array_equal(got_part, expected_part)
+
+
+@pytest.mark.parametrize('size, shards', [(2, 3), (10, 3), (3001, 4)])
+def test_shard_bounds_cover_every_row(size, shards):
+    bounds = shard_bounds(size, shards)
+    assert len(bounds) == min(size, shards)
+    assert [start for start, _ in bounds] == [0] + [end for _, end in bounds[:-1]]
+    assert bounds[-1][1] == size
+    assert shard_bounds(0, shards) == []
+
+
+def test_merged_pages_match_one_process(publisher, pool, cocktails):
+    catalog = Catalog.from_cocktails(cocktails)
+    generation = publisher.publish(catalog)
+    for prefs in preference_grid(count=15):
+        for offset, limit in PAGES:
+            assert_same_page(pool.recommend(generation, prefs, offset, limit),
+                             recommend(catalog, prefs, offset, limit))
+
+
+def test_new_generation_is_sliced_again(publisher, pool, cocktails):
+    old = Catalog.from_cocktails(cocktails)
+    old_generation = publisher.publish(old)
+    new = Catalog.from_cocktails(cocktails[::2])
+    new_generation = publisher.publish(new)
+    prefs = preference_grid(count=1)[0]
+    assert_same_page(pool.recommend(new_generation, prefs, 0, 50), recommend(new, prefs, 0, 50))
+    # Queries made against the generation being replaced are still answered
+    assert_same_page(pool.recommend(old_generation, prefs, 0, 50), recommend(old, prefs, 0, 50))
+
+
+def test_timeout_raises_shard_error(publisher, pool, cocktails):
+    generation = publisher.publish(Catalog.from_cocktails(cocktails))
+    prefs = preference_grid(count=1)[0]
+    pool.recommend(generation, prefs, 0, 10)
+    with pytest.raises(ShardError):
+        pool.recommend(generation, prefs._replace(strength=3), 0, None, timeout=1e-6)
+    # The abandoned request is not left pending
+    time.sleep(0.5)
+    assert all(not worker.pending for worker in pool._workers)
+
+
+def test_dead_worker_is_restarted(publisher, pool, cocktails):
+    catalog = Catalog.from_cocktails(cocktails)
+    generation = publisher.publish(catalog)
+    prefs = preference_grid(count=1)[0]
+    pool.recommend(generation, prefs, 0, 10)
+    victim = pool.pids[1]
+    os.kill(victim, signal.SIGKILL)
+    deadline = time.monotonic() + 10
+    while pool._workers[1].alive() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert_same_page(pool.recommend(generation, prefs, 0, 10), recommend(catalog, prefs, 0, 10))
+    assert victim not in pool.pids
+
@@ -0,0 +1,41 @@
+"""Catalog generations shared with worker processes"""
+import numpy as np
+import pytest
+
+from cocktail_app.engine import Catalog
+from cocktail_app.kb import KnowledgeBaseError
+from cocktail_app.shared import KEEP_GENERATIONS, CatalogPublisher, SharedCatalog
+
+
+@pytest.fixture
+def publisher(tmp_path):
+    publisher = CatalogPublisher(tmp_path / 'shared')
+    yield publisher
+    publisher.close()
+
+
+def test_attach_before_first_publish(publisher):
+    with pytest.raises(KnowledgeBaseError):
+        SharedCatalog(publisher.directory).attach()
+
+
+def test_attach_follows_the_latest_generation(publisher, cocktails):
+    shared = SharedCatalog(publisher.directory)
+    first = Catalog.from_cocktails(cocktails)
+    publisher.publish(first)
+    attached = shared.attach()
+    assert shared.attach() is attached
+    np.testing.assert_array_equal(attached.columns['name'], first.columns['name'])
+    assert not attached.columns['name'].flags.writeable
+    second = Catalog.from_cocktails(cocktails[:100])
+    generation = publisher.publish(second)
+    assert len(shared.attach()) == 100
+    assert len(shared.attach(generation - 1)) == len(first)
+
+
+def test_old_generations_are_removed(publisher, cocktails):
+    catalog = Catalog.from_cocktails(cocktails[:50])
+    for _ in range(KEEP_GENERATIONS + 1):
+        generation = publisher.publish(catalog)
+    with pytest.raises(KnowledgeBaseError):
+        SharedCatalog(publisher.directory).attach(generation - KEEP_GENERATIONS)